@@ -0,0 +1,203 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# granularity of the per-client byte usage history, in seconds
+BYTES_BUCKET = 60
+
+
+class Slot:
+    """One admitted download or job; ``release`` is idempotent."""
+
+    __slots__ = ("_controller", "key", "started", "released")
+
+    def __init__(self, controller: "AdmissionController", key: str, started: float):
+        self._controller = controller
+        self.key = key
+        self.started = started
+        self.released = False
+
+    def release(self) -> None:
+        self._controller._release(self)
+
+
+class AdmissionController:
+    """Admits downloads per client by what they cost us rather than by request count.
+
+    Uses environment variables:
+    - ADMISSION_MAX_CONCURRENT: downloads/batches/jobs one client may have running
+      at once (default 0, unlimited; opt in, since clients behind one NAT share a key)
+    - ADMISSION_MAX_BYTES: bytes one client may receive per ADMISSION_PERIOD
+      (default 0, unlimited)
+    - ADMISSION_PERIOD: byte quota window in seconds (default 3600)
+
+    Rejections are 429s whose Retry-After is when a slot is expected to free up
+    (from an average of recent hold times) or when enough of the byte history
+    ages out. State is per process.
+    """
+
+    def __init__(self):
+        self.max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "0"))
+        self.max_bytes = int(os.getenv("ADMISSION_MAX_BYTES", "0"))
+        self.period = int(os.getenv("ADMISSION_PERIOD", "3600"))
+        self._lock = threading.Lock()
+        self._slots: Dict[str, List[Slot]] = {}
+        # key -> deque of [bucket_start, bytes]
+        self._usage: Dict[str, Deque[List[float]]] = {}
+        # job_id -> (slot, time after which the slot is given back regardless)
+        self._jobs: Dict[str, Tuple[Slot, float]] = {}
+        # smoothed seconds a slot is held, used to predict when one frees up
+        self._hold_ewma: Optional[float] = None
+        self._rejected = 0
+
+    def _now(self) -> float:
+        return time.time()
+
+    def _reject(self, detail: str, retry_after: float):
+        self._rejected += 1
+        raise HTTPException(status_code=429, detail=detail,
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    def _bytes_used(self, key: str, now: float) -> int:
+        usage = self._usage.get(key)
+        if not usage:
+            return 0
+        while usage and usage[0][0] + self.period <= now:
+            usage.popleft()
+        if not usage:
+            del self._usage[key]
+            return 0
+        return int(sum(b for _, b in usage))
+
+    def _check_bytes_locked(self, key: str, now: float) -> None:
+        if self.max_bytes <= 0:
+            return
+        used = self._bytes_used(key, now)
+        if used < self.max_bytes:
+            return
+        # wait until enough of the oldest buckets have aged out
+        retry = self.period
+        for start, nbytes in self._usage[key]:
+            used -= nbytes
+            if used < self.max_bytes:
+                retry = start + self.period - now
+                break
+        self._reject("Download quota exceeded", retry)
+
+    def check_bytes(self, key: str) -> None:
+        """Raise 429 if ``key`` has used up its byte quota."""
+        with self._lock:
+            self._check_bytes_locked(key, self._now())
+
+    def admit(self, key: str, exempt: bool = False) -> Slot:
+        """Take one of ``key``'s concurrent slots, or raise 429 with Retry-After.
+
+        An ``exempt`` request is only held to the byte quota; its slot doesn't
+        count toward the concurrency limit.
+        """
+        now = self._now()
+        with self._lock:
+            self._check_bytes_locked(key, now)
+            if exempt:
+                slot = Slot(self, key, now)
+                slot.released = True
+                return slot
+            slots = self._slots.setdefault(key, [])
+            if 0 < self.max_concurrent <= len(slots):
+                held = now - min(s.started for s in slots)
+                self._reject("Too many concurrent downloads",
+                             (self._hold_ewma or 5.0) - held)
+            slot = Slot(self, key, now)
+            slots.append(slot)
+            return slot
+
+    def _release(self, slot: Slot) -> None:
+        with self._lock:
+            if slot.released:
+                return
+            slot.released = True
+            slots = self._slots.get(slot.key)
+            if slots and slot in slots:
+                slots.remove(slot)
+                if not slots:
+                    del self._slots[slot.key]
+            held = self._now() - slot.started
+            self._hold_ewma = held if self._hold_ewma is None else 0.8 * self._hold_ewma + 0.2 * held
+
+    def charge_bytes(self, key: str, nbytes: int) -> None:
+        """Count ``nbytes`` delivered to ``key`` against its quota."""
+        if self.max_bytes <= 0 or nbytes <= 0:
+            return
+        now = self._now()
+        bucket = now - now % BYTES_BUCKET
+        with self._lock:
+            if len(self._usage) > 10000:
+                for k in list(self._usage):
+                    self._bytes_used(k, now)
+            usage = self._usage.setdefault(key, deque())
+            if usage and usage[-1][0] == bucket:
+                usage[-1][1] += nbytes
+            else:
+                usage.append([bucket, nbytes])
+
+    def track_job(self, job_id: str, slot: Slot, ttl: float) -> None:
+        """Keep ``slot`` held while job ``job_id`` is queued or running.
+
+        The slot is released by ``finish_job`` (completion callback or a status
+        poll that sees the job ended), by ``reap``, or after ``ttl`` seconds at
+        the latest. Nothing is tracked when concurrency limits are off.
+        """
+        if self.max_concurrent <= 0:
+            slot.release()
+            return
+        now = self._now()
+        with self._lock:
+            expired = [j for j, (_, deadline) in self._jobs.items() if deadline <= now]
+            self._jobs[job_id] = (slot, now + ttl)
+        for stale in expired:
+            self.finish_job(stale)
+
+    def finish_job(self, job_id: str) -> None:
+        """Release the slot of a job that has ended; unknown ids are ignored."""
+        with self._lock:
+            tracked = self._jobs.pop(job_id, None)
+        if tracked is not None:
+            tracked[0].release()
+
+    def has_jobs(self, key: str) -> bool:
+        with self._lock:
+            return any(slot.key == key for slot, _ in self._jobs.values())
+
+    def reap(self, key: str, is_active: Callable[[str], bool]) -> None:
+        """Release expired job slots, and those of ``key``'s jobs that are no longer active.
+
+        ``is_active`` may block (rq looks the job up in Redis); call this off the event loop.
+        """
+        now = self._now()
+        with self._lock:
+            expired = [j for j, (_, deadline) in self._jobs.items() if deadline <= now]
+            mine = [j for j, (slot, _) in self._jobs.items() if slot.key == key and j not in expired]
+        for job_id in expired:
+            self.finish_job(job_id)
+        for job_id in mine:
+            if not is_active(job_id):
+                self.finish_job(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_bytes": self.max_bytes,
+                "active": sum(len(s) for s in self._slots.values()),
+                "clients": len(self._slots),
+                "rejected": self._rejected,
+                "avg_hold_seconds": round(self._hold_ewma, 3) if self._hold_ewma is not None else None,
+            }
+
+
+admission = AdmissionController()
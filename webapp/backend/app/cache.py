@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse, urlunparse
+
+logger = logging.getLogger("ytdl")
+
+# 11-character YouTube video ids in the URL shapes users paste
+_YT_ID_RE = re.compile(
+    r"(?:[?&]v=|/shorts/|/embed/|/live/|/v/|youtu\.be/)([0-9A-Za-z_-]{11})")
+_YT_HOSTS = ("youtube.com", "youtu.be", "youtube-nocookie.com")
+# signed googlevideo URLs carry their expiry as ?expire=<unix ts> or /expire/<unix ts>/
+_EXPIRE_RE = re.compile(r"[?&/]expire[=/](\d+)")
+
+
+def canonical_key(url: str) -> str:
+    """Map the different spellings of the same video URL onto one cache key."""
+    url = url.strip()
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if any(host == h or host.endswith("." + h) for h in _YT_HOSTS):
+        m = _YT_ID_RE.search(url)
+        if m:
+            # watch?v=X&list=Y extracts the whole playlist, not just X
+            playlist = parse_qs(parsed.query).get("list")
+            return f"youtube:{m.group(1)}" + (f":list={playlist[-1]}" if playlist else "")
+    # generic sites: normalise scheme/host case and drop the fragment
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path,
+                       parsed.params, parsed.query, ""))
+
+
+def stream_url_ttl(info: Dict[str, Any], ttl: float, margin: float = 60) -> float:
+    """Clamp ``ttl`` so cached info never outlives the signed stream URLs inside it."""
+    now = time.time()
+    urls = [info.get("url")] + [f.get("url")
+                                for f in info.get("formats") or []]
+    for u in urls:
+        m = _EXPIRE_RE.search(u or "")
+        if m:
+            ttl = min(ttl, int(m.group(1)) - now - margin)
+    return ttl
+
+
+class InfoCache:
+    """TTL + LRU cache for extracted video metadata.
+
+    Uses environment variables:
+    - INFO_CACHE_TTL: seconds to keep an entry (default 600, 0 disables the cache)
+    - INFO_CACHE_MAX_ENTRIES: max entries kept in-process (default 512)
+    - INFO_CACHE_MAX_BYTES: max serialized bytes kept in-process (default 64 MiB)
+    - INFO_CACHE_REDIS: set to 0 to skip the shared tier even if REDIS_URL is set
+
+    If REDIS_URL is set, entries are also written to Redis so every worker and
+    instance shares lookups. Cached dicts are shared between callers and must be
+    treated as read-only.
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv("INFO_CACHE_TTL", "600"))
+        self.max_entries = int(os.getenv("INFO_CACHE_MAX_ENTRIES", "512"))
+        self.max_bytes = int(os.getenv("INFO_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        # maps key -> (expires_at, size, info)
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._redis = None
+        if os.getenv("REDIS_URL") and os.getenv("INFO_CACHE_REDIS", "1") != "0":
+            try:
+                import redis
+
+                self._redis = redis.Redis.from_url(
+                    os.getenv("REDIS_URL"), socket_timeout=0.5)
+            except Exception:
+                # fall back to the in-process tier only
+                self._redis = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _store_local(self, key: str, expires_at: float, size: int, info: Dict[str, Any]) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (expires_at, size, info)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, dropped, _) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+                self.evictions += 1
+
+    def get(self, url: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """Fresh info for ``url`` or None; ``count=False`` leaves the hit/miss counters alone."""
+        if not self.enabled:
+            return None
+        key = canonical_key(url)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += count
+                    return entry[2]
+                del self._entries[key]
+                self._bytes -= entry[1]
+
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(f"info:{key}")
+            except Exception:
+                logger.warning("info cache redis get failed", exc_info=True)
+                raw = None
+            if raw:
+                try:
+                    payload = json.loads(raw)
+                    expires_at, info = payload["expires_at"], payload["info"]
+                except Exception:
+                    expires_at, info = 0, None
+                if info is not None and expires_at > now:
+                    self._store_local(key, expires_at, len(raw), info)
+                    with self._lock:
+                        self.redis_hits += count
+                    return info
+
+        with self._lock:
+            self.misses += count
+        return None
+
+    def put(self, url: str, info: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        ttl = stream_url_ttl(info, self.ttl)
+        if ttl <= 0:
+            return
+        key = canonical_key(url)
+        expires_at = time.time() + ttl
+        try:
+            raw = json.dumps({"expires_at": expires_at, "info": info})
+        except (TypeError, ValueError):
+            logger.warning("info for %s is not serializable, not caching", url)
+            return
+        self._store_local(key, expires_at, len(raw), info)
+        if self._redis is not None:
+            try:
+                self._redis.setex(f"info:{key}", max(1, int(ttl)), raw)
+            except Exception:
+                logger.warning("info cache redis set failed", exc_info=True)
+
+    def discard(self, url: str) -> None:
+        """Drop the entry for ``url`` from both tiers, e.g. once its stream URLs stop working."""
+        key = canonical_key(url)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+        if self._redis is not None:
+            try:
+                self._redis.delete(f"info:{key}")
+            except Exception:
+                logger.warning("info cache redis delete failed", exc_info=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "shared": self._redis is not None,
+            }
+
+
+info_cache = InfoCache()
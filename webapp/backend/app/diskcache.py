@@ -0,0 +1,380 @@
+import hashlib
+import json
+import logging
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.cache import canonical_key
+
+logger = logging.getLogger("ytdl")
+
+_META = "meta.json"
+_STAGING = ".staging"
+_STALE_STAGING = 6 * 3600
+_PIN = ".pin-"
+# how often the index is re-read from disk, so files other processes added count against the quota
+_RESCAN_INTERVAL = 60
+
+
+class _Entry:
+    __slots__ = ("digest", "path", "size", "last_access", "hits")
+
+    def __init__(self, digest: str, path: str, size: int, last_access: float, hits: int):
+        self.digest = digest
+        self.path = path
+        self.size = size
+        self.last_access = last_access
+        self.hits = hits
+
+
+class DownloadCache:
+    """Persistent cache of finished downloads keyed by (video, format).
+
+    Uses environment variables:
+    - DOWNLOAD_CACHE_DIR: cache root, e.g. /data/cache (unset disables the cache)
+    - DOWNLOAD_CACHE_MAX_BYTES: size quota (default 10 GiB)
+    - DOWNLOAD_CACHE_POLICY: ``lru`` (default) or ``lfu`` eviction
+
+    Each entry lives in ``<root>/<aa>/<digest>/`` next to a ``meta.json``. Entries
+    are assembled under ``<root>/.staging`` and renamed into place, so a crash
+    never leaves a half-written entry visible, and the index is rebuilt from the
+    meta files on startup.
+
+    The quota covers every process sharing the directory (API workers, rq
+    workers): before evicting, a process re-reads the entries from disk if its
+    index is older than a minute, so the total can overshoot by at most what the
+    others added in that time. Entries being served are pinned with a
+    ``.pin-*`` file in their directory and are never evicted.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root if root is not None else os.getenv("DOWNLOAD_CACHE_DIR", "")
+        self.max_bytes = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+        self.policy = os.getenv("DOWNLOAD_CACHE_POLICY", "lru").lower()
+        self._entries: Dict[str, _Entry] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pins: Dict[str, List[str]] = {}
+        self._scanned = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.root:
+            try:
+                os.makedirs(self.staging_root, exist_ok=True)
+                self._rebuild()
+            except Exception:
+                logger.exception("download cache unavailable at %s", self.root)
+                self.root = ""
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    @property
+    def staging_root(self) -> str:
+        """Scratch directory on the cache filesystem; downloads made here can be renamed in."""
+        return os.path.join(self.root, _STAGING)
+
+    @staticmethod
+    def digest(url: str, format_id: Optional[str]) -> str:
+        raw = f"{canonical_key(url)}\0{format_id or 'default'}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def owns(self, path: str) -> bool:
+        """True if ``path`` is a cached file that must not be deleted by its consumer."""
+        if not self.enabled:
+            return False
+        root = os.path.abspath(self.root) + os.sep
+        p = os.path.abspath(path)
+        return p.startswith(root) and not p.startswith(os.path.abspath(self.staging_root) + os.sep)
+
+    def _load(self, entry_dir: str) -> Optional[_Entry]:
+        meta_path = os.path.join(entry_dir, _META)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            path = os.path.join(entry_dir, meta["filename"])
+            size = os.path.getsize(path)
+            return _Entry(meta["digest"], path, size, os.path.getmtime(meta_path), int(meta.get("hits", 0)))
+        except Exception:
+            return None
+
+    def _scan(self) -> Tuple[Dict[str, _Entry], int]:
+        entries: Dict[str, _Entry] = {}
+        total = 0
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard == _STAGING or not os.path.isdir(shard_dir):
+                continue
+            for digest in os.listdir(shard_dir):
+                entry = self._load(os.path.join(shard_dir, digest))
+                if entry is not None:
+                    entries[entry.digest] = entry
+                    total += entry.size
+        return entries, total
+
+    def _rebuild(self) -> None:
+        # old leftovers in staging belong to downloads that never completed; recent
+        # ones may be in progress in a sibling worker process
+        cutoff = time.time() - _STALE_STAGING
+        for name in os.listdir(self.staging_root):
+            path = os.path.join(self.staging_root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard == _STAGING or not os.path.isdir(shard_dir):
+                continue
+            for digest in os.listdir(shard_dir):
+                if self._load(os.path.join(shard_dir, digest)) is None:
+                    shutil.rmtree(os.path.join(shard_dir, digest), ignore_errors=True)
+        self._entries, self._bytes = self._scan()
+        logger.info("download cache: %d entries, %d bytes in %s",
+                    len(self._entries), self._bytes, self.root)
+
+    def _write_meta(self, entry_dir: str, meta: Dict[str, Any]) -> None:
+        tmp = os.path.join(entry_dir, f".{_META}.{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(entry_dir, _META))
+
+    def contains(self, url: str, format_id: Optional[str]) -> bool:
+        """Whether (url, format_id) is in this process's index; doesn't count as a hit or miss."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return self.digest(url, format_id) in self._entries
+
+    def pin(self, path: str) -> bool:
+        """Protect the cached ``path`` from eviction until ``unpin``; False if it is gone.
+
+        Blocking file I/O; call it off the event loop. Paths the cache doesn't own
+        (e.g. what ``put`` handed back uncached) are never pinned.
+        """
+        if not self.owns(path):
+            return False
+        entry_dir = os.path.dirname(path)
+        pin = os.path.join(entry_dir, f"{_PIN}{os.getpid()}-{secrets.token_hex(6)}")
+        try:
+            open(pin, "x").close()
+        except OSError:
+            return False
+        if not os.path.exists(path):
+            # evicted between the lookup and the pin
+            self._remove_pin(pin)
+            return False
+        with self._lock:
+            self._pins.setdefault(path, []).append(pin)
+        return True
+
+    def unpin(self, path: str) -> None:
+        """Release one ``pin`` of ``path`` taken by this process (no-op if there is none)."""
+        with self._lock:
+            pins = self._pins.get(path)
+            if not pins:
+                return
+            pin = pins.pop()
+            if not pins:
+                del self._pins[path]
+        self._remove_pin(pin)
+
+    @staticmethod
+    def _remove_pin(pin: str) -> None:
+        try:
+            os.remove(pin)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _pinned(entry_dir: str) -> bool:
+        # pins older than a crashed process could have held them are ignored
+        cutoff = time.time() - _STALE_STAGING
+        try:
+            names = os.listdir(entry_dir)
+        except OSError:
+            return False
+        for name in names:
+            if name.startswith(_PIN):
+                try:
+                    if os.path.getmtime(os.path.join(entry_dir, name)) >= cutoff:
+                        return True
+                except OSError:
+                    pass
+        return False
+
+    def get(self, url: str, format_id: Optional[str], pin: bool = False) -> Optional[str]:
+        """Return the cached file for (url, format_id), or None on a miss.
+
+        With ``pin`` the entry is also pinned; the caller must ``unpin`` it when done.
+        """
+        if not self.enabled:
+            return None
+        digest = self.digest(url, format_id)
+        with self._lock:
+            entry = self._entries.get(digest)
+        if entry is None:
+            # another worker process may have filled it since we built our index
+            entry = self._load(self._entry_dir(digest))
+            if entry is not None:
+                with self._lock:
+                    if digest not in self._entries:
+                        self._entries[digest] = entry
+                        self._bytes += entry.size
+        if entry is None or not os.path.exists(entry.path):
+            with self._lock:
+                if entry is not None and self._entries.pop(digest, None) is not None:
+                    self._bytes -= entry.size
+                self.misses += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry.last_access = now
+            entry.hits += 1
+            self.hits += 1
+            hits = entry.hits
+        entry_dir = os.path.dirname(entry.path)
+        try:
+            self._write_meta(entry_dir, {"digest": digest, "filename": os.path.basename(entry.path),
+                                         "format_id": format_id, "hits": hits})
+        except Exception:
+            # losing access stats only affects eviction order
+            pass
+        if pin and not self.pin(entry.path):
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return entry.path
+
+    def put(self, url: str, format_id: Optional[str], src_path: str) -> str:
+        """Move a finished download into the cache and return its cached path.
+
+        Returns ``src_path`` unchanged if the cache is disabled or the file can't
+        be cached; the caller keeps ownership of it in that case.
+        """
+        if not self.enabled:
+            return src_path
+        size = os.path.getsize(src_path)
+        if size > self.max_bytes:
+            return src_path
+        digest = self.digest(url, format_id)
+        final_dir = self._entry_dir(digest)
+        filename = os.path.basename(src_path)
+        staging = tempfile.mkdtemp(prefix=f"{digest[:8]}_", dir=self.staging_root)
+        try:
+            # same filesystem when the download was made under staging_root, so this is a rename
+            shutil.move(src_path, os.path.join(staging, filename))
+            self._write_meta(staging, {"digest": digest, "filename": filename,
+                                       "format_id": format_id, "hits": 0})
+            os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+            try:
+                os.rename(staging, final_dir)
+            except OSError:
+                # another worker cached it first; keep theirs
+                existing = self._load(final_dir)
+                if existing is None:
+                    raise
+                shutil.rmtree(staging, ignore_errors=True)
+                return self.get(url, format_id) or existing.path
+        except Exception:
+            logger.exception("failed to cache %s", src_path)
+            if os.path.exists(src_path):
+                shutil.rmtree(staging, ignore_errors=True)
+                return src_path
+            # the file already moved; hand back the staged copy for the caller to clean up
+            return os.path.join(staging, filename)
+
+        entry = _Entry(digest, os.path.join(final_dir, filename), size, time.time(), 0)
+        with self._lock:
+            old = self._entries.pop(digest, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[digest] = entry
+            self._bytes += size
+        self._evict(keep=digest)
+        return entry.path
+
+    def _evict(self, keep: str) -> None:
+        if time.monotonic() - self._scanned > _RESCAN_INTERVAL:
+            entries, total = self._scan()
+            with self._lock:
+                self._entries, self._bytes = entries, total
+                self._scanned = time.monotonic()
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            if self.policy == "lfu":
+                order = sorted(self._entries.values(), key=lambda e: (e.hits, e.last_access))
+            else:
+                order = sorted(self._entries.values(), key=lambda e: e.last_access)
+            excess = self._bytes - self.max_bytes
+        # pin checks list each entry directory, so they run without the lock;
+        # a pin taken after this is caught by _remove_entry's second look
+        candidates, freed = [], 0
+        for entry in order:
+            if freed >= excess:
+                break
+            if entry.digest == keep or self._pinned(os.path.dirname(entry.path)):
+                continue
+            candidates.append(entry)
+            freed += entry.size
+        victims = []
+        with self._lock:
+            for entry in candidates:
+                if self._bytes <= self.max_bytes:
+                    break
+                if self._entries.get(entry.digest) is not entry:
+                    # replaced or removed meanwhile
+                    continue
+                del self._entries[entry.digest]
+                self._bytes -= entry.size
+                self.evictions += 1
+                victims.append(entry)
+        for entry in victims:
+            self._remove_entry(os.path.dirname(entry.path))
+
+    def _remove_entry(self, entry_dir: str) -> None:
+        # move it out of sight first, then look for a pin taken since the check above;
+        # a pin taken after the move fails its existence check and counts as a miss
+        tomb = os.path.join(self.staging_root, f"evicted-{secrets.token_hex(6)}")
+        try:
+            os.rename(entry_dir, tomb)
+        except OSError:
+            return
+        if self._pinned(tomb):
+            try:
+                os.rename(tomb, entry_dir)
+                return
+            except OSError:
+                pass
+        # open readers keep their file handle; POSIX unlink is safe mid-stream
+        shutil.rmtree(tomb, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+download_cache = DownloadCache()
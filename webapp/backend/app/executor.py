@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Set
+from urllib.parse import urlparse
+
+from fastapi import HTTPException
+
+from app.tracing import profiler
+
+
+class BoundedExecutor:
+    """Thread pool with a concurrency cap and a bounded wait queue.
+
+    At most ``max_workers`` calls run at once; up to ``max_queue`` more wait for a
+    free thread. Anything beyond that is rejected with a 503 so a flood of slow
+    yt-dlp calls can't pile up unbounded work behind the event loop. The 503's
+    Retry-After is derived from a moving average of recent call durations.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"ytdl-{name}")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._rejected = 0
+        # smoothed seconds per call; None until the first call finishes
+        self._ewma: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is expected to free up."""
+        if self._ewma is None:
+            return 5
+        return max(1, math.ceil(self._ewma / self.max_workers))
+
+    def _reserve(self) -> None:
+        with self._lock:
+            if self._active + self._queued >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server busy ({self.name} pool saturated), retry later",
+                    headers={"Retry-After": str(self.retry_after())},
+                )
+            self._queued += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result."""
+        self._reserve()
+
+        def _call():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            started = time.monotonic()
+            try:
+                with profiler.bind_thread():
+                    return fn(*args, **kwargs)
+            finally:
+                took = time.monotonic() - started
+                with self._lock:
+                    self._active -= 1
+                    self._ewma = took if self._ewma is None else 0.8 * self._ewma + 0.2 * took
+
+        # run in a copy of the caller's context so spans and profiling follow the call
+        ctx = contextvars.copy_context()
+        try:
+            cf = self._pool.submit(ctx.run, _call)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        def _on_done(f):
+            # a job cancelled before it started never ran _call, so release its slot here
+            if f.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        cf.add_done_callback(_on_done)
+        return await asyncio.wrap_future(cf)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._queued,
+                "rejected": self._rejected,
+                "avg_seconds": round(self._ewma, 3) if self._ewma is not None else None,
+            }
+
+
+# Separate pools so a handful of long downloads can't starve cheap metadata lookups.
+info_executor = BoundedExecutor(
+    "info",
+    max_workers=int(os.getenv("INFO_WORKERS", "32")),
+    max_queue=int(os.getenv("INFO_QUEUE", "256")),
+)
+download_executor = BoundedExecutor(
+    "download",
+    max_workers=int(os.getenv("DOWNLOAD_WORKERS", "4")),
+    max_queue=int(os.getenv("DOWNLOAD_QUEUE", "16")),
+)
+
+
+class HostLimiter:
+    """Caps concurrent downloads per upstream host across the whole process.
+
+    Waiters are plain futures on whichever loop they came from, so one limiter can
+    be shared by every request regardless of the event loop it runs on.
+    """
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._active: Dict[str, int] = {}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {}
+        # waiters a releaser has passed its slot to, until they take it up
+        self._granted: Set[asyncio.Future] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return (urlparse(url).hostname or "").lower()
+
+    async def _acquire(self, host: str) -> None:
+        with self._lock:
+            if self._active.get(host, 0) < self.per_host:
+                self._active[host] = self._active.get(host, 0) + 1
+                return
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(host, deque()).append(fut)
+        try:
+            # the releasing side hands its slot straight to us
+            await fut
+        except asyncio.CancelledError:
+            with self._lock:
+                waiters = self._waiters.get(host)
+                if waiters and fut in waiters:
+                    waiters.remove(fut)
+                    raise
+                granted = fut in self._granted
+                self._granted.discard(fut)
+            if granted:
+                # the slot was handed over just as we were cancelled; give it back
+                self._release(host)
+            raise
+        with self._lock:
+            self._granted.discard(fut)
+
+    def _release(self, host: str) -> None:
+        with self._lock:
+            waiters = self._waiters.get(host)
+            while waiters:
+                fut = waiters.popleft()
+                if not fut.done():
+                    self._granted.add(fut)
+                    fut.get_loop().call_soon_threadsafe(_hand_over, fut)
+                    return
+            if not waiters:
+                self._waiters.pop(host, None)
+            self._active[host] -= 1
+            if self._active[host] <= 0:
+                del self._active[host]
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        """Hold one of the ``per_host`` slots for the host of ``url`` (no-op if disabled)."""
+        if self.per_host <= 0:
+            yield
+            return
+        host = self.host_of(url)
+        await self._acquire(host)
+        try:
+            yield
+        finally:
+            self._release(host)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._active)
+
+
+def _hand_over(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+host_limiter = HostLimiter(int(os.getenv("PER_HOST_DOWNLOADS", "4")))
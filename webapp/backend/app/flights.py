@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.diskcache import download_cache
+
+logger = logging.getLogger("ytdl")
+
+ProgressHook = Callable[[dict], None]
+
+
+def remove_download(path: str) -> None:
+    """Delete a downloaded file together with the temp directory it was written to.
+
+    Files that live in the persistent download cache are left alone, only
+    releasing the pin taken while they were being served.
+    """
+    if download_cache.owns(path):
+        download_cache.unpin(path)
+        return
+    d = os.path.dirname(path)
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+        if os.path.isdir(d):
+            shutil.rmtree(d, ignore_errors=True)
+    except Exception:
+        pass
+
+
+class _Flight:
+    __slots__ = ("task", "listeners", "refs", "cleaned")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Future] = None
+        self.listeners: List[ProgressHook] = []
+        self.refs = 0
+        self.cleaned = False
+
+
+class DownloadFlights:
+    """Single-flight coalescing of identical downloads.
+
+    The first caller for a key starts the job; callers arriving while it is still
+    running (or while its file is still being streamed) attach to the same job,
+    receive its progress events and get the same file. The file is removed only
+    after every consumer has released it.
+    """
+
+    def __init__(self, cleanup: Callable[[str], None] = remove_download):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self._cleanup_path = cleanup
+        self.started = 0
+        self.coalesced = 0
+
+    async def acquire(
+        self,
+        key: Hashable,
+        start: Callable[[ProgressHook], Awaitable[str]],
+        listener: Optional[ProgressHook] = None,
+    ) -> Tuple[str, Callable[[], None]]:
+        """Join or start the download for ``key``.
+
+        ``start(hook)`` must return an awaitable resolving to the downloaded path;
+        ``hook`` fans progress out to every attached listener. Returns the path and
+        a ``release`` callable the caller must invoke once it is done with the file.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            new = flight is None
+            if new:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.started += 1
+            else:
+                self.coalesced += 1
+            flight.refs += 1
+            if listener is not None:
+                flight.listeners.append(listener)
+
+        if new:
+            def emit(status: dict) -> None:
+                for hook in list(flight.listeners):
+                    try:
+                        hook(status)
+                    except Exception:
+                        logger.exception("progress listener failed")
+
+            flight.task = asyncio.ensure_future(start(emit))
+            flight.task.add_done_callback(
+                lambda t: self._on_done(key, flight, t))
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            self._release(key, flight, listener)
+
+        try:
+            # shield: one consumer going away must not cancel the shared job
+            path = await asyncio.shield(flight.task)
+        except BaseException:
+            release()
+            raise
+        return path, release
+
+    def _on_done(self, key: Hashable, flight: _Flight, task: asyncio.Future) -> None:
+        if task.cancelled() or task.exception() is not None:
+            # forget failed jobs right away so the next request retries from scratch
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+        with self._lock:
+            idle = flight.refs == 0
+        if idle:
+            self._cleanup(flight)
+
+    def _release(self, key: Hashable, flight: _Flight, listener: Optional[ProgressHook]) -> None:
+        with self._lock:
+            flight.refs -= 1
+            if listener is not None and listener in flight.listeners:
+                flight.listeners.remove(listener)
+            if flight.refs > 0:
+                return
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if flight.task is not None and flight.task.done():
+            self._cleanup(flight)
+        # otherwise _on_done cleans up when the job finishes
+
+    def _cleanup(self, flight: _Flight) -> None:
+        with self._lock:
+            if flight.cleaned:
+                return
+            flight.cleaned = True
+        task = flight.task
+        if task is None or task.cancelled() or task.exception() is not None:
+            return
+        self._cleanup_path(task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "started": self.started,
+                "coalesced": self.coalesced,
+            }
+
+
+download_flights = DownloadFlights()
@@ -0,0 +1,237 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import ssl
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger("ytdl")
+
+# read size when streaming media bodies to disk
+CHUNK_SIZE = 1024 * 1024
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class SharedHttpClient:
+    """One pooled ``httpx.AsyncClient`` for the process, living on its own event loop thread.
+
+    Worker threads (yt-dlp downloads) call the blocking helpers, which run on that
+    loop via ``run_coroutine_threadsafe``; async code awaits ``acall``. Keeping a
+    single client means connections (and TLS sessions) to the same CDN hosts are
+    reused across requests instead of being set up per download.
+
+    Uses environment variables:
+    - HTTP_MAX_CONNECTIONS: total open connections (default 100)
+    - HTTP_MAX_KEEPALIVE: idle connections kept for reuse (default 20)
+    - HTTP_KEEPALIVE_EXPIRY: seconds an idle connection is kept (default 30)
+    - HTTP_TIMEOUT: connect/read timeout in seconds (default 30)
+    - HTTP2: negotiate HTTP/2 when the ``h2`` package is installed (default 1)
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        self.max_keepalive = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+        self.keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.timeout = float(os.getenv("HTTP_TIMEOUT", "30"))
+        self.http2 = os.getenv("HTTP2", "1") != "0" and _http2_available()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: Dict[bool, "httpx.AsyncClient"] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ytdl-http", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def client(self, verify: bool = True) -> "httpx.AsyncClient":
+        """The pooled client; only use it from coroutines running on the client loop."""
+        # only ever called on the client loop, so no locking needed
+        client = self._clients.get(verify)
+        if client is None:
+            import httpx
+
+            if verify:
+                # TLS 1.2 or newer, like the old requests adapter
+                context = ssl.create_default_context()
+                context.minimum_version = ssl.TLSVersion.TLSv1_2
+            else:
+                context = ssl.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                verify=context,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self._clients[verify] = client
+        return client
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Future:
+        """Schedule ``fn(*args)`` on the client loop and return a concurrent future."""
+        return asyncio.run_coroutine_threadsafe(fn(*args), self._ensure_loop())
+
+    def call(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """Blocking: run ``fn(*args)`` on the client loop and return its result."""
+        return self.submit(fn, *args).result()
+
+    async def acall(self, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """Await ``fn(*args)`` run on the client loop from any other event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def start(self) -> None:
+        """Start the loop thread and build the client ahead of first use."""
+        async def _build():
+            self.client()
+
+        self.call(_build)
+
+    async def _head(self, url: str, verify: bool):
+        return await self.client(verify).head(url)
+
+    def head(self, url: str, verify: bool = True) -> "httpx.Response":
+        return self.call(self._head, url, verify)
+
+    async def _download(self, url: str, path: str, verify: bool,
+                        progress_hook: Optional[Callable[[dict], None]],
+                        probe: Optional["httpx.Response"]) -> int:
+        from app.segmented import RangesUnsupported, in_thread, segmented_download, state_path
+
+        # large files from range-capable servers go over several connections
+        try:
+            return await segmented_download(self.client(verify), url, path, progress_hook, probe=probe)
+        except RangesUnsupported:
+            if os.path.exists(state_path(path)):
+                os.remove(state_path(path))
+
+        written = 0
+        async with self.client(verify).stream("GET", url) as resp:
+            resp.raise_for_status()
+            total = int(resp.headers.get("content-length") or 0) or None
+            # keep disk writes off the client loop every request shares
+            f = await in_thread(open, path, "wb")
+            try:
+                async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                    await in_thread(f.write, chunk)
+                    written += len(chunk)
+                    if progress_hook:
+                        progress_hook({"status": "downloading", "downloaded_bytes": written,
+                                       "total_bytes": total, "filename": path})
+            finally:
+                await in_thread(f.close)
+        if progress_hook:
+            progress_hook({"status": "finished", "downloaded_bytes": written,
+                           "total_bytes": written, "filename": path})
+        return written
+
+    def download(self, url: str, path: str, verify: bool = True,
+                 progress_hook: Optional[Callable[[dict], None]] = None,
+                 probe: Optional["httpx.Response"] = None) -> int:
+        """Blocking: fetch ``url`` into ``path``; returns the bytes written.
+
+        Large files are fetched in parallel byte ranges when the server allows it
+        (see ``app.segmented``), otherwise as one stream. Pass the ``head`` response
+        as ``probe`` if there is one, so the size and range support aren't asked again.
+        """
+        return self.call(self._download, url, path, verify, progress_hook, probe)
+
+    def download_with_fallback(self, url: str, path: str,
+                               progress_hook: Optional[Callable[[dict], None]] = None,
+                               probe: Optional["httpx.Response"] = None) -> int:
+        """``download``, retrying without certificate checks on TLS errors as a last resort."""
+        try:
+            return self.download(url, path, progress_hook=progress_hook, probe=probe)
+        except Exception as e:
+            if not is_tls_error(e):
+                raise
+            logger.warning("TLS error for %s, retrying without certificate verification", url)
+            return self.download(url, path, verify=False, progress_hook=progress_hook, probe=probe)
+
+    async def _open(self, url: str, headers: Optional[Dict[str, str]]) -> "httpx.Response":
+        client = self.client()
+        return await client.send(client.build_request("GET", url, headers=headers), stream=True)
+
+    async def open_stream(self, url: str, headers: Optional[Dict[str, str]] = None) -> "UpstreamStream":
+        """Start a GET for ``url`` and return once its headers arrive.
+
+        May be awaited from any event loop; the body is read through the returned
+        ``UpstreamStream`` which must be closed.
+        """
+        return UpstreamStream(self, await self.acall(self._open, url, headers))
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"http2": self.http2, "started": self._loop is not None}
+        client = self._clients.get(True)
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if pool is not None:
+            conns = list(getattr(pool, "connections", []))
+            out["connections"] = len(conns)
+            out["idle_connections"] = sum(1 for c in conns if c.is_idle())
+        return out
+
+    def close(self) -> None:
+        if self._loop is None:
+            return
+
+        async def _close():
+            for client in list(self._clients.values()):
+                await client.aclose()
+            self._clients.clear()
+
+        self.call(_close)
+
+
+class UpstreamStream:
+    """Body of a response opened on the client loop, readable from any other loop."""
+
+    def __init__(self, owner: SharedHttpClient, response: "httpx.Response"):
+        self._owner = owner
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._chunks = response.aiter_bytes(256 * 1024)
+
+    async def _next(self) -> Optional[bytes]:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def __aiter__(self):
+        while True:
+            chunk = await self._owner.acall(self._next)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self._owner.acall(self.response.aclose)
+
+
+def is_tls_error(exc: BaseException) -> bool:
+    """Whether ``exc`` (or its cause chain) is an SSL/TLS failure."""
+    while exc is not None:
+        if isinstance(exc, ssl.SSLError) or "SSL" in type(exc).__name__ \
+                or "CERTIFICATE_VERIFY_FAILED" in str(exc) or "UNEXPECTED_EOF_WHILE_READING" in str(exc):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+http_client = SharedHttpClient()
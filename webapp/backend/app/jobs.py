@@ -0,0 +1,221 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.diskcache import download_cache
+from app.progress import notifier
+from app.ytdl import download_to_file
+
+logger = logging.getLogger("ytdl")
+
+# Where job artifacts are written; must be shared storage when workers run elsewhere.
+JOBS_DIR = os.getenv("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "ytdl_jobs")
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "3600"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+QUEUE_NAME = os.getenv("JOB_QUEUE_NAME", "downloads")
+
+
+def _progress_fields(status: dict) -> Dict[str, Any]:
+    return {
+        "status": status.get("status"),
+        "downloaded_bytes": status.get("downloaded_bytes"),
+        "total_bytes": status.get("total_bytes") or status.get("total_bytes_estimate"),
+        "speed": status.get("speed"),
+        "eta": status.get("eta"),
+    }
+
+
+def _download_job(url: str, format_id: Optional[str], job_id: str, hook) -> str:
+    """Download ``url`` for job ``job_id`` and return the artifact path."""
+    cached = download_cache.get(url, format_id)
+    if cached:
+        return cached
+
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    if not download_cache.enabled:
+        return download_to_file(url, format_id, progress_hook=hook, temp_root=job_dir)
+
+    path = download_to_file(url, format_id, progress_hook=hook,
+                            temp_root=download_cache.staging_root)
+    cached = download_cache.put(url, format_id, path)
+    if cached == path:
+        # not cacheable (e.g. over quota): keep it as this job's own artifact
+        target = os.path.join(job_dir, os.path.basename(path))
+        shutil.move(path, target)
+        cached = target
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    return cached
+
+
+def run_download_job(url: str, format_id: Optional[str] = None) -> str:
+    """rq job body: download ``url``, recording progress in the job's meta."""
+    from rq import get_current_job
+
+    job = get_current_job()
+    job_id = job.id if job else uuid.uuid4().hex
+    last_saved = 0.0
+
+    def hook(status: dict) -> None:
+        nonlocal last_saved
+        # with PROGRESS_BACKEND=redis this reaches /api/progress/{job_id} on any API worker
+        notifier.publish_threadsafe(job_id, _progress_fields(status))
+        if job is None:
+            return
+        now = time.monotonic()
+        # job meta lives in Redis; don't write it on every yt-dlp tick
+        if status.get("status") == "downloading" and now - last_saved < 1:
+            return
+        last_saved = now
+        try:
+            job.meta["progress"] = _progress_fields(status)
+            job.save_meta()
+        except Exception:
+            logger.exception("failed to save job progress")
+
+    return _download_job(url, format_id, job_id, hook)
+
+
+def sweep_artifacts(ttl: int = JOB_RESULT_TTL) -> None:
+    """Remove job artifact directories older than ``ttl`` seconds."""
+    cutoff = time.time() - ttl
+    try:
+        names = os.listdir(JOBS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class LocalJobQueue:
+    """In-process job queue used when no Redis is configured (development and tests).
+
+    Jobs run on a private thread pool of JOB_WORKERS threads (default 2).
+    """
+
+    backend = "local"
+
+    def __init__(self, max_workers: Optional[int] = None):
+        workers = max_workers or int(os.getenv("JOB_WORKERS", "2"))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ytdl-job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url: str, format_id: Optional[str] = None, job_id: Optional[str] = None,
+               on_done: Optional[Callable[[str], None]] = None) -> str:
+        """Queue a download; ``on_done(job_id)`` is called once it has finished or failed."""
+        self._prune()
+        job_id = job_id or uuid.uuid4().hex
+        job = {"id": job_id, "status": "queued", "created_at": time.time(),
+               "progress": None, "path": None, "error": None}
+        with self._lock:
+            self._jobs[job_id] = job
+        self._pool.submit(self._run, job, url, format_id, on_done)
+        return job_id
+
+    def _run(self, job: Dict[str, Any], url: str, format_id: Optional[str],
+             on_done: Optional[Callable[[str], None]]) -> None:
+        job["status"] = "started"
+
+        def hook(status: dict) -> None:
+            job["progress"] = _progress_fields(status)
+            notifier.publish_threadsafe(job["id"], job["progress"])
+
+        try:
+            job["path"] = _download_job(url, format_id, job["id"], hook)
+            job["status"] = "finished"
+        except Exception as e:
+            logger.exception("job %s failed", job["id"])
+            job["error"] = str(e)
+            job["status"] = "failed"
+        job["ended_at"] = time.time()
+        if on_done is not None:
+            on_done(job["id"])
+
+    def _prune(self) -> None:
+        sweep_artifacts()
+        cutoff = time.time() - JOB_RESULT_TTL
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items()
+                           if job.get("ended_at", time.time()) < cutoff]:
+                del self._jobs[job_id]
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {k: job[k] for k in ("id", "status", "progress", "path", "error")}
+
+
+class RQJobQueue:
+    """Job queue backed by rq; downloads run in ``python -m app.worker`` processes.
+
+    ``connection`` may be any redis-py compatible client (e.g. fakeredis in tests).
+    """
+
+    backend = "rq"
+
+    def __init__(self, connection):
+        from rq import Queue
+
+        self.connection = connection
+        self.queue = Queue(QUEUE_NAME, connection=connection)
+
+    def submit(self, url: str, format_id: Optional[str] = None, job_id: Optional[str] = None,
+               on_done: Optional[Callable[[str], None]] = None) -> str:
+        """Enqueue a download. ``on_done`` is not called: the job ends in another
+        process, so callers learn about it from ``status``."""
+        job = self.queue.enqueue(
+            run_download_job, url, format_id, job_id=job_id,
+            job_timeout=JOB_TIMEOUT, result_ttl=JOB_RESULT_TTL, failure_ttl=JOB_RESULT_TTL)
+        return job.id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        from rq.exceptions import NoSuchJobError
+        from rq.job import Job
+
+        try:
+            job = Job.fetch(job_id, connection=self.connection)
+        except NoSuchJobError:
+            return None
+        status = job.get_status(refresh=False)
+        status = getattr(status, "value", status)
+        out = {"id": job.id, "status": status, "progress": job.meta.get("progress"),
+               "path": None, "error": None}
+        if status == "finished":
+            out["path"] = job.return_value()
+        elif status == "failed" and job.exc_info:
+            # keep only the final "SomeError: message" line of the traceback
+            out["error"] = job.exc_info.strip().splitlines()[-1]
+        return out
+
+
+def make_job_queue():
+    """Pick the rq queue when Redis is configured, else the in-process queue.
+
+    JOB_QUEUE=local|rq forces a backend.
+    """
+    backend = os.getenv("JOB_QUEUE") or ("rq" if os.getenv("REDIS_URL") else "local")
+    if backend == "rq":
+        try:
+            import redis
+
+            return RQJobQueue(redis.Redis.from_url(os.getenv("REDIS_URL")))
+        except Exception:
+            logger.exception("rq job queue unavailable, using in-process queue")
+    return LocalJobQueue()
+
+
+job_queue = make_job_queue()
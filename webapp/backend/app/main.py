@@ -1,30 +1,56 @@
 import os
-import shutil
-import tempfile
-import zipfile
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import asyncio
 import json
-from typing import Dict
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
 import mimetypes
 
 from app.ytdl import get_info, download_to_file
-from app.ratelimit import rate_limiter
+from app.ratelimit import rate_limiter, RateLimitHeadersMiddleware
+from app.admission import admission
+from app.ydlpool import ydl_pool
+from app.httpclient import http_client
+from app.executor import info_executor, download_executor, host_limiter
+from app.cache import info_cache
+from app.flights import download_flights, remove_download
+from app.diskcache import download_cache
+from app.jobs import JOB_RESULT_TTL, JOB_TIMEOUT, job_queue
+from app.zipstream import ZipStream
+from app.responses import DownloadFileResponse, PassThroughResponse
+from app.progress import notifier, ProgressMultiplexer
+from app.passthrough import STREAM_TEE, PassThrough, content_disposition, stream_filename, stream_source
+from app.warmup import warmup
+from app.metrics import metrics
+from app.tracing import TracingMiddleware, profiler, tracer
+from contextlib import AsyncExitStack, asynccontextmanager
 from fastapi import Depends
 from fastapi.security import APIKeyHeader
-import os
 
 import logging
 import re
+import time
+import uuid
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # start serving right away; yt-dlp is loaded in the background
+    warmup.start()
+    metrics.start()
+    yield
+    metrics.stop()
+    tracer.flush()
+
 
-app = FastAPI(title="Youtube Downloader API")
+app = FastAPI(title="Youtube Downloader API", lifespan=lifespan)
 logger = logging.getLogger("ytdl")
 if not logger.handlers:
     # ensure logs are written to a file for realtime inspection
-    log_dir = os.path.join(os.path.dirname(__file__), '..', 'logs')
+    log_dir = os.getenv("LOG_DIR") or os.path.join(os.path.dirname(__file__), '..', 'logs')
     try:
         os.makedirs(log_dir, exist_ok=True)
     except Exception:
@@ -42,29 +68,28 @@ if not logger.handlers:
     logger = logging.getLogger("ytdl")
 
 
-# Simple progress notifier for Server-Sent Events (SSE)
-class ProgressNotifier:
-    def __init__(self):
-        # map download_id -> asyncio.Queue
-        self.queues: Dict[str, asyncio.Queue] = {}
-
-    def get_queue(self, download_id: str) -> asyncio.Queue:
-        if download_id not in self.queues:
-            self.queues[download_id] = asyncio.Queue()
-        return self.queues[download_id]
-
-    async def publish(self, download_id: str, message: dict) -> None:
-        q = self.get_queue(download_id)
-        await q.put(message)
-
-    async def iterate(self, download_id: str):
-        q = self.get_queue(download_id)
-        while True:
-            msg = await q.get()
-            yield msg
-
-
-notifier = ProgressNotifier()
+def _info_summary(info: dict) -> dict:
+    """Select the metadata and format fields the frontend needs from a yt-dlp info dict."""
+    return {
+        "title": info.get("title"),
+        "id": info.get("id"),
+        "uploader": info.get("uploader"),
+        "duration": info.get("duration"),
+        "thumbnails": info.get("thumbnails"),
+        "formats": [
+            {
+                "format_id": f.get("format_id"),
+                "ext": f.get("ext"),
+                "format_note": f.get("format_note"),
+                "filesize": f.get("filesize"),
+                "height": f.get("height"),
+                "width": f.get("width"),
+                "acodec": f.get("acodec"),
+                "vcodec": f.get("vcodec"),
+            }
+            for f in info.get("formats", [])
+        ],
+    }
 
 
 def _clean_exc_msg(e: Exception) -> str:
@@ -76,6 +101,15 @@ def _clean_exc_msg(e: Exception) -> str:
     return s.strip()
 
 
+# Fan-out settings for /api/infos: parallel lookups per request and per-URL timeout (seconds)
+INFOS_CONCURRENCY = int(os.getenv("INFOS_CONCURRENCY", "8"))
+INFO_TIMEOUT = float(os.getenv("INFO_TIMEOUT", "60"))
+# Progress WebSocket: seconds between batched updates and max channels per connection
+PROGRESS_TICK = float(os.getenv("PROGRESS_TICK", "0.25"))
+PROGRESS_WS_MAX_SUBSCRIPTIONS = int(os.getenv("PROGRESS_WS_MAX_SUBSCRIPTIONS", "500"))
+# Items of one /api/downloads batch fetched at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+
 # Configure CORS from environment (comma-separated) or default to allow all in dev
 allowed = os.getenv("ALLOWED_ORIGINS", "*")
 if allowed.strip() == "*":
@@ -90,6 +124,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RateLimitHeadersMiddleware)
+# outermost, so the root span covers the whole request including other middleware
+app.add_middleware(TracingMiddleware)
 
 
 class InfoRequest(BaseModel):
@@ -100,10 +137,14 @@ class DownloadRequest(BaseModel):
     url: str
     format_id: str | None = None
     output_dir: str | None = None  # Optional output directory path
+    # pipe single-file formats to the client while they download instead of after
+    stream: bool = False
 
 
 class InfoListRequest(BaseModel):
     urls: list[str]
+    # stream results as NDJSON in completion order instead of one ordered array
+    stream: bool = False
 
 
 class BatchDownloadRequest(BaseModel):
@@ -116,19 +157,131 @@ class BatchDownloadRequest(BaseModel):
 api_key_header = APIKeyHeader(name="X-API-KEY", auto_error=False)
 
 
-async def auth_and_rate_limit(request: Request, api_key: str | None = Depends(api_key_header)):
-    """Check API key if configured, then apply a simple rate limit per key or client IP."""
+async def require_api_key(api_key: str | None = Depends(api_key_header)):
+    """Check API key if configured."""
     configured = os.getenv("API_KEY")
-    # verify API key if configured
     if configured:
         if not api_key or api_key != configured:
             raise HTTPException(
                 status_code=401, detail="Invalid or missing API key")
 
-    # choose rate-limit key: API key if present, else client IP
-    key = api_key if api_key else (
+
+def _parse_costs(spec: str) -> dict:
+    costs = {}
+    for part in spec.split(","):
+        path, _, cost = part.partition("=")
+        if path.strip() and cost.strip():
+            costs[path.strip()] = int(cost)
+    return costs
+
+
+# Rate-limit weight per request (per item for batch endpoints), e.g. "/api/download=5,/api/jobs=5"
+REQUEST_COSTS = _parse_costs(os.getenv("RATE_COSTS", ""))
+
+
+def _client_key(request: Request, api_key: str | None) -> str:
+    # API key if present, else client IP
+    return api_key if api_key else (
         request.client.host if request.client else "unknown")
-    rate_limiter.check(key)
+
+
+async def auth_and_rate_limit(request: Request, api_key: str | None = Depends(api_key_header)):
+    """Check API key if configured, then apply a simple rate limit per key or client IP."""
+    await require_api_key(api_key)
+
+    key = _client_key(request, api_key)
+    request.state.client_key = key
+    request.state.rate_limit = await _check_rate(key, REQUEST_COSTS.get(request.url.path, 1))
+
+
+async def _check_rate(key: str, cost: int):
+    try:
+        if rate_limiter.use_redis:
+            # a Redis round-trip (up to RATE_REDIS_TIMEOUT) must not stall the loop
+            result = await asyncio.to_thread(rate_limiter.check, key, cost)
+        else:
+            result = rate_limiter.check(key, cost)
+    except HTTPException as e:
+        if e.status_code == 429:
+            metrics.rate_limited(False)
+        raise
+    metrics.rate_limited(True)
+    return result
+
+
+async def _charge_items(request: Request, count: int) -> None:
+    """Charge the rate limit for the items of a batch beyond the first."""
+    if count > 1:
+        cost = REQUEST_COSTS.get(request.url.path, 1) * (count - 1)
+        request.state.rate_limit = await _check_rate(request.state.client_key, cost)
+
+
+def _served(started: float) -> None:
+    """Record the serve phase of a response whose body started at ``started`` (perf_counter)."""
+    took = time.perf_counter() - started
+    metrics.observe_phase("serve", took)
+    now = time.time()
+    tracer.record("serve", now - took, now)
+
+
+def _delivered(key: str, nbytes: int, mode: str) -> None:
+    """Count bytes handed to a client against its quota and in the metrics."""
+    admission.charge_bytes(key, nbytes)
+    metrics.delivered(nbytes, mode)
+
+
+@app.get("/api/health")
+async def api_health():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/api/ready")
+async def api_ready():
+    """Readiness: 503 until the background warm-up has finished."""
+    if not warmup.ready.is_set():
+        return JSONResponse({"status": "warming_up"}, status_code=503)
+    return {"status": "ready", "warmup": warmup.stats()}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus exposition of the counters, histograms and sampled gauges in app.metrics."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    body, content_type = await asyncio.to_thread(metrics.render)
+    return Response(body, media_type=content_type)
+
+
+@app.get("/api/profiles/{profile_id}")
+async def api_profile(profile_id: str, request: Request):
+    """Collapsed-stack profile of a request sent with ``X-Profile``; needs the same header."""
+    if not profiler.authorized(request.headers.get("X-Profile")):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    text = profiler.load(profile_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Unknown profile")
+    return Response(text, media_type="text/plain")
+
+
+@app.get("/api/stats")
+async def api_stats():
+    """Report pool occupancy and cache counters."""
+    return JSONResponse({
+        "pools": {
+            "info": info_executor.stats(),
+            "download": download_executor.stats(),
+        },
+        "rate_limit": rate_limiter.stats(),
+        "admission": admission.stats(),
+        "ydl_pool": ydl_pool.stats(),
+        "http": http_client.stats(),
+        "active_hosts": host_limiter.stats(),
+        "info_cache": info_cache.stats(),
+        "downloads": download_flights.stats(),
+        "download_cache": download_cache.stats(),
+        "progress": notifier.stats(),
+    })
 
 
 @app.post("/api/info")
@@ -137,67 +290,220 @@ async def api_info(req: InfoRequest, _=Depends(auth_and_rate_limit)):
     try:
         # pydantic created a dict for req; build a fake Request for header-based auth not available here
         # Info endpoint is typically safe, but still allow API_KEY protection via header if set.
-        info = get_info(req.url)
+        info = await info_executor.run(get_info, req.url)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error in api_info")
         raise HTTPException(status_code=400, detail=_clean_exc_msg(e))
 
     # Return selected metadata + formats
-    out = {
-        "title": info.get("title"),
-        "id": info.get("id"),
-        "uploader": info.get("uploader"),
-        "duration": info.get("duration"),
-        "thumbnails": info.get("thumbnails"),
-        "formats": [
-            {
-                "format_id": f.get("format_id"),
-                "ext": f.get("ext"),
-                "format_note": f.get("format_note"),
-                "filesize": f.get("filesize"),
-                "height": f.get("height"),
-                "width": f.get("width"),
-                "acodec": f.get("acodec"),
-                "vcodec": f.get("vcodec"),
-            }
-            for f in info.get("formats", [])
-        ],
-    }
-    return JSONResponse(out)
+    return JSONResponse(_info_summary(info))
 
 
-@app.post("/api/infos")
-async def api_infos(req: InfoListRequest, _=Depends(auth_and_rate_limit)):
-    results = []
-    for url in req.urls:
+async def _resolve_info(url: str, sem: asyncio.Semaphore) -> dict:
+    """Fetch info for one URL of a batch, turning failures and timeouts into an error entry."""
+    async with sem:
         try:
-            info = get_info(url)
-            out = {
-                "url": url,
-                "title": info.get("title"),
-                "id": info.get("id"),
-                "uploader": info.get("uploader"),
-                "duration": info.get("duration"),
-                "thumbnails": info.get("thumbnails"),
-                "formats": [
-                    {
-                        "format_id": f.get("format_id"),
-                        "ext": f.get("ext"),
-                        "format_note": f.get("format_note"),
-                        "filesize": f.get("filesize"),
-                        "height": f.get("height"),
-                        "width": f.get("width"),
-                        "acodec": f.get("acodec"),
-                        "vcodec": f.get("vcodec"),
-                    }
-                    for f in info.get("formats", [])
-                ],
-            }
+            info = await asyncio.wait_for(
+                info_executor.run(get_info, url), timeout=INFO_TIMEOUT)
+            return {"url": url, **_info_summary(info)}
+        except asyncio.TimeoutError:
+            logger.warning("Timed out fetching info for %s", url)
+            return {"url": url, "error": f"Timed out after {INFO_TIMEOUT:g}s"}
+        except HTTPException as e:
+            return {"url": url, "error": e.detail}
         except Exception as e:
             logger.exception("Error fetching info for %s", url)
-            out = {"url": url, "error": _clean_exc_msg(e)}
-        results.append(out)
-    return JSONResponse(results)
+            return {"url": url, "error": _clean_exc_msg(e)}
+
+
+@app.post("/api/infos")
+async def api_infos(req: InfoListRequest, request: Request, _=Depends(auth_and_rate_limit)):
+    await _charge_items(request, len(req.urls))
+    sem = asyncio.Semaphore(max(1, INFOS_CONCURRENCY))
+
+    if not req.stream:
+        # resolve concurrently but answer with an array in request order
+        results = await asyncio.gather(*(_resolve_info(u, sem) for u in req.urls))
+        return JSONResponse(list(results))
+
+    async def _indexed(idx: int, url: str):
+        return idx, await _resolve_info(url, sem)
+
+    async def ndjson_generator():
+        # one JSON object per line, emitted as soon as each URL resolves
+        tasks = [asyncio.ensure_future(_indexed(i, u))
+                 for i, u in enumerate(req.urls)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                idx, out = await fut
+                yield json.dumps({"index": idx, **out}) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
+
+
+async def _acquire_download(url: str, format_id: str | None, hook, output_dir: str | None = None):
+    """Download ``url`` or attach to an identical download already in flight.
+
+    Returns the file path and a ``release`` callable to invoke once the caller no
+    longer needs the file.
+    """
+    if output_dir is None and download_cache.enabled:
+        # meta.json reads and writes; kept off the event loop
+        cached = await asyncio.to_thread(download_cache.get, url, format_id, True)
+        if cached:
+            return cached, lambda: download_cache.unpin(cached)
+
+    def fetch(emit):
+        if output_dir is not None or not download_cache.enabled:
+            return download_to_file(url, format_id, progress_hook=emit, output_dir=output_dir)
+        # download next to the cache so adding it is a rename, then drop the temp dir
+        path = download_to_file(url, format_id, progress_hook=emit,
+                                temp_root=download_cache.staging_root)
+        cached = download_cache.put(url, format_id, path)
+        if cached != path:
+            remove_download(path)
+        if download_cache.owns(cached):
+            # held until the flight's last consumer is done (remove_download unpins it)
+            download_cache.pin(cached)
+        return cached
+
+    async def start(emit):
+        # wait for a per-host slot before taking a pool slot so throttled hosts don't
+        # tie up the process-wide download budget
+        async with host_limiter.limit(url):
+            return await download_executor.run(fetch, emit)
+
+    return await download_flights.acquire((url, format_id, output_dir), start, listener=hook)
+
+
+async def _stream_download(req: DownloadRequest, request: Request, hook, slot) -> StreamingResponse | None:
+    """Open a pass-through response for ``req``, or None if it needs a full download.
+
+    Only single-file HTTP(S) formats can be piped; anything else falls back to the
+    regular path, as does any failure before the first byte: an info lookup error,
+    a refused or timed-out upstream connection, or an error status. The client's
+    Range header is forwarded so seeking works without a local copy.
+    """
+    try:
+        info = await info_executor.run(get_info, req.url)
+    except Exception as e:
+        logger.warning("info lookup for %s failed (%s), downloading instead", req.url, e)
+        return None
+    source = stream_source(info, req.format_id)
+    if source is None:
+        return None
+    headers = source["headers"]
+    range_header = request.headers.get("range")
+    if range_header:
+        headers["Range"] = range_header
+    exits = AsyncExitStack()
+    try:
+        await exits.enter_async_context(host_limiter.limit(source["url"]))
+        with tracer.span("upstream_open", url=source["url"]):
+            upstream = await http_client.open_stream(source["url"], headers)
+    except Exception as e:
+        # connect errors and timeouts (httpx.HTTPError, OSError) included
+        logger.warning("upstream unreachable for %s (%s), downloading instead", req.url, e)
+        await exits.aclose()
+        return None
+    except BaseException:
+        await exits.aclose()
+        raise
+    if upstream.status_code >= 400:
+        logger.warning("upstream answered %d for %s, downloading instead", upstream.status_code, req.url)
+        await upstream.aclose()
+        await exits.aclose()
+        return None
+
+    key = request.state.client_key
+    started = time.perf_counter()
+
+    def on_close(sent: int):
+        _delivered(key, sent, "stream")
+        _served(started)
+        slot.release()
+
+    passthrough = PassThrough(
+        upstream, req.url, req.format_id, stream_filename(info, source["ext"]), exits,
+        # a partial body can't be cached
+        tee=STREAM_TEE and not range_header and upstream.status_code == 200,
+        progress_hook=hook, on_close=on_close)
+    headers = passthrough.headers()
+    headers["Content-Disposition"] = content_disposition(passthrough.filename)
+    return PassThroughResponse(passthrough.body(), status_code=upstream.status_code, headers=headers,
+                               media_type=headers.get("content-type", "application/octet-stream"),
+                               background=BackgroundTask(passthrough.aclose))
+
+
+@app.get("/api/progress/{download_id}")
+async def progress_stream(download_id: str, request: Request):
+    """Server-Sent Events for one download; resumes after Last-Event-ID on reconnect."""
+    last_event_id = request.headers.get("Last-Event-ID")
+
+    async def event_generator():
+        metrics.stream_opened()
+        try:
+            async for event_id, msg in notifier.iterate(download_id, last_event_id, heartbeat=15):
+                if msg is None:
+                    yield ": keepalive\n\n"
+                    continue
+                try:
+                    s = json.dumps(msg)
+                except Exception:
+                    s = json.dumps({"error": "bad message"})
+                yield f"id: {event_id}\ndata: {s}\n\n"
+        except asyncio.CancelledError:
+            return
+        finally:
+            metrics.stream_closed()
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/api/progress/ws")
+async def progress_ws(websocket: WebSocket):
+    """Follow many downloads/jobs over one connection.
+
+    Clients send ``{"subscribe": [ids], "unsubscribe": [ids], "last_event_ids": {id: n}}``
+    at any time and receive ``{"type": "progress", "updates": [...]}`` every
+    PROGRESS_TICK seconds with only the fields that changed per download (and
+    batch ``idx``).
+    """
+    await websocket.accept()
+    mux = ProgressMultiplexer(notifier, PROGRESS_WS_MAX_SUBSCRIPTIONS)
+    metrics.stream_opened()
+
+    async def ticker():
+        while True:
+            await asyncio.sleep(PROGRESS_TICK)
+            updates = mux.drain()
+            if updates:
+                await websocket.send_json({"type": "progress", "updates": updates})
+
+    tick_task = asyncio.ensure_future(ticker())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                msg = json.loads(raw)
+                mux.unsubscribe(msg.get("unsubscribe") or [])
+                mux.subscribe(msg.get("subscribe") or [], msg.get("last_event_ids"))
+            except (ValueError, AttributeError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e) or "bad message"})
+                continue
+            await websocket.send_json({"type": "subscribed", "ids": sorted(mux.channels)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tick_task.cancel()
+        await mux.close()
+        metrics.stream_closed()
 
 
 @app.post("/api/download")
@@ -220,84 +526,74 @@ async def api_download(req: DownloadRequest, request: Request, _=Depends(auth_an
                 "speed": status.get("speed"),
                 "eta": status.get("eta"),
             }
-            asyncio.create_task(notifier.publish(download_id, out))
+            notifier.publish_threadsafe(download_id, out)
         except Exception:
             logger.exception("progress hook failed")
 
+    # Validate output_dir if provided (basic security check)
+    if req.output_dir:
+        # Convert to absolute and normalize
+        abs_path = os.path.abspath(req.output_dir)
+        # Basic validation that path isn't trying to escape to system directories
+        if abs_path.startswith(('/windows', '/system32', '/boot', '/etc')):
+            raise HTTPException(
+                status_code=400, detail="Invalid output directory")
+
+    key = request.state.client_key
+    # download managers and players fetch a served file in parallel Range requests;
+    # when it's in the download cache those cost no download, so they take no slot
+    continuation = (request.headers.get("range") is not None and not req.output_dir
+                    and download_cache.contains(req.url, req.format_id))
+    slot = await _admit(key, continuation)
     try:
-        # Validate output_dir if provided (basic security check)
-        if req.output_dir:
-            # Convert to absolute and normalize
-            abs_path = os.path.abspath(req.output_dir)
-            # Basic validation that path isn't trying to escape to system directories
-            if abs_path.startswith(('/windows', '/system32', '/boot', '/etc')):
-                raise HTTPException(
-                    status_code=400, detail="Invalid output directory")
-
-        file_path = download_to_file(
-            req.url, req.format_id, progress_hook=_progress_hook,
-            output_dir=req.output_dir)
+        if req.stream and not req.output_dir and not download_cache.contains(req.url, req.format_id):
+            streamed = await _stream_download(req, request, _progress_hook, slot)
+            if streamed is not None:
+                return streamed
+        with tracer.span("acquire_download", url=req.url, format_id=req.format_id):
+            file_path, release_file = await _acquire_download(
+                req.url, req.format_id, _progress_hook, output_dir=req.output_dir)
+    except HTTPException:
+        slot.release()
+        raise
     except Exception as e:
+        slot.release()
         logger.exception("Error in api_download for %s", req.url)
         raise HTTPException(status_code=500, detail=_clean_exc_msg(e))
+    except BaseException:
+        # cancelled while waiting for the download
+        slot.release()
+        raise
 
-    @app.get("/api/progress/{download_id}")
-    async def progress_stream(download_id: str):
-        async def event_generator():
-            try:
-                async for msg in notifier.iterate(download_id):
-                    try:
-                        s = json.dumps(msg)
-                    except Exception:
-                        s = json.dumps({"error": "bad message"})
-                    yield f"data: {s}\n\n"
-            except asyncio.CancelledError:
-                return
+    served_from = time.perf_counter()
 
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+    def release():
+        _served(served_from)
+        release_file()
+        slot.release()
 
     if not os.path.exists(file_path):
+        release_file()
+        slot.release()
         raise HTTPException(
             status_code=500, detail="Downloaded file not found")
-
-    # determine file size and include Content-Length when available to help client progress
-    try:
-        file_size = os.path.getsize(file_path)
-    except Exception:
-        file_size = None
+    _delivered(key, os.path.getsize(file_path), "file")
 
     # Determine mime type
     mime_type, _ = mimetypes.guess_type(file_path)
     if not mime_type:
         mime_type = "application/octet-stream"
 
-    filename = os.path.basename(file_path)
-
-    def iterfile(path: str):
-        try:
-            with open(path, "rb") as f:
-                for chunk in iter(lambda: f.read(8192), b""):
-                    yield chunk
-        finally:
-            # cleanup - remove the temp directory
-            d = os.path.dirname(path)
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-                if os.path.isdir(d):
-                    shutil.rmtree(d, ignore_errors=True)
-            except Exception:
-                pass
-
-    headers = {"Content-Disposition": f"attachment; filename=\"{filename}\""}
-    if file_size is not None:
-        headers["Content-Length"] = str(file_size)
-
     # publish final event
     if download_id:
-        asyncio.create_task(notifier.publish(
-            download_id, {"status": "finished", "filename": file_path}))
-    return StreamingResponse(iterfile(file_path), media_type=mime_type, headers=headers)
+        notifier.publish_threadsafe(
+            download_id, {"status": "finished", "filename": file_path})
+    # drop our reference after the transfer (or abort); the temp directory goes
+    # once every consumer is done
+    return DownloadFileResponse(
+        file_path, media_type=mime_type, filename=os.path.basename(file_path),
+        content_key=download_cache.digest(req.url, req.format_id) if download_cache.owns(file_path) else None,
+        background=BackgroundTask(release))
 
 
 @app.post("/api/downloads")
@@ -311,9 +607,10 @@ async def api_downloads(req: BatchDownloadRequest, request: Request, _=Depends(a
     else:
         raise HTTPException(status_code=400, detail="No urls/items provided")
 
-    # Prepare a temp workspace for the zip
-    workspace = tempfile.mkdtemp(prefix="ytdl_batch_")
-    downloaded_paths = []
+    await _charge_items(request, len(items))
+    key = request.state.client_key
+    # the whole batch holds one of the client's concurrent slots
+    slot = await _admit(key)
     download_id = request.headers.get("X-Download-Id")
 
     def make_hook(idx: int):
@@ -328,80 +625,137 @@ async def api_downloads(req: BatchDownloadRequest, request: Request, _=Depends(a
                     "total_bytes": status.get("total_bytes") or status.get("total_bytes_estimate"),
                     "filename": status.get("filename"),
                 }
-                asyncio.create_task(notifier.publish(download_id, out))
+                notifier.publish_threadsafe(download_id, out)
             except Exception:
                 logger.exception("batch progress hook failed")
 
         return hook
 
-    try:
-        # Download each file (blocking call to download_to_file)
-        for idx, it in enumerate(items):
+    async def fetch(idx: int, it: DownloadRequest, sem: asyncio.Semaphore):
+        async with sem:
             try:
-                p = download_to_file(it.url, it.format_id,
-                                     progress_hook=make_hook(idx))
+                p, release = await _acquire_download(
+                    it.url, it.format_id, make_hook(idx))
             except Exception as e:
                 logger.exception("Batch download error for %s", it.url)
-                # record failures as simple text files so user knows
-                err_path = os.path.join(
-                    workspace, f"error_{len(downloaded_paths)}.txt")
-                with open(err_path, "w", encoding="utf-8") as ef:
-                    ef.write(
-                        f"Failed to download {it.url}: {_clean_exc_msg(e)}\n")
-                downloaded_paths.append(err_path)
-                continue
-
-            # copy the file into our workspace (download_to_file may create its own temp dir)
-            try:
-                target = os.path.join(workspace, os.path.basename(p))
-                shutil.copy(p, target)
-                downloaded_paths.append(target)
-            except Exception:
-                # if copy fails, still try to include original
-                downloaded_paths.append(p)
-
-        # Create a zip archive containing all files
-        zip_path = os.path.join(workspace, "downloads.zip")
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-            for path in downloaded_paths:
-                # ensure file exists
-                if os.path.exists(path):
-                    zf.write(path, arcname=os.path.basename(path))
-
-        # Stream the zip file and cleanup afterwards
-        def iterzip(p: str):
-            try:
-                with open(p, "rb") as f:
-                    for chunk in iter(lambda: f.read(8192), b""):
-                        yield chunk
-            finally:
-                # cleanup workspace and any leftover temp dirs
-                try:
-                    if os.path.exists(p):
-                        os.remove(p)
-                except Exception:
-                    pass
-                try:
-                    shutil.rmtree(workspace, ignore_errors=True)
-                except Exception:
-                    pass
-
-        headers = {"Content-Disposition": "attachment; filename=downloads.zip"}
+                return idx, it, None, None, e
+        return idx, it, p, release, None
+
+    async def zip_generator():
+        # items download BATCH_CONCURRENCY at a time and each goes into the archive
+        # as soon as it finishes, straight from its download location: no
+        # workspace copy and no zip file on disk
+        zs = ZipStream()
+        sem = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+        tasks = [asyncio.ensure_future(fetch(idx, it, sem))
+                 for idx, it in enumerate(items)]
         try:
-            zsize = os.path.getsize(zip_path)
+            for fut in asyncio.as_completed(tasks):
+                idx, it, p, release, err = await fut
+                if err is not None:
+                    # record failures as simple text files so user knows
+                    yield zs.write_bytes(
+                        f"error_{idx}.txt",
+                        f"Failed to download {it.url}: {_clean_exc_msg(err)}\n".encode("utf-8"))
+                    continue
+                try:
+                    _delivered(key, os.path.getsize(p), "zip")
+                    async for chunk in iterate_in_threadpool(zs.write_file(p, os.path.basename(p))):
+                        if chunk:
+                            yield chunk
+                finally:
+                    release()
+            yield zs.close()
         except Exception:
-            zsize = None
-        if zsize is not None:
-            headers["Content-Length"] = str(zsize)
+            # headers are already sent, so all we can do is cut the archive short
+            logger.exception("Unexpected error in api_downloads")
+            raise
+        finally:
+            slot.release()
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+                elif not t.cancelled() and t.result()[3] is not None:
+                    # finished but never archived (client went away); release is idempotent
+                    t.result()[3]()
         if download_id:
-            asyncio.create_task(notifier.publish(
-                download_id, {"status": "batch_finished", "filename": zip_path}))
-        return StreamingResponse(iterzip(zip_path), media_type="application/zip", headers=headers)
+            await notifier.publish(
+                download_id, {"status": "batch_finished", "filename": "downloads.zip"})
+
+    headers = {"Content-Disposition": "attachment; filename=downloads.zip"}
+    # the generator's finally only runs once it has started; the background task
+    # also covers a client that disconnects before the first chunk
+    return PassThroughResponse(zip_generator(), media_type="application/zip", headers=headers,
+                               background=BackgroundTask(slot.release))
+
+
+@app.post("/api/jobs", status_code=202)
+async def api_submit_job(req: DownloadRequest, request: Request, _=Depends(auth_and_rate_limit)):
+    """Queue a download and return its job id immediately."""
+    key = request.state.client_key
+    # queued and running jobs count against the client's concurrent slots
+    slot = await _admit(key)
+    job_id = uuid.uuid4().hex
+    # tracked before submitting so a job that ends immediately still releases it
+    admission.track_job(job_id, slot, JOB_TIMEOUT + JOB_RESULT_TTL)
+    try:
+        await asyncio.to_thread(job_queue.submit, req.url, req.format_id, job_id=job_id,
+                                on_done=admission.finish_job)
     except Exception as e:
-        logger.exception("Unexpected error in api_downloads")
-        # ensure workspace is removed on unexpected errors
-        try:
-            shutil.rmtree(workspace, ignore_errors=True)
-        except Exception:
-            pass
-        raise HTTPException(status_code=500, detail=_clean_exc_msg(e))
+        admission.finish_job(job_id)
+        logger.exception("Failed to queue job for %s", req.url)
+        raise HTTPException(status_code=503, detail=_clean_exc_msg(e))
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/api/jobs/{job_id}")
+async def api_job_status(job_id: str, _=Depends(require_api_key)):
+    status = await asyncio.to_thread(job_queue.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if status["status"] not in _ACTIVE_JOB_STATES:
+        # rq jobs end in another process; this is where the API learns about it
+        admission.finish_job(job_id)
+    path = status.pop("path", None)
+    if path:
+        status["filename"] = os.path.basename(path)
+    return status
+
+
+_ACTIVE_JOB_STATES = ("queued", "started", "deferred", "scheduled")
+
+
+def _job_active(job_id: str) -> bool:
+    status = job_queue.status(job_id)
+    return status is not None and status["status"] in _ACTIVE_JOB_STATES
+
+
+async def _admit(key: str, exempt: bool = False):
+    """``admission.admit`` after giving back the slots of ``key``'s jobs that have ended."""
+    if admission.has_jobs(key):
+        # job status lookups are blocking Redis calls with rq
+        await asyncio.to_thread(admission.reap, key, _job_active)
+    return admission.admit(key, exempt)
+
+
+@app.get("/api/jobs/{job_id}/file")
+async def api_job_file(job_id: str, request: Request, api_key: str | None = Depends(api_key_header)):
+    await require_api_key(api_key)
+    key = _client_key(request, api_key)
+    admission.check_bytes(key)
+    status = await asyncio.to_thread(job_queue.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if status["status"] != "finished":
+        raise HTTPException(
+            status_code=409, detail=f"Job is {status['status']}")
+    path = status.get("path")
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Job artifact expired")
+    background = None
+    if download_cache.owns(path):
+        if not await asyncio.to_thread(download_cache.pin, path):
+            raise HTTPException(status_code=410, detail="Job artifact expired")
+        background = BackgroundTask(download_cache.unpin, path)
+    _delivered(key, os.path.getsize(path), "job")
+    return DownloadFileResponse(path, filename=os.path.basename(path), background=background)
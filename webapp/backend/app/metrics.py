@@ -0,0 +1,267 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from app.tracing import tracer
+
+logger = logging.getLogger("ytdl")
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+_THROUGHPUT_BUCKETS = tuple(2 ** i * 128 * 1024 for i in range(12))  # 128 KiB/s .. 256 MiB/s
+
+
+class DownloadTimer:
+    """Wraps a progress hook and splits one download into timed phases.
+
+    The caller marks ``probe``/``extract`` itself; ``fetch`` starts at the first
+    ``downloading`` event and whatever follows a ``finished`` event (yt-dlp
+    merging formats, post-processing) counts as ``merge``. Merged formats fetch
+    more than once, so time is summed per phase and observed on ``finish``.
+    ``source`` labels the bytes: ``ytdlp`` or ``http`` for the direct fast path.
+    Each phase is also recorded as a span of the trace that created the timer,
+    since progress events may arrive on another thread.
+    """
+
+    def __init__(self, metrics: "Metrics", hook: Optional[Callable[[dict], None]]):
+        self._metrics = metrics
+        self._hook = hook
+        self._phase: Optional[str] = None
+        self._since = time.perf_counter()
+        self._seconds: Dict[str, float] = {}
+        self._bytes = 0
+        self.source = "ytdlp"
+        self._span = tracer.current()
+
+    def enter(self, phase: Optional[str]) -> None:
+        now = time.perf_counter()
+        if self._phase is not None:
+            took = now - self._since
+            self._seconds[self._phase] = self._seconds.get(self._phase, 0.0) + took
+            if self._span is not None:
+                wall = time.time()
+                tracer.record(self._phase, wall - took, wall, parent=self._span)
+        self._phase = phase
+        self._since = now
+
+    def __call__(self, status: dict) -> None:
+        state = status.get("status")
+        if state == "downloading" and self._phase != "fetch":
+            self.enter("fetch")
+        elif state == "finished":
+            self._bytes += status.get("downloaded_bytes") or status.get("total_bytes") or 0
+            self.enter("merge")
+        if self._hook:
+            self._hook(status)
+
+    def finish(self, path: Optional[str] = None) -> None:
+        self.enter(None)
+        if not self._bytes and path and os.path.exists(path):
+            # external downloaders don't always report sizes
+            self._bytes = os.path.getsize(path)
+        self._metrics.observe_download(self._seconds, self._bytes, self.source)
+
+
+class Metrics:
+    """Prometheus metrics for extraction, downloads, serving and admission, served at GET /metrics.
+
+    Counters and histograms are updated inline (a lock and an add each);
+    occupancy and disk gauges are sampled from the components' ``stats()``.
+
+    Uses environment variables:
+    - METRICS: set to 0 to turn collection off (default 1)
+    - PROMETHEUS_MULTIPROC_DIR: with several uvicorn workers, an empty directory
+      every worker writes its samples to; /metrics then aggregates all workers
+    - METRICS_SAMPLE_INTERVAL: seconds between gauge samples in each worker when
+      running multi-process (default 5); single-process samples at scrape time
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("METRICS", "1") != "0"
+        self.multiprocess = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+        self.sample_interval = float(os.getenv("METRICS_SAMPLE_INTERVAL", "5"))
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        if self.enabled:
+            try:
+                self._build()
+            except ImportError:
+                logger.warning("prometheus_client is not installed; metrics disabled")
+                self.enabled = False
+
+    def _build(self) -> None:
+        from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+        self.registry = CollectorRegistry()
+        r = self.registry
+        self.info_seconds = Histogram(
+            "ytdl_info_seconds", "get_info latency", ["cache"], buckets=_LATENCY_BUCKETS, registry=r)
+        self.phase_seconds = Histogram(
+            "ytdl_download_phase_seconds", "Time spent per download phase", ["phase"],
+            buckets=_LATENCY_BUCKETS, registry=r)
+        self.throughput = Histogram(
+            "ytdl_download_throughput_bytes_per_second", "Upstream fetch throughput per download",
+            ["source"], buckets=_THROUGHPUT_BUCKETS, registry=r)
+        self.bytes_in = Counter(
+            "ytdl_bytes_in", "Bytes fetched from upstream", ["source"], registry=r)
+        self.bytes_out = Counter(
+            "ytdl_bytes_out", "Bytes delivered to clients", ["mode"], registry=r)
+        self.rate_limit = Counter(
+            "ytdl_rate_limit_decisions", "Rate limiter decisions", ["result"], registry=r)
+        self.sse_connections = Gauge(
+            "ytdl_sse_connections", "Open progress streams (SSE and WebSocket)",
+            multiprocess_mode="livesum", registry=r)
+
+        def gauge(name: str, doc: str, labels: Tuple[str, ...] = (), mode: str = "livesum"):
+            return Gauge(name, doc, labels, multiprocess_mode=mode, registry=r)
+
+        self.executor_active = gauge("ytdl_executor_active", "Calls running per worker pool", ("pool",))
+        self.executor_queued = gauge("ytdl_executor_queued", "Calls waiting per worker pool", ("pool",))
+        self.downloads_in_flight = gauge("ytdl_downloads_in_flight", "Distinct downloads in progress")
+        self.admission_active = gauge("ytdl_admission_active", "Admitted downloads holding a slot")
+        self.ydl_pool_idle = gauge("ytdl_ydl_pool_idle", "Idle pooled YoutubeDL instances")
+        self.http_connections = gauge("ytdl_http_connections", "Open upstream HTTP connections", ("state",))
+        self.progress_channels = gauge("ytdl_progress_channels", "Progress channels held by the notifier")
+        self.progress_queued = gauge(
+            "ytdl_progress_queued_events", "Progress events buffered or waiting to be published")
+        self.rate_limit_keys = gauge("ytdl_rate_limit_keys", "Clients tracked by the in-memory limiter")
+        # the same disk seen from every worker: report it once, not summed
+        self.disk_bytes = gauge("ytdl_temp_disk_bytes", "Bytes used by downloads on disk", ("area",), "livemax")
+        self.disk_free = gauge("ytdl_temp_disk_free_bytes", "Free bytes on the temp filesystem", (), "livemin")
+
+    # --- inline recording ---
+
+    def observe_info(self, seconds: float, cached: bool) -> None:
+        if self.enabled:
+            self.info_seconds.labels("hit" if cached else "miss").observe(seconds)
+
+    def observe_phase(self, phase: str, seconds: float) -> None:
+        if self.enabled:
+            self.phase_seconds.labels(phase).observe(seconds)
+
+    def observe_download(self, seconds: Dict[str, float], nbytes: int, source: str) -> None:
+        if not self.enabled:
+            return
+        for phase, value in seconds.items():
+            self.phase_seconds.labels(phase).observe(value)
+        if nbytes:
+            self.bytes_in.labels(source).inc(nbytes)
+            if seconds.get("fetch"):
+                self.throughput.labels(source).observe(nbytes / seconds["fetch"])
+
+    def delivered(self, nbytes: int, mode: str) -> None:
+        if self.enabled and nbytes > 0:
+            self.bytes_out.labels(mode).inc(nbytes)
+
+    def rate_limited(self, allowed: bool) -> None:
+        if self.enabled:
+            self.rate_limit.labels("allowed" if allowed else "denied").inc()
+
+    def stream_opened(self) -> None:
+        if self.enabled:
+            self.sse_connections.inc()
+
+    def stream_closed(self) -> None:
+        if self.enabled:
+            self.sse_connections.dec()
+
+    def download_timer(self, hook: Optional[Callable[[dict], None]]) -> DownloadTimer:
+        return DownloadTimer(self, hook)
+
+    # --- sampled gauges ---
+
+    @staticmethod
+    def _temp_usage() -> int:
+        total = 0
+        root = tempfile.gettempdir()
+        try:
+            with os.scandir(root) as it:
+                dirs = [e.path for e in it if e.name.startswith("ytdl_") and e.is_dir(follow_symlinks=False)]
+        except OSError:
+            return 0
+        for d in dirs:
+            for parent, _, files in os.walk(d):
+                for name in files:
+                    try:
+                        total += os.lstat(os.path.join(parent, name)).st_size
+                    except OSError:
+                        pass
+        return total
+
+    def sample(self) -> None:
+        """Copy current occupancy from the components into the gauges."""
+        if not self.enabled:
+            return
+        from app.admission import admission
+        from app.diskcache import download_cache
+        from app.executor import download_executor, info_executor
+        from app.flights import download_flights
+        from app.httpclient import http_client
+        from app.progress import notifier
+        from app.ratelimit import rate_limiter
+        from app.ydlpool import ydl_pool
+
+        for name, pool in (("info", info_executor), ("download", download_executor)):
+            s = pool.stats()
+            self.executor_active.labels(name).set(s["active"])
+            self.executor_queued.labels(name).set(s["queued"])
+        self.downloads_in_flight.set(download_flights.stats()["in_flight"])
+        self.admission_active.set(admission.stats()["active"])
+        self.ydl_pool_idle.set(ydl_pool.stats()["idle"])
+        http = http_client.stats()
+        if "connections" in http:
+            self.http_connections.labels("idle").set(http["idle_connections"])
+            self.http_connections.labels("busy").set(http["connections"] - http["idle_connections"])
+        progress = notifier.stats()
+        self.progress_channels.set(progress.get("channels", progress.get("subscribers", 0)))
+        self.progress_queued.set(progress.get("buffered_events", progress.get("queued_publishes", 0)))
+        self.rate_limit_keys.set(rate_limiter.stats()["keys"])
+
+        self.disk_bytes.labels("temp").set(self._temp_usage())
+        cache = download_cache.stats()
+        if cache["enabled"]:
+            self.disk_bytes.labels("cache").set(cache["bytes"])
+        try:
+            self.disk_free.set(shutil.disk_usage(tempfile.gettempdir()).free)
+        except OSError:
+            pass
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.sample_interval):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("metrics sampling failed")
+
+    def start(self) -> None:
+        """Keep this worker's gauges fresh for scrapes served by sibling workers."""
+        if self.enabled and self.multiprocess and self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name="ytdl-metrics", daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self.enabled and self.multiprocess:
+            from prometheus_client import multiprocess
+
+            # drops this worker's live gauges from the aggregate
+            multiprocess.mark_process_dead(os.getpid())
+
+    def render(self) -> Tuple[bytes, str]:
+        """Exposition body and content type for a scrape."""
+        from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+
+        self.sample()
+        if self.multiprocess:
+            from prometheus_client import multiprocess
+
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return generate_latest(registry), CONTENT_TYPE_LATEST
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
+
+
+metrics = Metrics()
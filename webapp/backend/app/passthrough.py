@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from urllib.parse import quote
+
+from app.diskcache import download_cache
+from app.flights import remove_download
+from app.httpclient import UpstreamStream
+
+logger = logging.getLogger("ytdl")
+
+# keep a copy of fully streamed files in the download cache (when it is enabled)
+STREAM_TEE = os.getenv("STREAM_TEE", "1") != "0"
+
+# upstream headers passed on to the client as-is
+_FORWARDED = ("content-type", "content-range", "accept-ranges", "etag", "last-modified")
+
+
+def stream_source(info: Dict[str, Any], format_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The single HTTP(S) URL serving ``format_id`` of ``info``, or None if it needs yt-dlp.
+
+    Only formats that are one plain file qualify: merged video+audio, HLS/DASH
+    manifests and fragmented formats go through the regular download path.
+    """
+    if format_id:
+        fmt = next((f for f in info.get("formats") or [] if f.get("format_id") == format_id), None)
+    else:
+        fmt = info
+    if not fmt or fmt.get("requested_formats") or fmt.get("fragments"):
+        return None
+    url = fmt.get("url")
+    if not url or fmt.get("protocol", "https") not in ("http", "https"):
+        return None
+    return {"url": url, "headers": dict(fmt.get("http_headers") or {}),
+            "ext": fmt.get("ext") or info.get("ext") or "bin"}
+
+
+def stream_filename(info: Dict[str, Any], ext: str) -> str:
+    title = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", str(info.get("title") or "download")).strip(" .")
+    return f"{title[:200] or 'download'}.{ext}"
+
+
+def content_disposition(filename: str) -> str:
+    """Attachment header for ``filename``, encoded the way Starlette's FileResponse does it."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+class PassThrough:
+    """Pipes one upstream response to the client as it arrives.
+
+    Nothing touches the disk unless ``tee`` is set, in which case the bytes are
+    also written under the cache's staging directory and the finished file is
+    added to the download cache; a transfer that is cut short is discarded.
+    ``aclose`` must run once the response is over (``PassThroughResponse`` does
+    that even when the client aborts) and then calls ``on_close(bytes_sent)``.
+    """
+
+    def __init__(self, upstream: UpstreamStream, url: str, format_id: Optional[str], filename: str,
+                 exits: AsyncExitStack, tee: bool = False,
+                 progress_hook: Optional[Callable[[dict], None]] = None,
+                 on_close: Optional[Callable[[int], None]] = None):
+        self.upstream = upstream
+        self.url = url
+        self.format_id = format_id
+        self.filename = filename
+        self.total = self._length(upstream.headers)
+        self._exits = exits
+        self._tee = tee and download_cache.enabled
+        self._hook = progress_hook
+        self._on_close = on_close
+        self._tee_path: Optional[str] = None
+        self._file = None
+        self._closed = False
+        self.sent = 0
+        self.complete = False
+
+    @staticmethod
+    def _length(headers) -> Optional[int]:
+        if headers.get("content-encoding"):
+            # we forward decoded bytes, so the upstream length doesn't apply
+            return None
+        try:
+            return int(headers.get("content-length"))
+        except (TypeError, ValueError):
+            return None
+
+    def headers(self) -> Dict[str, str]:
+        out = {k: self.upstream.headers[k] for k in _FORWARDED if k in self.upstream.headers}
+        if self.total is not None:
+            out["content-length"] = str(self.total)
+        return out
+
+    def _progress(self, status: str, sent: int) -> None:
+        if self._hook:
+            self._hook({"status": status, "downloaded_bytes": sent,
+                        "total_bytes": self.total, "filename": self.filename})
+
+    def _open_tee(self) -> None:
+        self._tee_path = os.path.join(
+            tempfile.mkdtemp(prefix="ytdl_", dir=download_cache.staging_root), self.filename)
+        self._file = open(self._tee_path, "wb")
+
+    def _finish_tee(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self._tee_path is not None:
+            if self.complete:
+                download_cache.put(self.url, self.format_id, self._tee_path)
+            # moved into the cache or incomplete; either way drop what's left of the temp dir
+            remove_download(self._tee_path)
+
+    async def body(self) -> AsyncIterator[bytes]:
+        # all tee file work (mkdtemp, open, writes, cache put with its eviction
+        # and rmtree) runs in threads so the event loop never waits on the disk
+        loop = asyncio.get_running_loop()
+        if self._tee:
+            await loop.run_in_executor(None, self._open_tee)
+        async for chunk in self.upstream:
+            if self._file is not None:
+                await loop.run_in_executor(None, self._file.write, chunk)
+            self.sent += len(chunk)
+            self._progress("downloading", self.sent)
+            yield chunk
+        if self.total is not None and self.sent != self.total:
+            raise IOError(f"upstream closed after {self.sent} of {self.total} bytes")
+        self.complete = True
+        self._progress("finished", self.sent)
+
+    async def aclose(self) -> None:
+        """Release the upstream connection and the tee file; safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._file is not None or self._tee_path is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self._finish_tee)
+        except Exception:
+            logger.exception("failed to keep streamed copy of %s", self.url)
+        finally:
+            await self.upstream.aclose()
+            await self._exits.aclose()
+            if self._on_close:
+                self._on_close(self.sent)
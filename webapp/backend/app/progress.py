@@ -0,0 +1,421 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, Tuple, Union
+
+logger = logging.getLogger("ytdl")
+
+# yt-dlp statuses that arrive many times per second and can be merged
+_COALESCED = {"downloading"}
+
+EventId = Union[int, str]
+
+
+class _Channel:
+    __slots__ = ("events", "next_id", "waiters", "subscribers", "last_active")
+
+    def __init__(self, size: int):
+        self.events: Deque[Tuple[int, dict]] = deque(maxlen=size)
+        self.next_id = 1
+        self.waiters: Set[asyncio.Future] = set()
+        self.subscribers = 0
+        self.last_active = time.monotonic()
+
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class MemoryProgressBackend:
+    """In-process channels: a ring buffer of numbered events per download id.
+
+    Only subscribers in the same process see events; use the Redis backend when
+    running several uvicorn workers or instances.
+    """
+
+    name = "memory"
+
+    def __init__(self, buffer_size: int, ttl: float):
+        self.buffer_size = buffer_size
+        self.ttl = ttl
+        self.channels: Dict[str, _Channel] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _channel(self, download_id: str) -> _Channel:
+        # caller holds the lock
+        ch = self.channels.get(download_id)
+        if ch is None:
+            ch = _Channel(self.buffer_size)
+            self.channels[download_id] = ch
+        return ch
+
+    def _sweep(self, now: float) -> None:
+        # caller holds the lock
+        if now - self._last_sweep < min(self.ttl, 30):
+            return
+        self._last_sweep = now
+        for key in [k for k, ch in self.channels.items()
+                    if ch.subscribers == 0 and now - ch.last_active > self.ttl]:
+            del self.channels[key]
+
+    def append(self, download_id: str, message: dict) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            ch = self._channel(download_id)
+            ch.events.append((ch.next_id, message))
+            ch.next_id += 1
+            ch.last_active = now
+            for fut in ch.waiters:
+                try:
+                    fut.get_loop().call_soon_threadsafe(_wake, fut)
+                except RuntimeError:
+                    # subscriber's loop is gone; it will be dropped with the channel
+                    pass
+            ch.waiters.clear()
+
+    async def iterate(self, download_id: str, last_event_id: Optional[EventId],
+                      heartbeat: Optional[float]) -> AsyncIterator[Tuple[EventId, Optional[dict]]]:
+        loop = asyncio.get_running_loop()
+        try:
+            cursor = int(last_event_id or 0)
+        except ValueError:
+            cursor = 0
+        fut = None
+        with self._lock:
+            self._channel(download_id).subscribers += 1
+        try:
+            while True:
+                with self._lock:
+                    ch = self._channel(download_id)
+                    batch = [(i, m) for i, m in ch.events if i > cursor]
+                    fut = None
+                    if not batch:
+                        fut = loop.create_future()
+                        ch.waiters.add(fut)
+                if batch:
+                    for event_id, msg in batch:
+                        cursor = event_id
+                        yield event_id, msg
+                    continue
+                try:
+                    await asyncio.wait_for(fut, timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        ch.waiters.discard(fut)
+                    yield 0, None
+        finally:
+            with self._lock:
+                ch = self.channels.get(download_id)
+                if ch is not None:
+                    ch.subscribers -= 1
+                    ch.last_active = time.monotonic()
+                    if fut is not None:
+                        ch.waiters.discard(fut)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "channels": len(self.channels),
+                "subscribers": sum(ch.subscribers for ch in self.channels.values()),
+                "buffered_events": sum(len(ch.events) for ch in self.channels.values()),
+            }
+
+
+class RedisProgressBackend:
+    """Channels stored as Redis streams so any worker or instance can serve any stream.
+
+    Publishes are queued and written in pipelined batches every
+    PROGRESS_FLUSH_INTERVAL seconds (default 0.05) by a background thread; each
+    stream is capped at the buffer size and expires after the channel TTL. Stream
+    entry ids double as SSE event ids.
+
+    ``client`` / ``async_client_factory`` override the redis-py clients built from
+    ``url`` (e.g. with fakeredis in tests).
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, buffer_size: int, ttl: float,
+                 client=None, async_client_factory=None):
+        import redis
+        import redis.asyncio as aioredis
+
+        self.url = url
+        self.buffer_size = buffer_size
+        self.ttl = max(1, int(ttl))
+        self.flush_interval = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "0.05"))
+        self._redis = client if client is not None else redis.Redis.from_url(url)
+        self._async_client_factory = async_client_factory or (lambda: aioredis.Redis.from_url(url))
+        self._outbox: Deque[Tuple[str, str]] = deque()
+        self._wakeup = threading.Event()
+        self._subscribers = 0
+        self.published = 0
+        self.flush_errors = 0
+        threading.Thread(target=self._flush_loop, name="ytdl-progress-redis", daemon=True).start()
+
+    @staticmethod
+    def _key(download_id: str) -> str:
+        return f"progress:{download_id}"
+
+    def append(self, download_id: str, message: dict) -> None:
+        self._outbox.append((download_id, json.dumps(message)))
+        self._wakeup.set()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._wakeup.wait()
+            # let a burst of hook calls accumulate into one round-trip
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            batch = []
+            while self._outbox:
+                batch.append(self._outbox.popleft())
+            if not batch:
+                continue
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for download_id, data in batch:
+                    pipe.xadd(self._key(download_id), {"data": data},
+                              maxlen=self.buffer_size, approximate=True)
+                for download_id in {d for d, _ in batch}:
+                    pipe.expire(self._key(download_id), self.ttl)
+                pipe.execute()
+                self.published += len(batch)
+            except Exception:
+                self.flush_errors += 1
+                logger.warning("failed to publish %d progress events to redis",
+                               len(batch), exc_info=True)
+
+    async def iterate(self, download_id: str, last_event_id: Optional[EventId],
+                      heartbeat: Optional[float]) -> AsyncIterator[Tuple[EventId, Optional[dict]]]:
+        # XREAD BLOCK holds its connection, so each subscriber gets its own client
+        client = self._async_client_factory()
+        key = self._key(download_id)
+        cursor = str(last_event_id) if last_event_id else "0-0"
+        block = int(heartbeat * 1000) if heartbeat else 0
+        self._subscribers += 1
+        try:
+            while True:
+                resp = await client.xread({key: cursor}, block=block, count=100)
+                if not resp:
+                    yield 0, None
+                    continue
+                for _, entries in resp:
+                    for entry_id, fields in entries:
+                        cursor = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+                        try:
+                            msg = json.loads(fields[b"data"])
+                        except Exception:
+                            msg = {"error": "bad message"}
+                        yield cursor, msg
+        finally:
+            self._subscribers -= 1
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "subscribers": self._subscribers,
+            "queued_publishes": len(self._outbox),
+            "published": self.published,
+            "flush_errors": self.flush_errors,
+        }
+
+
+class ProgressNotifier:
+    """Progress channels (one per X-Download-Id) for Server-Sent Events.
+
+    Uses environment variables:
+    - PROGRESS_BACKEND: ``memory`` (default) or ``redis`` (shares channels over REDIS_URL)
+    - PROGRESS_BUFFER: events kept per channel for replay (default 64)
+    - PROGRESS_TTL: seconds an idle channel is kept (default 300)
+    - PROGRESS_MAX_RATE: max "downloading" events per second per item (default 4, 0 = no limit)
+
+    ``publish_threadsafe`` may be called from any thread, e.g. yt-dlp hooks running
+    on the download pool. Every event gets an id so SSE clients can resume with
+    Last-Event-ID.
+    """
+
+    def __init__(self, backend=None):
+        buffer_size = int(os.getenv("PROGRESS_BUFFER", "64"))
+        self.ttl = float(os.getenv("PROGRESS_TTL", "300"))
+        rate = float(os.getenv("PROGRESS_MAX_RATE", "4"))
+        self.min_interval = 1.0 / rate if rate > 0 else 0.0
+        self.backend = backend or self._make_backend(buffer_size)
+        self._lock = threading.Lock()
+        # per channel: item key (idx) -> last emit time / newest held-back tick
+        self._last_emit: Dict[str, Dict[Any, float]] = {}
+        self._pending: Dict[str, Dict[Any, dict]] = {}
+        self._has_pending = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def _make_backend(self, buffer_size: int):
+        if os.getenv("PROGRESS_BACKEND", "memory").lower() == "redis" and os.getenv("REDIS_URL"):
+            try:
+                return RedisProgressBackend(os.getenv("REDIS_URL"), buffer_size, self.ttl)
+            except Exception:
+                logger.exception("redis progress backend unavailable, using in-memory")
+        return MemoryProgressBackend(buffer_size, self.ttl)
+
+    def _forget_idle(self, now: float) -> None:
+        # caller holds the lock; rate state only matters while ticks are arriving
+        for download_id in [d for d, items in self._last_emit.items()
+                            if d not in self._pending
+                            and all(now - t > max(self.min_interval, 1) for t in items.values())]:
+            del self._last_emit[download_id]
+
+    def publish_threadsafe(self, download_id: str, message: dict) -> None:
+        """Publish ``message`` on ``download_id``; safe to call from any thread."""
+        now = time.monotonic()
+        key = message.get("idx")
+        with self._lock:
+            if message.get("status") in _COALESCED and self.min_interval:
+                last = self._last_emit.get(download_id, {}).get(key, 0.0)
+                if now - last < self.min_interval:
+                    # keep only the newest; the flusher emits it when the interval is up
+                    self._pending.setdefault(download_id, {})[key] = message
+                    self._start_flusher()
+                    return
+            # anything newer supersedes a held-back progress tick for this item
+            pending = self._pending.get(download_id)
+            if pending is not None:
+                pending.pop(key, None)
+                if not pending:
+                    del self._pending[download_id]
+            if len(self._last_emit) > 1024:
+                self._forget_idle(now)
+            self._last_emit.setdefault(download_id, {})[key] = now
+            # appended under the lock so a held-back tick can't land after a newer event
+            self.backend.append(download_id, message)
+
+    async def publish(self, download_id: str, message: dict) -> None:
+        self.publish_threadsafe(download_id, message)
+
+    def _start_flusher(self) -> None:
+        # caller holds the lock
+        self._has_pending.set()
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="ytdl-progress-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._has_pending.wait()
+            time.sleep(self.min_interval)
+            now = time.monotonic()
+            with self._lock:
+                for download_id, items in list(self._pending.items()):
+                    emitted = self._last_emit.setdefault(download_id, {})
+                    for key, msg in list(items.items()):
+                        if now - emitted.get(key, 0.0) >= self.min_interval:
+                            del items[key]
+                            emitted[key] = now
+                            self.backend.append(download_id, msg)
+                    if not items:
+                        del self._pending[download_id]
+                if not self._pending:
+                    self._has_pending.clear()
+
+    def iterate(self, download_id: str, last_event_id: Optional[EventId] = None,
+                heartbeat: Optional[float] = None) -> AsyncIterator[Tuple[EventId, Optional[dict]]]:
+        """Yield ``(event_id, message)`` for events after ``last_event_id``.
+
+        Buffered events are replayed first. With ``heartbeat`` set, ``(0, None)`` is
+        yielded after that many idle seconds so callers can keep connections alive.
+        """
+        return self.backend.iterate(download_id, last_event_id, heartbeat)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+
+
+notifier = ProgressNotifier()
+
+
+class ProgressMultiplexer:
+    """Follows many progress channels for one client and hands out merged deltas.
+
+    Every event is folded into the latest known state of its (channel, idx)
+    item; ``drain`` returns only the fields that changed since the previous
+    drain, so a dashboard ticking over hundreds of downloads receives one small
+    batch per tick instead of every yt-dlp hook call.
+    """
+
+    def __init__(self, notifier: "ProgressNotifier", max_channels: int):
+        self.notifier = notifier
+        self.max_channels = max_channels
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._latest: Dict[Tuple[str, Any], dict] = {}
+        self._sent: Dict[Tuple[str, Any], dict] = {}
+        self._dirty: Set[Tuple[str, Any]] = set()
+
+    @property
+    def channels(self) -> Set[str]:
+        return set(self._tasks)
+
+    def subscribe(self, download_ids, last_event_ids: Optional[Dict[str, EventId]] = None) -> None:
+        last_event_ids = last_event_ids or {}
+        for download_id in download_ids:
+            download_id = str(download_id)
+            if download_id in self._tasks:
+                continue
+            if len(self._tasks) >= self.max_channels:
+                raise ValueError(f"at most {self.max_channels} subscriptions per connection")
+            self._tasks[download_id] = asyncio.ensure_future(
+                self._follow(download_id, last_event_ids.get(download_id)))
+
+    def unsubscribe(self, download_ids) -> None:
+        for download_id in download_ids:
+            download_id = str(download_id)
+            task = self._tasks.pop(download_id, None)
+            if task is not None:
+                task.cancel()
+            for key in [k for k in self._latest if k[0] == download_id]:
+                self._latest.pop(key, None)
+                self._sent.pop(key, None)
+                self._dirty.discard(key)
+
+    async def _follow(self, download_id: str, last_event_id: Optional[EventId]) -> None:
+        async for event_id, msg in self.notifier.iterate(download_id, last_event_id):
+            if msg is None:
+                continue
+            key = (download_id, msg.get("idx"))
+            state = self._latest.setdefault(key, {})
+            state.update(msg)
+            state["event_id"] = event_id
+            self._dirty.add(key)
+
+    def drain(self) -> list:
+        """Return ``[{"id": ..., "idx"?: ..., <changed fields>}]`` since the last drain."""
+        updates = []
+        for key in self._dirty:
+            current = self._latest.get(key)
+            if current is None:
+                continue
+            sent = self._sent.setdefault(key, {})
+            delta = {k: v for k, v in current.items() if k != "idx" and sent.get(k) != v}
+            if not delta:
+                continue
+            sent.update(delta)
+            delta["id"] = key[0]
+            if key[1] is not None:
+                delta["idx"] = key[1]
+            updates.append(delta)
+        self._dirty.clear()
+        return updates
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
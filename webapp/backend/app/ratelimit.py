@@ -1,9 +1,15 @@
+import logging
 import os
+import threading
 import time
-from collections import deque
-from typing import Deque, Dict
+import uuid
+from array import array
+from typing import Any, Dict, Optional, Tuple
 
 from fastapi import HTTPException
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("ytdl")
 
 try:
     REDIS_URL = os.getenv("REDIS_URL") or os.getenv("REDIS_URL")
@@ -11,81 +17,408 @@ except Exception:
     REDIS_URL = None
 
 
+# Each script takes KEYS[1] = bucket key, ARGV = limit, period (ms), cost, nonce, reads the
+# clock with TIME so every API instance agrees on it, and returns
+# {allowed, remaining, reset_ms, retry_after_ms}.
+_NOW = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+"""
+
+LUA_SCRIPTS = {
+    # exact: one sorted-set member per accepted request
+    "sliding_log": _NOW + """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - period)
+local count = redis.call('ZCARD', KEYS[1])
+local reset = period
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if oldest[2] then reset = tonumber(oldest[2]) + period - now end
+if count + cost > limit then
+  -- wait for enough of the oldest entries to age out
+  local n = count + cost - limit - 1
+  local frees = redis.call('ZRANGE', KEYS[1], n, n, 'WITHSCORES')
+  local retry = reset
+  if frees[2] then retry = tonumber(frees[2]) + period - now end
+  return {0, math.max(0, limit - count), reset, retry}
+end
+for i = 1, cost do
+  redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], period)
+return {1, limit - count - cost, reset, 0}
+""",
+    # approximate, O(1) state: current window count plus the weighted previous one
+    "sliding_window": _NOW + """
+local window = math.floor(now / period)
+local h = redis.call('HMGET', KEYS[1], 'w', 'cur', 'prev')
+local w = tonumber(h[1]) or -1
+local cur = tonumber(h[2]) or 0
+local prev = tonumber(h[3]) or 0
+if w == window - 1 then
+  prev = cur
+  cur = 0
+elseif w ~= window then
+  prev = 0
+  cur = 0
+end
+local elapsed = now - window * period
+local reset = period - elapsed
+local estimate = prev * (period - elapsed) / period + cur
+local allowed = 0
+local retry = 0
+if estimate + cost <= limit then
+  allowed = 1
+  cur = cur + cost
+  estimate = estimate + cost
+elseif prev > 0 and cur + cost <= limit then
+  -- wait until the previous window's share has decayed enough
+  retry = math.max(1, math.ceil(period - (limit - cur - cost) * period / prev - elapsed))
+else
+  retry = reset
+end
+redis.call('HSET', KEYS[1], 'w', window, 'cur', cur, 'prev', prev)
+redis.call('PEXPIRE', KEYS[1], period * 2)
+return {allowed, math.max(0, math.floor(limit - estimate)), reset, retry}
+""",
+    # allows bursts up to ``limit`` and refills at limit/period
+    "token_bucket": _NOW + """
+local rate = limit / period
+local h = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(h[1]) or limit
+local ts = tonumber(h[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = math.ceil((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], period)
+return {allowed, math.floor(tokens), math.ceil((limit - tokens) / rate), retry}
+""",
+}
+
+
+class RateLimitResult:
+    """Outcome of one check; ``reset`` and ``retry_after`` are in seconds."""
+
+    __slots__ = ("allowed", "limit", "remaining", "reset", "retry_after", "period")
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset: float,
+                 retry_after: float, period: int):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(0, int(remaining))
+        self.reset = max(0.0, reset)
+        self.retry_after = max(0.0, retry_after)
+        self.period = period
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(int(-(-self.reset // 1))),
+            "RateLimit-Policy": f"{self.limit};w={self.period}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, int(-(-self.retry_after // 1))))
+        return headers
+
+
+_MIN_SLOTS = 1024
+
+
+class GcraBuckets:
+    """Per-key state of the in-memory limiter: one float per key.
+
+    GCRA keeps only each key's theoretical arrival time (TAT); a request is
+    allowed while the TAT is no more than ``period - period/limit`` ahead of
+    now, which admits bursts of ``limit`` and then one request per
+    ``period/limit``. A key whose TAT has passed is indistinguishable from a new
+    one, so ``sweep`` can drop it without changing any decision.
+
+    The state lives in two flat arrays, an open-addressed (linear probing) table
+    of 64-bit key hashes and their TATs, so a key costs 16 bytes per slot and no
+    Python objects. Keys are identified by ``hash()`` alone; two keys would only
+    share a bucket on a full 64-bit collision.
+    """
+
+    __slots__ = ("_hashes", "_tats", "_mask", "_len", "_lock", "swept")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.swept = 0
+        self._allocate(_MIN_SLOTS)
+
+    def _allocate(self, slots: int) -> None:
+        self._hashes = array("q", bytes(8 * slots))
+        self._tats = array("d", bytes(8 * slots))
+        self._mask = slots - 1
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def hit(self, key: str, limit: int, period: float, now: float, cost: int = 1) -> RateLimitResult:
+        # 0 marks an empty slot
+        h = hash(key) or 1
+        interval = period / limit
+        with self._lock:
+            hashes, mask = self._hashes, self._mask
+            i = h & mask
+            while True:
+                slot = hashes[i]
+                if slot == h or slot == 0:
+                    break
+                i = (i + 1) & mask
+            tat = self._tats[i] if slot else now
+            if tat < now:
+                tat = now
+            ahead = tat - now + interval * cost
+            if ahead > period:
+                remaining = int((period - (tat - now)) / interval + 1e-9)
+                return RateLimitResult(False, limit, remaining, tat - now, ahead - period, period)
+            self._tats[i] = tat + interval * cost
+            if not slot:
+                hashes[i] = h
+                self._len += 1
+                # keep the table at most 2/3 full
+                if self._len * 3 > len(hashes) * 2:
+                    self._resize(len(hashes) * 2)
+        return RateLimitResult(True, limit, int((period - ahead) / interval + 1e-9), ahead, 0, period)
+
+    def _resize(self, slots: int) -> None:
+        hashes, tats = self._hashes, self._tats
+        self._allocate(slots)
+        new_hashes, new_tats, mask = self._hashes, self._tats, self._mask
+        for j, h in enumerate(hashes):
+            if h:
+                i = h & mask
+                while new_hashes[i]:
+                    i = (i + 1) & mask
+                new_hashes[i] = h
+                new_tats[i] = tats[j]
+                self._len += 1
+
+    def _delete(self, i: int) -> None:
+        # backward-shift deletion: pull later entries of the probe run into the
+        # hole unless that would move them before their home slot
+        hashes, tats, mask = self._hashes, self._tats, self._mask
+        j = i
+        while True:
+            j = (j + 1) & mask
+            h = hashes[j]
+            if not h:
+                break
+            home = h & mask
+            if (i <= j and (home <= i or home > j)) or (i > j and home <= i and home > j):
+                hashes[i] = h
+                tats[i] = tats[j]
+                i = j
+        hashes[i] = 0
+        self._len -= 1
+
+    def sweep(self, now: float, chunk: int = 10000) -> int:
+        """Forget keys whose TAT has passed; holds the lock one chunk of slots at a time."""
+        removed = 0
+        pos = 0
+        while True:
+            with self._lock:
+                hashes, tats = self._hashes, self._tats
+                end = min(pos + chunk, len(hashes))
+                if pos >= end:
+                    break
+                i = pos
+                while i < end:
+                    if hashes[i] and tats[i] <= now:
+                        # the slot may now hold a shifted entry, so look again
+                        self._delete(i)
+                        removed += 1
+                    else:
+                        i += 1
+                pos = end
+        with self._lock:
+            # give the memory of a past key flood back
+            slots = _MIN_SLOTS
+            while slots < self._len * 3:
+                slots *= 2
+            if slots * 2 <= len(self._hashes):
+                self._resize(slots)
+        self.swept += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._allocate(_MIN_SLOTS)
+
+
 class SimpleRateLimiter:
-    """In-memory sliding-window rate limiter.
+    """Rate limiter, in memory or shared through Redis.
 
-    Uses environment variables:
+    Uses environment variables, read at startup and by ``reload()``:
     - RATE_LIMIT: max requests per window (default 10)
     - RATE_PERIOD: window length in seconds (default 60)
+    - RATE_ALGORITHM: sliding_window (default), sliding_log or token_bucket (Redis only)
+    - RATE_LOCAL_PRECHECK: remember Redis denials locally until their Retry-After
+      passes, so a client hammering a closed bucket costs no Redis calls (default 1)
+    - RATE_SWEEP_INTERVAL: seconds between sweeps of idle in-memory keys (default 60)
+    - RATE_REDIS_TIMEOUT: connect and read timeout for Redis calls in seconds (default 0.25)
+    - RATE_REDIS_FAILURE: what a check does when Redis errors or times out:
+      local (default, count in the in-memory engine), open (allow) or closed (503)
 
-    If REDIS_URL is set, a Redis-backed counter is used per time-window so multiple
-    processes/instances can share state.
+    If REDIS_URL is set, the check runs as a Lua script in Redis (one round-trip)
+    so multiple processes/instances share state. Otherwise the in-memory GCRA
+    engine is used.
     """
 
-    def __init__(self):
-        self.limit = int(os.getenv("RATE_LIMIT", "10"))
-        self.period = int(os.getenv("RATE_PERIOD", "60"))
-        # maps key -> deque[timestamp] (local fallback)
-        self.buckets: Dict[str, Deque[float]] = {}
+    def __init__(self, client=None):
+        self._local = GcraBuckets()
+        # maps (key, cost) -> time until which Redis is known to deny it
+        self._deny_until: Dict[Tuple[str, int], float] = {}
 
-        self.use_redis = bool(os.getenv("REDIS_URL"))
-        self._redis = None
-        if self.use_redis:
+        # ``client`` may be any redis-py compatible client (e.g. fakeredis in tests)
+        self.use_redis = client is not None or bool(os.getenv("REDIS_URL"))
+        self._redis = client
+        if self.use_redis and self._redis is None:
             try:
                 import redis
 
-                self._redis = redis.Redis.from_url(os.getenv("REDIS_URL"))
+                timeout = float(os.getenv("RATE_REDIS_TIMEOUT", "0.25"))
+                self._redis = redis.Redis.from_url(
+                    os.getenv("REDIS_URL"), socket_timeout=timeout, socket_connect_timeout=timeout)
             except Exception:
                 # fall back to in-memory if redis isn't available
                 self.use_redis = False
+        self.reload()
+
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="ytdl-ratelimit", daemon=True)
+        self._sweeper.start()
+
+    def reload(self) -> None:
+        """Re-read the RATE_* settings from the environment."""
+        self.limit = max(1, int(os.getenv("RATE_LIMIT", "10")))
+        self.period = max(1, int(os.getenv("RATE_PERIOD", "60")))
+        self.sweep_interval = float(os.getenv("RATE_SWEEP_INTERVAL", "60"))
+        self.local_precheck = os.getenv("RATE_LOCAL_PRECHECK", "1") != "0"
+        algorithm = os.getenv("RATE_ALGORITHM", "sliding_window")
+        if algorithm not in LUA_SCRIPTS:
+            logger.warning("unknown RATE_ALGORITHM %r, using sliding_window", algorithm)
+            algorithm = "sliding_window"
+        self.algorithm = algorithm
+        failure = os.getenv("RATE_REDIS_FAILURE", "local")
+        if failure not in ("local", "open", "closed"):
+            logger.warning("unknown RATE_REDIS_FAILURE %r, using local", failure)
+            failure = "local"
+        self.redis_failure = failure
+        self._script = None
+        if self.use_redis:
+            try:
+                self._script = self._redis.register_script(LUA_SCRIPTS[self.algorithm])
+            except Exception:
+                self.use_redis = False
+        self._deny_until.clear()
+
+    def clear(self) -> None:
+        """Forget all in-process state (counters and cached denials)."""
+        self._local.clear()
+        self._deny_until.clear()
 
     def _now(self) -> float:
         return time.time()
 
-    def check(self, key: str) -> None:
-        # refresh config each check to allow test-time overrides
-        try:
-            self.limit = int(os.getenv("RATE_LIMIT", str(self.limit)))
-            self.period = int(os.getenv("RATE_PERIOD", str(self.period)))
-        except Exception:
-            pass
-
-        if self.use_redis and self._redis:
-            # Use fixed window keyed by window index
-            now = int(self._now())
-            window = now // self.period
-            rkey = f"rl:{key}:{window}"
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            now = self._now()
             try:
-                cnt = self._redis.incr(rkey)
-                if cnt == 1:
-                    # set expiry slightly longer than window
-                    self._redis.expire(rkey, self.period + 2)
-                if cnt > self.limit:
-                    raise HTTPException(
-                        status_code=429, detail="Too many requests")
-            except HTTPException:
-                raise
+                self._local.sweep(now)
+                for key in [k for k, t in list(self._deny_until.items()) if t <= now]:
+                    self._deny_until.pop(key, None)
             except Exception:
-                # On redis errors, fall back to in-memory
-                pass
-            return
+                logger.exception("rate limiter sweep failed")
+
+    def check(self, key: str, cost: int = 1) -> RateLimitResult:
+        """Count a request of weight ``cost`` for ``key``; raise 429 (with Retry-After) when over the limit."""
+        # a request can never cost more than a full window
+        cost = min(max(1, cost), self.limit)
+        result = None
+        if self.use_redis and self._script is not None:
+            result = self._check_redis(key, cost)
+        if result is None:
+            result = self._local.hit(key, self.limit, self.period, self._now(), cost)
+        if not result.allowed:
+            raise HTTPException(status_code=429, detail="Too many requests",
+                                headers=result.headers())
+        return result
 
-        # In-memory sliding window fallback
+    def _check_redis(self, key: str, cost: int) -> Optional[RateLimitResult]:
         now = self._now()
-        bucket = self.buckets.get(key)
-        if bucket is None:
-            bucket = deque()
-            self.buckets[key] = bucket
+        if self.local_precheck:
+            until = self._deny_until.get((key, cost))
+            if until is not None:
+                if until > now:
+                    return RateLimitResult(False, self.limit, 0, until - now, until - now, self.period)
+                self._deny_until.pop((key, cost), None)
+        try:
+            allowed, remaining, reset_ms, retry_ms = self._script(
+                keys=[f"rl:{self.algorithm}:{key}"],
+                args=[self.limit, self.period * 1000, cost, uuid.uuid4().hex])
+        except Exception:
+            logger.warning("redis rate limit check failed (%s)", self.redis_failure, exc_info=True)
+            if self.redis_failure == "closed":
+                raise HTTPException(status_code=503, detail="Rate limiter unavailable",
+                                    headers={"Retry-After": "1"})
+            if self.redis_failure == "open":
+                return RateLimitResult(True, self.limit, self.limit, 0.0, 0.0, self.period)
+            return None
+        result = RateLimitResult(bool(allowed), self.limit, remaining, reset_ms / 1000,
+                                 retry_ms / 1000, self.period)
+        if not result.allowed and self.local_precheck:
+            self._deny_until[(key, cost)] = now + result.retry_after
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis" if self.use_redis else "memory",
+            "algorithm": self.algorithm if self.use_redis else "gcra",
+            "keys": len(self._local),
+            "swept": self._local.swept,
+            "cached_denials": len(self._deny_until),
+        }
 
-        # drop old timestamps
-        cutoff = now - self.period
-        while bucket and bucket[0] < cutoff:
-            bucket.popleft()
 
-        if len(bucket) >= self.limit:
-            raise HTTPException(status_code=429, detail="Too many requests")
+class RateLimitHeadersMiddleware:
+    """Adds the ``RateLimit-*`` headers of the request's check to its response.
+
+    ``auth_and_rate_limit`` leaves its result in ``request.state.rate_limit``;
+    done here so streamed and file responses get the headers too.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                result = scope.get("state", {}).get("rate_limit")
+                if result is not None:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in result.headers().items():
+                        if name not in headers:
+                            headers.append(name, value)
+            await send(message)
 
-        bucket.append(now)
+        await self.app(scope, receive, send_with_headers)
 
 
 rate_limiter = SimpleRateLimiter()
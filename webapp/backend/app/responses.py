@@ -0,0 +1,65 @@
+import hashlib
+import os
+from typing import Any, Optional
+
+import anyio
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class DownloadFileResponse(FileResponse):
+    """FileResponse for downloaded media.
+
+    Starlette already answers Range/If-Range requests (206/416), sets ETag and
+    Last-Modified, and hands the path to the server via the ``pathsend``
+    extension (sendfile) when the server supports it. On top of that this reads
+    in 1 MiB chunks when it has to copy through Python, and runs its background
+    cleanup even if the client aborts mid-transfer.
+
+    Pass ``content_key`` only for files served from the download cache: the ETag
+    then names that cache entry (key, size and mtime), so it is the same on every
+    request for the entry. Fresh temp downloads keep Starlette's per-file ETag,
+    because nothing guarantees two downloads of one video give the same bytes,
+    and an If-Range against a previous copy correctly gets the full body.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path: str, *args: Any, content_key: Optional[str] = None, **kwargs: Any):
+        self.content_key = content_key
+        super().__init__(path, *args, **kwargs)
+
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        if self.content_key is not None:
+            digest = hashlib.sha256(
+                f"{self.content_key}-{stat_result.st_size}-{stat_result.st_mtime_ns}".encode()).hexdigest()
+            self.headers.setdefault("etag", f'"{digest[:32]}"')
+        super().set_stat_headers(stat_result)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        cleanup, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if cleanup is not None:
+                # shielded so a cancelled transfer still releases its temp files
+                with anyio.CancelScope(shield=True):
+                    await cleanup()
+
+
+class PassThroughResponse(StreamingResponse):
+    """StreamingResponse for media piped straight from upstream.
+
+    Like ``DownloadFileResponse`` its background cleanup also runs when the
+    client aborts, even before the first body chunk, so the upstream
+    connection (or a batch's admission slot) is always released.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        cleanup, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if cleanup is not None:
+                with anyio.CancelScope(shield=True):
+                    await cleanup()
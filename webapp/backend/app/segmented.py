@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Set
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger("ytdl")
+
+# parallel range requests per file (1 disables segmenting)
+SEGMENT_CONNECTIONS = int(os.getenv("SEGMENT_CONNECTIONS", "4"))
+# bytes per range request; also the unit of resume
+SEGMENT_SIZE = int(os.getenv("SEGMENT_SIZE", str(8 * 1024 * 1024)))
+# files smaller than this are fetched with one request
+SEGMENT_MIN_SIZE = int(os.getenv("SEGMENT_MIN_SIZE", str(16 * 1024 * 1024)))
+SEGMENT_RETRIES = 3
+
+READ_SIZE = 256 * 1024
+
+
+class RangesUnsupported(Exception):
+    """The server can't serve this URL in byte ranges; fetch it in one piece."""
+
+
+_write_lock = threading.Lock()
+
+
+def _pwrite(fd: int, data: bytes, offset: int) -> None:
+    if hasattr(os, "pwrite"):
+        view = memoryview(data)
+        while view:
+            n = os.pwrite(fd, view, offset)
+            view = view[n:]
+            offset += n
+        return
+    # no positional writes (Windows): serialise seek + write
+    with _write_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+
+async def in_thread(fn: Callable[..., Any], *args: Any) -> Any:
+    """``asyncio.to_thread`` that, if cancelled, still waits for ``fn`` to return.
+
+    Writes must not outlive the download: its file is closed as soon as the
+    cancellation unwinds, and the descriptor could be reused by then.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        await asyncio.wait([task])
+        raise
+
+
+def _preallocate(fd: int, length: int) -> None:
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, length)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, length)
+
+
+def state_path(path: str) -> str:
+    return path + ".parts.json"
+
+
+def _load_state(path: str, length: int, validator: Optional[str], part_size: int) -> Set[int]:
+    """Parts already on disk from an earlier attempt at the same file, if it still matches."""
+    try:
+        with open(state_path(path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if (state.get("length") != length or state.get("validator") != validator
+            or state.get("part_size") != part_size or not os.path.exists(path)):
+        return set()
+    return set(state.get("done", []))
+
+
+def _save_state(path: str, length: int, validator: Optional[str], part_size: int, done: Set[int]) -> None:
+    tmp = state_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"length": length, "validator": validator, "part_size": part_size,
+                   "done": sorted(done)}, f)
+    os.replace(tmp, state_path(path))
+
+
+async def segmented_download(client: "httpx.AsyncClient", url: str, path: str,
+                             progress_hook: Optional[Callable[[dict], None]] = None,
+                             connections: int = SEGMENT_CONNECTIONS,
+                             part_size: int = SEGMENT_SIZE,
+                             min_size: int = SEGMENT_MIN_SIZE,
+                             probe: Optional["httpx.Response"] = None) -> int:
+    """Fetch ``url`` into ``path`` as concurrent byte-range requests.
+
+    The file is preallocated and each range is written in place with positional
+    writes. Finished ranges are recorded next to the file (``<path>.parts.json``)
+    so calling this again for the same path after a failure only fetches what is
+    missing, as long as the remote length and ETag/Last-Modified are unchanged.
+    ``probe`` is a HEAD response for ``url`` the caller already has; it saves a
+    second round trip. Returns the file length; raises ``RangesUnsupported`` when
+    the server lacks range support or the file is too small to be worth splitting.
+    """
+    if connections <= 1:
+        raise RangesUnsupported("segmenting disabled")
+    head = probe if probe is not None else await client.head(url)
+    head.raise_for_status()
+    length = int(head.headers.get("content-length") or 0)
+    if head.headers.get("accept-ranges", "").lower() != "bytes" or length < max(min_size, 1):
+        raise RangesUnsupported(url)
+    validator = head.headers.get("etag") or head.headers.get("last-modified")
+    # ranges go to the final URL so every connection hits the same CDN node
+    target = str(head.url)
+
+    parts = (length + part_size - 1) // part_size
+    done = _load_state(path, length, validator, part_size)
+    if done:
+        logger.info("resuming %s: %d/%d parts on disk", url, len(done), parts)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+    progress: Dict[str, Any] = {"downloaded": sum(
+        min(part_size, length - i * part_size) for i in done)}
+    # this runs on the shared HTTP client loop, so disk writes go to threads
+    try:
+        if not done:
+            await in_thread(_preallocate, fd, length)
+        await in_thread(_save_state, path, length, validator, part_size, done)
+
+        queue: "asyncio.Queue[int]" = asyncio.Queue()
+        for i in range(parts):
+            if i not in done:
+                queue.put_nowait(i)
+
+        state_lock = asyncio.Lock()
+
+        async def fetch_part(i: int) -> None:
+            start = i * part_size
+            end = min(length, start + part_size) - 1
+            for attempt in range(1, SEGMENT_RETRIES + 1):
+                written = 0
+                try:
+                    async with client.stream("GET", target, headers={"Range": f"bytes={start}-{end}"}) as resp:
+                        resp.raise_for_status()
+                        if resp.status_code != 206:
+                            raise RangesUnsupported(f"{url} ignored a range request")
+                        async for chunk in resp.aiter_bytes(READ_SIZE):
+                            if written + len(chunk) > end - start + 1:
+                                raise IOError(f"range {start}-{end} returned too much data")
+                            await in_thread(_pwrite, fd, chunk, start + written)
+                            written += len(chunk)
+                            progress["downloaded"] += len(chunk)
+                            if progress_hook:
+                                progress_hook({"status": "downloading", "filename": path,
+                                               "downloaded_bytes": progress["downloaded"],
+                                               "total_bytes": length})
+                    if written != end - start + 1:
+                        raise IOError(f"range {start}-{end} was cut short at {written} bytes")
+                    return
+                except RangesUnsupported:
+                    raise
+                except Exception:
+                    progress["downloaded"] -= written
+                    if attempt == SEGMENT_RETRIES:
+                        raise
+                    logger.warning("range %d-%d of %s failed (attempt %d), retrying",
+                                   start, end, url, attempt, exc_info=True)
+                    await asyncio.sleep(attempt)
+
+        async def worker() -> None:
+            while not queue.empty():
+                i = queue.get_nowait()
+                await fetch_part(i)
+                done.add(i)
+                # one writer at a time: they share the temp file name
+                async with state_lock:
+                    await in_thread(_save_state, path, length, validator, part_size, set(done))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(connections, parts))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+
+        size = os.fstat(fd).st_size
+        if len(done) != parts or size != length:
+            raise IOError(f"incomplete download of {url}: {size} of {length} bytes")
+    finally:
+        os.close(fd)
+
+    os.remove(state_path(path))
+    if progress_hook:
+        progress_hook({"status": "finished", "filename": path,
+                       "downloaded_bytes": length, "total_bytes": length})
+    return length
@@ -0,0 +1,341 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("ytdl")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # field names follow the OpenTelemetry span data model
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start,
+            "endTimeUnixNano": self.end,
+            "durationMs": round((self.end - self.start) / 1e6, 3) if self.end else None,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("ytdl_span", default=None)
+
+
+class Tracer:
+    """Span timing for requests, carried through ``contextvars``.
+
+    ``trace`` opens the root span of a request (done by ``TracingMiddleware``);
+    ``span`` nests under whatever span is current and is a no-op outside a
+    sampled trace, so instrumented code costs one context lookup when tracing
+    is off. Work handed to ``BoundedExecutor`` runs in a copy of the caller's
+    context and keeps its parent span.
+
+    Uses environment variables:
+    - TRACE_FILE: append finished spans to this file as JSON lines (unset disables tracing)
+    - TRACE_SAMPLE: fraction of requests traced (default 1)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.getenv("TRACE_FILE", "") if path is None else path
+        self.sample = float(os.getenv("TRACE_SAMPLE", "1"))
+        self._queue: "queue.SimpleQueue[Dict[str, Any]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.exported = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current.get()
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Root span of a new trace, subject to TRACE_SAMPLE."""
+        if not self.enabled or (self.sample < 1 and random.random() >= self.sample):
+            yield None
+            return
+        with self._open(Span(secrets.token_hex(16), None, name, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Child of the current span; does nothing when no trace is active."""
+        parent = _current.get()
+        if parent is None:
+            yield None
+            return
+        with self._open(Span(parent.trace_id, parent.span_id, name, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _open(self, span: Span) -> Iterator[Span]:
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end = time.time_ns()
+            self._export(span)
+
+    def record(self, name: str, start: float, end: float, parent: Optional[Span] = None,
+               **attributes: Any) -> None:
+        """Add an already-measured interval (``time.time()`` seconds) under ``parent`` or the current span."""
+        parent = parent or _current.get()
+        if parent is None:
+            return
+        span = Span(parent.trace_id, parent.span_id, name, attributes)
+        span.start, span.end = int(start * 1e9), int(end * 1e9)
+        self._export(span)
+
+    def _export(self, span: Span) -> None:
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="ytdl-trace", daemon=True)
+                    self._writer.start()
+        with self._lock:
+            self._pending += 1
+        self._queue.put(span.to_dict())
+
+    def _write_loop(self) -> None:
+        # file writes stay off the request path; spans are batched per wake-up
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for item in batch:
+                        f.write(json.dumps(item, default=str) + "\n")
+                self.exported += len(batch)
+            except Exception:
+                logger.exception("failed to write spans to %s", self.path)
+            finally:
+                with self._lock:
+                    self._pending -= len(batch)
+
+    def flush(self, timeout: float = 5) -> None:
+        """Wait until queued spans are written (used by tests and on shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+tracer = Tracer()
+
+
+_profile: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("ytdl_profile", default=None)
+
+
+def _frame_label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """Samples the stacks of the threads working on one request.
+
+    The event loop thread is shared, so its samples include whatever other
+    requests it interleaved with this one.
+    """
+
+    def __init__(self, interval: float, max_seconds: float):
+        self.id = secrets.token_hex(8)
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.threads: Set[int] = set()
+        self.stacks: "Counter[str]" = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ytdl-profiler", daemon=True)
+
+    def start(self) -> None:
+        self.threads.add(threading.get_ident())
+        self._thread.start()
+
+    def _run(self) -> None:
+        names = {}
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if ident not in names:
+                    names[ident] = next((t.name for t in threading.enumerate() if t.ident == ident), str(ident))
+                stack.append(names[ident])
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        """Stop sampling and return the profile in collapsed-stack format."""
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Opt-in sampling profiler an admin triggers per request.
+
+    A request carrying ``X-Profile: <PROFILE_TOKEN>`` is sampled from the event
+    loop thread and every executor thread that works on it. The response gets an
+    ``X-Profile-Id`` header; ``GET /api/profiles/{id}`` (same header) returns the
+    profile as collapsed stacks, ready for flamegraph.pl or speedscope.
+
+    Uses environment variables:
+    - PROFILE_TOKEN: admin token that enables profiling (unset disables it)
+    - PROFILE_INTERVAL_MS: sampling interval (default 5)
+    - PROFILE_MAX_SECONDS: stop sampling after this long (default 120)
+    - PROFILE_DIR: where profiles are kept (default ``<tmp>/ytdl-profiles``)
+    """
+
+    def __init__(self):
+        self.token = os.getenv("PROFILE_TOKEN", "")
+        self.interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.max_seconds = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+        self.dir = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "ytdl-profiles")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and token is not None and secrets.compare_digest(token, self.token)
+
+    def start(self) -> ProfileSession:
+        session = ProfileSession(self.interval, self.max_seconds)
+        session.start()
+        return session
+
+    @contextmanager
+    def attach(self, session: Optional[ProfileSession]) -> Iterator[None]:
+        token = _profile.set(session)
+        try:
+            yield
+        finally:
+            _profile.reset(token)
+
+    @staticmethod
+    @contextmanager
+    def bind_thread() -> Iterator[None]:
+        """Include the calling thread in the current request's profile, if any."""
+        session = _profile.get()
+        if session is None:
+            yield
+            return
+        ident = threading.get_ident()
+        session.threads.add(ident)
+        try:
+            yield
+        finally:
+            session.threads.discard(ident)
+
+    def save(self, session: ProfileSession) -> None:
+        text = session.stop()
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            with open(os.path.join(self.dir, session.id + ".folded"), "w", encoding="utf-8") as f:
+                f.write(text)
+        except OSError:
+            logger.exception("failed to save profile %s", session.id)
+
+    def load(self, profile_id: str) -> Optional[str]:
+        if not profile_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(self.dir, profile_id + ".folded"), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+profiler = Profiler()
+
+
+class TracingMiddleware:
+    """Opens the root span of each HTTP request and runs the profiler when asked.
+
+    Pure ASGI so the request's context (current span, profile session) is the
+    one the endpoint and its executor calls inherit.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (tracer.enabled or profiler.enabled):
+            await self.app(scope, receive, send)
+            return
+        session = None
+        if profiler.enabled:
+            token = dict(scope["headers"]).get(b"x-profile")
+            if token is not None and profiler.authorized(token.decode("latin-1")):
+                session = profiler.start()
+
+        with tracer.trace(f"{scope['method']} {scope['path']}", **{"http.method": scope["method"],
+                                                                    "http.route": scope["path"]}) as root:
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    if root is not None:
+                        root.set(**{"http.status_code": message["status"]})
+                        headers.append((b"x-trace-id", root.trace_id.encode()))
+                    if session is not None:
+                        headers.append((b"x-profile-id", session.id.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                with profiler.attach(session):
+                    await self.app(scope, receive, send_wrapper)
+            finally:
+                if session is not None:
+                    # joins the sampler thread and writes the file: keep it off the loop
+                    await asyncio.get_running_loop().run_in_executor(None, profiler.save, session)
@@ -0,0 +1,53 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.ytdl import warm_up
+
+logger = logging.getLogger("ytdl")
+
+
+class WarmUp:
+    """Loads yt-dlp and friends on a background thread once the server is up.
+
+    The app answers requests while this runs (first use of a heavy module simply
+    imports it on demand); ``ready`` is set when it finishes. WARMUP=0 skips the
+    background load and reports ready immediately.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("WARMUP", "1") != "0"
+        self.ready = threading.Event()
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self._started = False
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        if not self.enabled:
+            self.ready.set()
+            return
+        threading.Thread(target=self._run, name="ytdl-warmup", daemon=True).start()
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        try:
+            warm_up()
+        except Exception as e:
+            # not fatal: whatever failed here is retried on first use
+            logger.exception("warm-up failed")
+            self.error = str(e)
+        finally:
+            self.seconds = round(time.monotonic() - started, 3)
+            self.ready.set()
+            logger.info("warm-up finished in %.3fs", self.seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready.is_set(), "seconds": self.seconds, "error": self.error}
+
+
+warmup = WarmUp()
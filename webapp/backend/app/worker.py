@@ -0,0 +1,27 @@
+"""rq worker entry point for download jobs.
+
+Run one or more of these next to the API (``python -m app.worker``); each pulls
+jobs from the queue named by JOB_QUEUE_NAME on REDIS_URL.
+"""
+import logging
+import os
+
+import redis
+from rq import Queue, Worker
+
+from app.jobs import QUEUE_NAME, sweep_artifacts
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    url = os.getenv("REDIS_URL")
+    if not url:
+        raise SystemExit("REDIS_URL must be set to run a worker")
+    conn = redis.Redis.from_url(url)
+    sweep_artifacts()
+    Worker([Queue(QUEUE_NAME, connection=conn)], connection=conn).work()
+
+
+if __name__ == "__main__":
+    main()
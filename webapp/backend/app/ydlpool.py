@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+
+logger = logging.getLogger("ytdl")
+
+
+class YoutubeDLPool:
+    """Keeps built ``YoutubeDL`` objects around for reuse, one idle list per option profile.
+
+    Building a YoutubeDL loads extractor classes, a cookie jar and HTTP handlers;
+    reusing one skips that. A profile is a name plus the options that stay fixed
+    across calls; the per-call output template, format and progress hook are
+    rebound on every checkout. An instance is used by one thread at a time and
+    is thrown away instead of returned if the call failed.
+
+    Uses environment variable YDL_POOL_SIZE: idle instances kept per profile
+    (default 4, 0 disables pooling). ``factory`` builds instances (default
+    ``yt_dlp.YoutubeDL``, imported on first use).
+    """
+
+    def __init__(self, max_idle: Optional[int] = None, factory: Optional[Callable[[dict], "YoutubeDL"]] = None):
+        self.max_idle = int(os.getenv("YDL_POOL_SIZE", "4")) if max_idle is None else max_idle
+        self._factory = factory
+        self._idle: Dict[str, List["YoutubeDL"]] = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+        self._discarded = 0
+
+    @staticmethod
+    def _profile_key(profile: str, params: Dict[str, Any]) -> str:
+        return profile + ":" + json.dumps(params, sort_keys=True, default=str)
+
+    def _build(self, params: Dict[str, Any]) -> "YoutubeDL":
+        if self._factory is None:
+            from yt_dlp import YoutubeDL
+
+            self._factory = YoutubeDL
+        with self._lock:
+            self._created += 1
+        # YoutubeDL keeps and mutates the dict it is given
+        return self._factory(json.loads(json.dumps(params)))
+
+    def _take(self, key: str, params: Dict[str, Any]) -> "YoutubeDL":
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._reused += 1
+                return idle.pop()
+        return self._build(params)
+
+    def prewarm(self, profile: str, params: Dict[str, Any]) -> None:
+        """Build an idle instance for ``profile`` if it has none yet."""
+        key = self._profile_key(profile, params)
+        with self._lock:
+            if self.max_idle <= 0 or self._idle.get(key):
+                return
+        self._give_back(key, self._build(params))
+
+    def _give_back(self, key: str, ydl: "YoutubeDL") -> None:
+        ydl._progress_hooks = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(ydl)
+                return
+            self._discarded += 1
+        self._close(ydl)
+
+    @staticmethod
+    def _close(ydl: "YoutubeDL") -> None:
+        try:
+            ydl.close()
+        except Exception:
+            logger.exception("failed to close YoutubeDL")
+
+    @staticmethod
+    def _bind(ydl: "YoutubeDL", outtmpl: Optional[str], format_id: Optional[str],
+              progress_hook: Optional[Callable[[dict], None]]) -> None:
+        if outtmpl is not None:
+            ydl.params["outtmpl"] = {"default": outtmpl}
+            ydl._parse_outtmpl()
+        if ydl.params.get("format") != format_id:
+            ydl.params["format"] = format_id
+            ydl.format_selector = ydl.build_format_selector(format_id) if format_id else None
+        ydl._progress_hooks = [progress_hook] if progress_hook else []
+        # per-download bookkeeping a fresh instance would start with
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls = set()
+
+    @contextmanager
+    def checkout(self, profile: str, params: Dict[str, Any], outtmpl: Optional[str] = None,
+                 format_id: Optional[str] = None,
+                 progress_hook: Optional[Callable[[dict], None]] = None) -> Iterator["YoutubeDL"]:
+        """Yield a YoutubeDL built from ``params`` with the per-call options applied.
+
+        ``params`` must be JSON-serialisable and must not contain ``outtmpl``,
+        ``format`` or ``progress_hooks``; pass those as arguments instead.
+        """
+        key = self._profile_key(profile, params)
+        ydl = self._take(key, params)
+        try:
+            self._bind(ydl, outtmpl, format_id, progress_hook)
+            yield ydl
+        except BaseException:
+            # extractor/downloader state after a failure is unknown; don't reuse it
+            with self._lock:
+                self._discarded += 1
+            self._close(ydl)
+            raise
+        if self.max_idle > 0:
+            self._give_back(key, ydl)
+        else:
+            self._close(ydl)
+
+    def clear(self) -> None:
+        with self._lock:
+            idle = [y for ys in self._idle.values() for y in ys]
+            self._idle.clear()
+        for ydl in idle:
+            self._close(ydl)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "profiles": len(self._idle),
+                "idle": sum(len(v) for v in self._idle.values()),
+                "created": self._created,
+                "reused": self._reused,
+                "discarded": self._discarded,
+            }
+
+
+ydl_pool = YoutubeDLPool()
@@ -1,41 +1,53 @@
 import os
 import tempfile
 import subprocess
+import time
 from typing import Dict, Any, Callable, Optional
-from yt_dlp import YoutubeDL
-from yt_dlp.networking._urllib import SSLError as YTDLPSSLError
-import requests
-import ssl
 from urllib.parse import urlparse
 import logging
-from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
+from app.cache import info_cache
+from app.ydlpool import ydl_pool
+from app.httpclient import http_client
+from app.metrics import DownloadTimer, metrics
+from app.tracing import tracer
 
-# Force TLS 1.2 for all HTTPS requests
+# yt_dlp and httpx are imported on first use (or by warm_up) so that importing
+# the app stays cheap
 
+logger = logging.getLogger("ytdl")
 
-class TLS12HttpAdapter(HTTPAdapter):
-    def init_poolmanager(self, connections, maxsize, block=False):
-        self.poolmanager = PoolManager(
-            num_pools=connections,
-            maxsize=maxsize,
-            block=block,
-            ssl_version=ssl.PROTOCOL_TLSv1_2,
-        )
+INFO_OPTS = {"quiet": True, "skip_download": True}
 
 
-# Create a session with TLS 1.2 adapter
-session = requests.Session()
-session.mount("https://", TLS12HttpAdapter())
+def warm_up() -> None:
+    """Import the heavy dependencies and build one pooled YoutubeDL ahead of the first request."""
+    import mimetypes
 
-logger = logging.getLogger("ytdl")
+    mimetypes.init()
+    http_client.start()
+    ydl_pool.prewarm("info", INFO_OPTS)
 
 
 def get_info(url: str) -> Dict[str, Any]:
-    """Return metadata for the given URL without downloading."""
-    ydl_opts = {"quiet": True, "skip_download": True}
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+    """Return metadata for the given URL without downloading.
+
+    Results are served from ``info_cache`` when a fresh entry exists; the returned
+    dict may be shared with other callers and must not be mutated.
+    """
+    started = time.perf_counter()
+    with tracer.span("get_info", url=url) as span:
+        cached = info_cache.get(url)
+        if span is not None:
+            span.set(cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            metrics.observe_info(time.perf_counter() - started, cached=True)
+            return cached
+        with ydl_pool.checkout("info", INFO_OPTS) as ydl:
+            info = ydl.extract_info(url, download=False)
+            # JSON-safe copy so the same dict can live in the Redis tier
+            info = ydl.sanitize_info(info)
+        info_cache.put(url, info)
+    metrics.observe_info(time.perf_counter() - started, cached=False)
     return info
 
 
@@ -59,7 +71,22 @@ def _aria2_download(url: str, out_path: str) -> bool:
         return False
 
 
-def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: Optional[Callable[[dict], None]] = None, output_dir: Optional[str] = None) -> str:
+def _download_resolved(ydl, url: str, resolved: Dict[str, Any]) -> Dict[str, Any]:
+    """Download from an info dict ``get_info`` already extracted, like ``--load-info-json``.
+
+    Falls back to a fresh extraction if the resolved formats no longer work
+    (expired or revoked stream URLs) and drops the stale cache entry.
+    """
+    try:
+        # clean copy: the cached dict is shared, and yt-dlp fills in download fields
+        return ydl.process_ie_result(ydl.sanitize_info(resolved, True), download=True)
+    except Exception:
+        logger.warning("cached info for %s failed to download, extracting again", url, exc_info=True)
+        info_cache.discard(url)
+        return ydl.extract_info(url, download=True)
+
+
+def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: Optional[Callable[[dict], None]] = None, output_dir: Optional[str] = None, temp_root: Optional[str] = None) -> str:
     """Download the requested format and save it to a specified directory or temporary directory.
 
     Args:
@@ -67,10 +94,21 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
         format_id: Optional format/quality selection
         progress_hook: Optional callback for progress updates
         output_dir: Optional directory to save files to. If None, uses a temp dir.
+        temp_root: Optional parent for that temp dir (defaults to the system temp dir).
 
     Returns:
         Path to the downloaded file
     """
+    # the timer passes progress through and records phase times and bytes
+    with tracer.span("download_to_file", url=url, format_id=format_id):
+        timer = metrics.download_timer(progress_hook)
+        path = _download_to_file(url, format_id, timer, output_dir, temp_root)
+        timer.finish(path)
+    return path
+
+
+def _download_to_file(url: str, format_id: Optional[str], progress_hook: DownloadTimer,
+                      output_dir: Optional[str], temp_root: Optional[str]) -> str:
     if output_dir:
         # Ensure output dir exists
         os.makedirs(output_dir, exist_ok=True)
@@ -80,12 +118,11 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
         outtmpl = os.path.join(output_dir, prefix + "%(title)s.%(ext)s")
     else:
         # Default temp dir behavior
-        tmpdir = tempfile.mkdtemp(prefix="ytdl_")
+        tmpdir = tempfile.mkdtemp(prefix="ytdl_", dir=temp_root)
         outtmpl = os.path.join(tmpdir, "%(title)s.%(ext)s")
 
-    # yt-dlp options
+    # yt-dlp options (outtmpl, format and progress hook are bound per checkout)
     ydl_opts: Dict[str, Any] = {
-        "outtmpl": outtmpl,
         "quiet": True,
         "noplaylist": True,
         "no_warnings": True,
@@ -109,12 +146,12 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
     elif which("curl"):
         ydl_opts["external_downloader"] = "curl"
         ydl_opts["external_downloader_args"] = ["--tlsv1.2", "-L"]
-    if format_id:
-        ydl_opts["format"] = format_id
 
-    # Fast-path: if the URL looks like a direct media resource, try requests first.
+    # Fast-path: if the URL looks like a direct media resource, fetch it with the
+    # shared HTTP client (pooled keep-alive/HTTP/2 connections) instead of yt-dlp.
     try:
-        head = session.head(url, allow_redirects=True, timeout=10)
+        progress_hook.enter("probe")
+        head = http_client.head(url)
         ctype = head.headers.get("content-type", "")
         ctype = ctype.lower() if isinstance(ctype, str) else ""
         if ctype.startswith("image/") or ctype.startswith("video/") or ctype.startswith("audio/"):
@@ -125,59 +162,47 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
                 if subtype:
                     ext = "." + subtype
             out_path = os.path.join(tmpdir, "download" + ext)
-            try:
-                r = session.get(url, stream=True, timeout=30)
-                r.raise_for_status()
-            except requests.exceptions.SSLError:
-                logger.warning(
-                    "requests SSL error for %s, trying alternate TLS version", url)
-                try:
-                    # Try TLS 1.1 if 1.2 fails
-                    class TLS11HttpAdapter(HTTPAdapter):
-                        def init_poolmanager(self, connections, maxsize, block=False):
-                            self.poolmanager = PoolManager(
-                                num_pools=connections, maxsize=maxsize, block=block, ssl_version=ssl.PROTOCOL_TLSv1_1)
-                    alt_session = requests.Session()
-                    alt_session.mount("https://", TLS11HttpAdapter())
-                    r = alt_session.get(url, stream=True, timeout=30)
-                    r.raise_for_status()
-                except requests.exceptions.SSLError:
-                    logger.warning(
-                        "TLS 1.1 failed for %s, retrying insecurely as last resort", url)
-                    r = requests.get(url, stream=True,
-                                     timeout=30, verify=False)
-                    r.raise_for_status()
-            with open(out_path, "wb") as wf:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        wf.write(chunk)
+            progress_hook.source = "http"
+            progress_hook.enter("fetch")
+            http_client.download_with_fallback(url, out_path, progress_hook=progress_hook, probe=head)
             return out_path
     except Exception:
-        # ignore and let yt-dlp try
-        pass
+        # let yt-dlp try; a partial file left in tmpdir goes with it
+        logger.debug("direct fetch of %s failed, trying yt-dlp", url, exc_info=True)
 
-    # Attach progress hook if provided
-    if progress_hook:
-        ydl_opts["progress_hooks"] = [progress_hook]
+    progress_hook.enter("extract")
+    # the UI calls /api/info right before downloading; when that result is still
+    # cached (its stream URLs haven't expired) skip straight to format selection;
+    # not counted, so /api/stats hit/miss numbers stay those of get_info
+    resolved = info_cache.get(url, count=False)
+    if resolved is not None and resolved.get("_type", "video") != "video":
+        resolved = None
 
     # Try a small retry loop around yt-dlp
     last_exc: Optional[Exception] = None
     info = None
     for attempt in range(1, 4):
         try:
-            with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+            with tracer.span("ytdlp", attempt=attempt, reused_info=resolved is not None), \
+                    ydl_pool.checkout("download", ydl_opts, outtmpl=outtmpl,
+                                      format_id=format_id, progress_hook=progress_hook) as ydl:
+                if resolved is not None:
+                    reuse, resolved = resolved, None
+                    info = _download_resolved(ydl, url, reuse)
+                else:
+                    info = ydl.extract_info(url, download=True)
             last_exc = None
             break
         except Exception as e:
             last_exc = e
             if attempt < 3:
-                import time
-
-                time.sleep(1 + attempt * 2)
+                with tracer.span("retry_wait", seconds=1 + attempt * 2):
+                    time.sleep(1 + attempt * 2)
                 continue
 
             # exhausted attempts: if caused by SSL EOF and URL is direct-file, try fallbacks
+            from yt_dlp.networking._urllib import SSLError as YTDLPSSLError
+
             try:
                 cause = getattr(e, "__cause__", None)
                 is_ssl = isinstance(
@@ -194,7 +219,8 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
                 out_path = os.path.join(tmpdir, "download" + ext)
                 # Try aria2 if present
                 if _aria2_available():
-                    ok = _aria2_download(url, out_path)
+                    with tracer.span("aria2c"):
+                        ok = _aria2_download(url, out_path)
                     if ok:
                         return out_path
                 # Try to force yt-dlp to use an external downloader (curl/wget) which
@@ -205,13 +231,19 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
                 def _try_with_external(name: str, args: list[str]) -> Optional[str]:
                     if which(name) is None:
                         return None
-                    opts = dict(ydl_opts)
+                    opts = dict(ydl_opts, outtmpl=outtmpl)
                     opts.update({
                         "external_downloader": name,
                         "external_downloader_args": args,
                     })
+                    if format_id:
+                        opts["format"] = format_id
+                    if progress_hook:
+                        opts["progress_hooks"] = [progress_hook]
+                    from yt_dlp import YoutubeDL
+
                     try:
-                        with YoutubeDL(opts) as ydl2:
+                        with tracer.span("external_downloader", downloader=name), YoutubeDL(opts) as ydl2:
                             info2 = ydl2.extract_info(url, download=True)
                         # try to resolve filename from info2
                         if isinstance(info2, dict):
@@ -234,20 +266,9 @@ def download_to_file(url: str, format_id: Optional[str] = None, progress_hook: O
                 except Exception:
                     # fall through to requests fallback
                     pass
-                # Try requests (first verified, then insecure if SSL fails)
-                try:
-                    resp = requests.get(url, stream=True, timeout=30)
-                    resp.raise_for_status()
-                except requests.exceptions.SSLError:
-                    logger.warning(
-                        "requests SSL error on fallback for %s, retrying insecurely", url)
-                    resp = requests.get(
-                        url, stream=True, timeout=30, verify=False)
-                    resp.raise_for_status()
-                with open(out_path, "wb") as wf:
-                    for chunk in resp.iter_content(chunk_size=8192):
-                        if chunk:
-                            wf.write(chunk)
+                # Plain HTTP fetch (first verified, then insecure if TLS fails)
+                with tracer.span("http_fallback"):
+                    http_client.download_with_fallback(url, out_path, progress_hook=progress_hook)
                 return out_path
 
             # re-raise original exception if no fallback
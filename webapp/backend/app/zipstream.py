@@ -0,0 +1,71 @@
+import io
+import os
+import zipfile
+from typing import Iterator, List, Set
+
+# read size for copying media into the archive
+CHUNK_SIZE = 1024 * 1024
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer that ZipFile writes into; drained after each step."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """Build a ZIP archive incrementally and hand out its bytes as they are produced.
+
+    Entries are STORED (media is already compressed) and switch to zip64 when a
+    file needs it. Because the sink can't seek, ZipFile writes sizes and CRCs in
+    data descriptors, so no entry ever has to be rewritten and nothing is staged
+    on disk.
+    """
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zf = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self._names: Set[str] = set()
+
+    def _unique(self, arcname: str) -> str:
+        base, ext = os.path.splitext(arcname)
+        name, n = arcname, 1
+        while name in self._names:
+            name = f"{base} ({n}){ext}"
+            n += 1
+        self._names.add(name)
+        return name
+
+    def write_file(self, path: str, arcname: str) -> Iterator[bytes]:
+        """Add ``path`` to the archive, yielding archive bytes as the file is copied."""
+        zinfo = zipfile.ZipInfo.from_file(path, self._unique(arcname))
+        zinfo.compress_type = zipfile.ZIP_STORED
+        with open(path, "rb") as src, self._zf.open(zinfo, "w") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(chunk)
+                yield self._sink.drain()
+        yield self._sink.drain()
+
+    def write_bytes(self, arcname: str, data: bytes) -> bytes:
+        """Add a small in-memory entry and return the archive bytes it produced."""
+        self._zf.writestr(self._unique(arcname), data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Finish the archive and return the trailing central directory bytes."""
+        self._zf.close()
+        return self._sink.drain()
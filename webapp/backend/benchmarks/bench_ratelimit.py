@@ -0,0 +1,63 @@
+"""Microbenchmark for the in-memory rate limiter.
+
+Run from webapp/backend:
+
+    python -m benchmarks.bench_ratelimit [--keys 1000000] [--checks 1000000]
+
+Reports checks per second for a hot key and for spread keys, the memory held per
+million keys, and how long a full sweep of idle keys takes.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from app.ratelimit import GcraBuckets
+
+
+def bench_checks(n: int, keys: int) -> float:
+    buckets = GcraBuckets()
+    names = [f"10.0.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    now = time.time()
+    start = time.perf_counter()
+    for i in range(n):
+        buckets.hit(names[i % keys], 1_000_000, 60, now)
+    return n / (time.perf_counter() - start)
+
+
+def bench_memory(keys: int) -> dict:
+    names = [f"key-{i}" for i in range(keys)]
+    now = time.time()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    buckets = GcraBuckets()
+    for name in names:
+        buckets.hit(name, 10, 60, now)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    swept = buckets.sweep(now + 3600)
+    return {
+        "keys": keys,
+        "bytes_per_million_keys": int(used * 1_000_000 / keys),
+        "sweep_seconds": round(time.perf_counter() - start, 3),
+        "swept": swept,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "checks_per_second_hot_key": int(bench_checks(args.checks, 1)),
+        "checks_per_second_spread": int(bench_checks(args.checks, 65536)),
+        **bench_memory(args.keys),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Startup benchmark: import time of ``app.main`` and time to first response.
+
+Run from webapp/backend:
+
+    python -m benchmarks.bench_startup [--runs 5]
+
+Each run uses a fresh interpreter. "first_response" is the time from spawning
+uvicorn until ``/api/health`` answers; "ready" is until ``/api/ready`` does,
+i.e. until the background warm-up has loaded yt-dlp.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, started: float, timeout: float = 60) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(url)
+
+
+def _serve_times(env: dict) -> dict:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        first = _wait_for(f"http://127.0.0.1:{port}/api/health", started)
+        ready = _wait_for(f"http://127.0.0.1:{port}/api/ready", started)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return {"first_response": first, "ready": ready}
+
+
+def _summary(values) -> dict:
+    return {"p50_s": round(statistics.median(values), 3), "max_s": round(max(values), 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    imports = [_import_seconds() for _ in range(args.runs)]
+    serves = [_serve_times(env) for _ in range(args.runs)]
+    print(json.dumps({
+        "import_app_main": _summary(imports),
+        "first_response": _summary([s["first_response"] for s in serves]),
+        "ready": _summary([s["ready"] for s in serves]),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""Offline benchmark suite: downloads, batches, zip assembly, SSE fan-out, rate limiter and get_info.
+
+Run from webapp/backend:
+
+    python -m benchmarks.bench_suite [--quick] [--out bench-results.json] [--baseline old.json]
+
+Needs no network. Media comes from a local ``MediaServer`` (Range support,
+paced slow links, injected failures) and extraction from ``FakeYoutubeDL``. The
+app itself runs unmodified under uvicorn in this process with rate limiting
+and admission opened up (see ``harness.BENCH_ENV``). Results, together with
+the git commit and Python version, are written as JSON to ``--out``. With
+``--baseline``, every metric is printed with its change against an earlier file.
+Use ``--only download,zip`` to run a subset.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.harness import AppServer, compare, configure_env, metadata, percentiles, write_results
+
+configure_env()
+
+from benchmarks import fake_extractor  # noqa: E402
+from benchmarks.media_server import MediaServer, expected  # noqa: E402
+
+MiB = 1024 * 1024
+
+
+async def _fetch(client, method: str, path: str, check_bytes: int = 0, **kwargs) -> Dict[str, float]:
+    """One request; time to first body byte, total time and body size."""
+    started = time.perf_counter()
+    ttfb = None
+    size = 0
+    async with client.stream(method, path, **kwargs) as resp:
+        if resp.status_code >= 400:
+            await resp.aread()
+            raise RuntimeError(f"{method} {path} -> {resp.status_code}: {resp.text[:200]}")
+        first = b""
+        async for chunk in resp.aiter_raw():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            if len(first) < check_bytes:
+                first += chunk[:check_bytes - len(first)]
+            size += len(chunk)
+    if check_bytes and first != expected(0, len(first)):
+        raise RuntimeError(f"{path} returned corrupt bytes")
+    return {"ttfb": ttfb or 0.0, "seconds": time.perf_counter() - started, "bytes": size}
+
+
+def _summary(runs: List[Dict[str, float]]) -> Dict[str, Any]:
+    seconds = sum(r["seconds"] for r in runs)
+    return {
+        "requests": len(runs),
+        "ttfb_ms": percentiles(r["ttfb"] for r in runs),
+        "total_ms": percentiles(r["seconds"] for r in runs),
+        "mib_per_second": round(sum(r["bytes"] for r in runs) / MiB / seconds, 1) if seconds else None,
+    }
+
+
+async def bench_download(app_url: str, media: MediaServer, quick: bool) -> Dict[str, Any]:
+    import httpx
+
+    size = 8 * MiB if quick else 64 * MiB
+    reps = 2 if quick else 5
+    out: Dict[str, Any] = {"size_mib": size // MiB}
+    async with httpx.AsyncClient(base_url=app_url, timeout=300) as client:
+        for mode, stream in (("file", False), ("stream", True)):
+            runs = []
+            for i in range(reps):
+                # unique URLs so nothing is coalesced or served from a cache
+                url = media.url(size=size, n=f"{mode}-{i}-{time.time_ns()}")
+                runs.append(await _fetch(client, "POST", "/api/download", check_bytes=4096,
+                                         json={"url": url, "stream": stream}))
+            out[mode] = _summary(runs)
+
+        # slow upstream: pass-through delivers the first byte before the file is complete
+        rate = 4 * MiB
+        slow = 2 * MiB if quick else 8 * MiB
+        for mode, stream in (("slow_link_file", False), ("slow_link_stream", True)):
+            url = media.url(size=slow, rate=rate, n=f"{mode}-{time.time_ns()}")
+            out[mode] = _summary([await _fetch(client, "POST", "/api/download",
+                                               json={"url": url, "stream": stream})])
+
+        # concurrent clients share the download pool
+        clients = 4 if quick else 16
+        each = 2 * MiB if quick else 8 * MiB
+        started = time.perf_counter()
+        runs = await asyncio.gather(*[
+            _fetch(client, "POST", "/api/download",
+                   json={"url": media.url(size=each, n=f"c{i}-{time.time_ns()}")})
+            for i in range(clients)])
+        wall = time.perf_counter() - started
+        out["concurrent"] = {**_summary(runs), "clients": clients,
+                             "aggregate_mib_per_second": round(clients * each / MiB / wall, 1)}
+
+    out["segmented"] = await asyncio.to_thread(_bench_segmented, media)
+    return out
+
+
+def _bench_segmented(media: MediaServer) -> Dict[str, Any]:
+    """The app's parallel-range fetcher, clean and with a third of range requests failing."""
+    from app.httpclient import http_client
+
+    size = 32 * MiB
+    out: Dict[str, Any] = {"size_mib": size // MiB}
+    with tempfile.TemporaryDirectory() as d:
+        for name, fail in (("clean", 0), ("flaky", 0.3)):
+            before = media.counters.get("failures", 0)
+            path = os.path.join(d, f"{name}.mp4")
+            started = time.perf_counter()
+            try:
+                http_client.download(media.url(size=size, fail=fail, n=f"{name}-{time.time_ns()}"), path)
+            except Exception as e:
+                # a part can still fail all its retries; report it rather than abort the suite
+                out[name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            took = time.perf_counter() - started
+            with open(path, "rb") as f:
+                if f.read(4096) != expected(0, 4096) or os.path.getsize(path) != size:
+                    raise RuntimeError(f"segmented {name} download is corrupt")
+            out[name] = {"seconds": round(took, 3), "mib_per_second": round(size / MiB / took, 1),
+                         "injected_failures": media.counters.get("failures", 0) - before}
+    return out
+
+
+async def bench_batch(app_url: str, media: MediaServer, quick: bool) -> Dict[str, Any]:
+    import httpx
+
+    items = 4 if quick else 8
+    size = 2 * MiB if quick else 16 * MiB
+    async with httpx.AsyncClient(base_url=app_url, timeout=300) as client:
+        urls = [media.url(size=size, n=f"b{i}-{time.time_ns()}") for i in range(items)]
+        run = await _fetch(client, "POST", "/api/downloads", json={"urls": urls})
+    return {"items": items, "item_mib": size // MiB, **_summary([run])}
+
+
+def bench_zip(quick: bool) -> Dict[str, Any]:
+    from app.zipstream import ZipStream
+
+    files = 4 if quick else 8
+    size = 4 * MiB if quick else 32 * MiB
+    with tempfile.TemporaryDirectory() as d:
+        paths = []
+        for i in range(files):
+            path = os.path.join(d, f"clip{i}.mp4")
+            with open(path, "wb") as f:
+                f.write(expected(0, size))
+            paths.append(path)
+        started = time.perf_counter()
+        zs = ZipStream()
+        total = 0
+        for path in paths:
+            for chunk in zs.write_file(path, os.path.basename(path)):
+                total += len(chunk)
+        total += len(zs.close())
+        took = time.perf_counter() - started
+    return {"files": files, "file_mib": size // MiB, "archive_bytes": total,
+            "seconds": round(took, 3), "mib_per_second": round(files * size / MiB / took, 1)}
+
+
+async def bench_sse(app_url: str, quick: bool) -> Dict[str, Any]:
+    """Events per second delivered to many SSE subscribers of one download id."""
+    import httpx
+
+    from app.progress import notifier
+
+    subscribers = 50 if quick else 200
+    events = 100 if quick else 500
+    channel = f"bench-{time.time_ns()}"
+    connected = 0
+    received: List[int] = []
+
+    async def subscriber(client):
+        nonlocal connected
+        count = 0
+        async with client.stream("GET", f"/api/progress/{channel}") as resp:
+            connected += 1
+            async for line in resp.aiter_lines():
+                if line.startswith("data:"):
+                    msg = json.loads(line[5:])
+                    if msg.get("status") == "finished":
+                        break
+                    count += 1
+        received.append(count)
+
+    limits = httpx.Limits(max_connections=subscribers + 10)
+    async with httpx.AsyncClient(base_url=app_url, timeout=60, limits=limits) as client:
+        tasks = [asyncio.ensure_future(subscriber(client)) for _ in range(subscribers)]
+        deadline = time.monotonic() + 30
+        while connected < subscribers and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+        def publish():
+            # not a coalesced status, so every event is delivered
+            for i in range(events):
+                notifier.publish_threadsafe(channel, {"status": "step", "n": i})
+            notifier.publish_threadsafe(channel, {"status": "finished"})
+
+        started = time.perf_counter()
+        threading.Thread(target=publish).start()
+        await asyncio.gather(*tasks)
+        took = time.perf_counter() - started
+    delivered = sum(received)
+    return {"subscribers": subscribers, "events": events, "delivered": delivered,
+            "lost": subscribers * events - delivered, "seconds": round(took, 3),
+            "deliveries_per_second": int(delivered / took)}
+
+
+def _rate(fn: Callable[[int], Any], n: int) -> int:
+    started = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return int(n / (time.perf_counter() - started))
+
+
+def bench_ratelimit(quick: bool) -> Dict[str, Any]:
+    from app.ratelimit import SimpleRateLimiter
+
+    n = 20_000 if quick else 200_000
+    limiter = SimpleRateLimiter()
+    keys = [f"10.0.{i >> 8 & 255}.{i & 255}" for i in range(65536)]
+    out: Dict[str, Any] = {
+        "memory_hot_key_per_second": _rate(lambda i: limiter.check("hot"), n),
+        "memory_spread_keys_per_second": _rate(lambda i: limiter.check(keys[i & 65535]), n),
+    }
+    try:
+        import fakeredis
+    except ImportError:
+        return out
+    for algorithm in ("sliding_window", "sliding_log", "token_bucket"):
+        os.environ["RATE_ALGORITHM"] = algorithm
+        try:
+            limiter = SimpleRateLimiter(client=fakeredis.FakeRedis())
+            out[f"fakeredis_{algorithm}_per_second"] = _rate(lambda i: limiter.check(keys[i & 1023]), n // 20)
+        finally:
+            os.environ.pop("RATE_ALGORITHM", None)
+    return out
+
+
+async def bench_get_info(app_url: str, media: MediaServer, quick: bool) -> Dict[str, Any]:
+    """Our overhead around extraction (pool, cache, sanitising), with a zero-cost extractor."""
+    import httpx
+
+    from app.cache import info_cache
+    from app.ytdl import get_info
+
+    n = 500 if quick else 5000
+    urls = [media.url(n=f"i{i}-{time.time_ns()}") for i in range(n)]
+    info_cache.clear()
+    started = time.perf_counter()
+    for url in urls:
+        get_info(url)
+    miss = (time.perf_counter() - started) / n
+    started = time.perf_counter()
+    for url in urls:
+        get_info(url)
+    hit = (time.perf_counter() - started) / n
+
+    samples = []
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client:
+        for url in urls[:200]:
+            t = time.perf_counter()
+            r = await client.post("/api/info", json={"url": url})
+            r.raise_for_status()
+            samples.append(time.perf_counter() - t)
+    return {"miss_us": round(miss * 1e6, 1), "hit_us": round(hit * 1e6, 1),
+            "api_info_cached_ms": percentiles(samples)}
+
+
+SCENARIOS = ("download", "batch", "zip", "sse", "ratelimit", "get_info")
+
+
+async def run(quick: bool, only: List[str]) -> Dict[str, Any]:
+    fake_extractor.install()
+    results: Dict[str, Any] = {}
+    with MediaServer() as media, AppServer() as server:
+        for name in only:
+            started = time.perf_counter()
+            if name == "download":
+                results[name] = await bench_download(server.url, media, quick)
+            elif name == "batch":
+                results[name] = await bench_batch(server.url, media, quick)
+            elif name == "zip":
+                results[name] = bench_zip(quick)
+            elif name == "sse":
+                results[name] = await bench_sse(server.url, quick)
+            elif name == "ratelimit":
+                results[name] = bench_ratelimit(quick)
+            elif name == "get_info":
+                results[name] = await bench_get_info(server.url, media, quick)
+            print(f"{name}: done in {time.perf_counter() - started:.1f}s", flush=True)
+        results["media_server"] = dict(media.counters)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer repetitions")
+    parser.add_argument("--out", default="bench-results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--only", help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    args = parser.parse_args()
+    only = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = set(only) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # per-request httpx logging would dominate the output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = {"meta": {**metadata(), "quick": args.quick}, "results": asyncio.run(run(args.quick, only))}
+    write_results(args.out, results)
+    if args.baseline:
+        print("\n".join(compare(results, args.baseline)))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
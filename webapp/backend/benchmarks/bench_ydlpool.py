@@ -0,0 +1,89 @@
+"""Benchmark: fresh YoutubeDL per call versus the warm pool.
+
+Run from webapp/backend:
+
+    python -m benchmarks.bench_ydlpool [--calls 50]
+
+Serves a small file from a local HTTP server and resolves it with
+``extract_info(download=False)`` (generic extractor, no network needed), once
+building a new YoutubeDL for every call as the code used to and once through
+``YoutubeDLPool``.
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from yt_dlp import YoutubeDL
+
+from app.ydlpool import YoutubeDLPool
+
+PARAMS = {"quiet": True, "skip_download": True, "no_warnings": True}
+
+
+def _serve(directory: str) -> http.server.ThreadingHTTPServer:
+    class Quiet(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(Quiet, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _timed(calls: int, fn) -> dict:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, "clip.mp4"), "wb") as f:
+            f.write(os.urandom(64 * 1024))
+        server = _serve(root)
+        url = f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"
+
+        def fresh():
+            with YoutubeDL(dict(PARAMS)) as ydl:
+                ydl.extract_info(url, download=False)
+
+        pool = YoutubeDLPool(max_idle=4)
+
+        def pooled():
+            with pool.checkout("info", PARAMS) as ydl:
+                ydl.extract_info(url, download=False)
+
+        def construct_only():
+            YoutubeDL(dict(PARAMS)).close()
+
+        pooled()  # warm the pool
+        results = {
+            "construct_only": _timed(args.calls, construct_only),
+            "fresh_instance": _timed(args.calls, fresh),
+            "pooled_instance": _timed(args.calls, pooled),
+            "pool": pool.stats(),
+        }
+        server.shutdown()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Stand-in for ``yt_dlp.YoutubeDL`` so benchmarks run without network or real extractors.
+
+``install()`` swaps the app's YoutubeDL pool for one that builds
+``FakeYoutubeDL``. Every URL then resolves to itself as one direct HTTP format,
+the way yt-dlp's generic extractor treats a direct media link. Point it at
+``MediaServer`` URLs so downloads and pass-through streams fetch real bytes.
+"""
+import hashlib
+import os
+import shutil
+import time
+import urllib.request
+from typing import Any, Dict, Optional
+
+
+class FakeYoutubeDL:
+    # seconds each extraction pretends to take (page fetch + player parsing)
+    delay = 0.0
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+        self.extractions = 0
+
+    def close(self) -> None:
+        pass
+
+    # hooks YoutubeDLPool rebinds on checkout
+    def _parse_outtmpl(self) -> None:
+        pass
+
+    def build_format_selector(self, spec: str) -> str:
+        return spec
+
+    def sanitize_info(self, info: Dict[str, Any], remove_private_keys: bool = False) -> Dict[str, Any]:
+        return {**info, "formats": [dict(f) for f in info.get("formats", [])]}
+
+    def extract_info(self, url: str, download: bool = True) -> Dict[str, Any]:
+        self.extractions += 1
+        if self.delay:
+            time.sleep(self.delay)
+        vid = hashlib.sha1(url.encode()).hexdigest()[:11]
+        info = {
+            "id": vid, "title": f"clip-{vid}", "ext": "mp4", "url": url, "protocol": "http",
+            "webpage_url": url, "extractor": "fake", "duration": 60,
+            "formats": [{"format_id": "direct", "url": url, "ext": "mp4", "protocol": "http"}],
+        }
+        return self.process_ie_result(info, download)
+
+    def process_ie_result(self, info: Dict[str, Any], download: bool = True) -> Dict[str, Any]:
+        if download:
+            template = self.params["outtmpl"]["default"]
+            path = template.replace("%(title)s", info["title"]).replace("%(ext)s", info["ext"])
+            with urllib.request.urlopen(info["url"]) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            size = os.path.getsize(path)
+            for hook in getattr(self, "_progress_hooks", []):
+                hook({"status": "finished", "filename": path, "downloaded_bytes": size, "total_bytes": size})
+            info = {**info, "_filename": path}
+        return info
+
+
+def install(delay: Optional[float] = None) -> None:
+    """Route the app's yt-dlp calls to ``FakeYoutubeDL``."""
+    from app import ytdl
+    from app.ydlpool import YoutubeDLPool
+
+    if delay is not None:
+        FakeYoutubeDL.delay = delay
+    ytdl.ydl_pool = YoutubeDLPool(factory=FakeYoutubeDL)
@@ -0,0 +1,222 @@
+"""Shared plumbing for the offline benchmarks: app under uvicorn, percentiles, result files.
+
+``python -m benchmarks.harness --port N`` serves the app with the fake
+extractor installed; ``AppProcess`` starts it that way.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# limits that would turn a benchmark into a test of the 429 path; must be set
+# before the app modules are imported
+BENCH_ENV = {
+    "RATE_LIMIT": "1000000000",
+    "ADMISSION_MAX_CONCURRENT": "0",
+    "WARMUP": "0",
+    "PROGRESS_BUFFER": "4096",
+}
+
+
+def configure_env(**overrides: str) -> None:
+    for key, value in {**BENCH_ENV, **overrides}.items():
+        os.environ.setdefault(key, value)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class AppServer:
+    """Runs the FastAPI app under uvicorn on a background thread of this process."""
+
+    def __init__(self, app=None):
+        import uvicorn
+
+        if app is None:
+            from app.main import app
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on"))
+        self._thread = threading.Thread(target=self._server.run, name="bench-uvicorn", daemon=True)
+
+    def __enter__(self) -> "AppServer":
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.should_exit = True
+        self._thread.join(10)
+
+
+class AppProcess:
+    """Runs the app with the fake extractor in a separate uvicorn process.
+
+    Keeps load generation from competing with the app for the GIL, and gives a
+    worker whose memory can be watched (``rss_bytes(proc.pid)``).
+    """
+
+    def __init__(self, extract_delay: float = 0.0, env: Optional[Dict[str, str]] = None):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.extract_delay = extract_delay
+        self.env = {**os.environ, **BENCH_ENV, **(env or {})}
+        self._proc: Optional[subprocess.Popen] = None
+
+    @property
+    def pid(self) -> int:
+        return self._proc.pid
+
+    def __enter__(self) -> "AppProcess":
+        import httpx
+
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.harness", "--port", str(self.port),
+             "--extract-delay", str(self.extract_delay)], cwd=BACKEND, env=self.env)
+        deadline = time.monotonic() + 60
+        while True:
+            if self._proc.poll() is not None or time.monotonic() > deadline:
+                self.__exit__()
+                raise RuntimeError("app process did not start")
+            try:
+                if httpx.get(self.url + "/api/health", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+
+
+def percentiles(samples: Iterable[float], scale: float = 1000.0, digits: int = 2) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max of ``samples`` (seconds), reported in ms by default."""
+    data = sorted(samples)
+    if not data:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+
+    def pick(q: float) -> float:
+        return round(data[min(len(data) - 1, int(q * len(data)))] * scale, digits)
+
+    return {"p50": round(statistics.median(data) * scale, digits), "p95": pick(0.95),
+            "p99": pick(0.99), "max": round(data[-1] * scale, digits)}
+
+
+def rss_bytes(pid: Optional[int] = None) -> Optional[int]:
+    """Resident memory of ``pid`` (default: this process) from /proc.
+
+    Elsewhere only this process's peak RSS (getrusage) is available; None for other pids.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if pid is not None:
+            return None
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of ``pid`` from /proc (None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def metadata() -> Dict[str, Any]:
+    """Where and on what revision the numbers were taken."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _flatten(prefix: str, value: Any, out: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+
+
+def compare(results: Dict[str, Any], baseline_path: str) -> List[str]:
+    """One line per numeric metric with its relative change against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    new: Dict[str, float] = {}
+    old: Dict[str, float] = {}
+    _flatten("", results.get("results", results), new)
+    _flatten("", baseline.get("results", baseline), old)
+    lines = []
+    for name, value in new.items():
+        if name in old and old[name]:
+            lines.append(f"{name}: {value:g} ({(value - old[name]) / old[name] * 100:+.1f}%)")
+        else:
+            lines.append(f"{name}: {value:g}")
+    return lines
+
+
+def write_results(path: str, results: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="serve the app with the fake extractor (used by AppProcess)")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--extract-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    configure_env()
+
+    import uvicorn
+
+    from benchmarks import fake_extractor
+
+    fake_extractor.install(args.extract_delay)
+    from app.main import app
+
+    # per-request httpx logging would dominate the output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""End-to-end load test: many virtual clients against the real app, with an SLO gate.
+
+Run from webapp/backend:
+
+    python -m benchmarks.loadgen [--clients 200] [--duration 30] [--slo-file benchmarks/slo.json]
+
+The app runs unmodified in its own uvicorn process (``harness.AppProcess``)
+with ``FakeYoutubeDL`` in place of yt-dlp, and media comes from a local
+``MediaServer``, so no network is needed. Each virtual client has its own API
+key (and therefore its own rate-limit bucket) and loops over a weighted mix of:
+
+- ``info``: ``POST /api/info`` for one of ``--urls`` URLs (so the cache gets hits)
+- ``download``: ``POST /api/download``, half of them as pass-through streams
+- ``batch``: ``POST /api/downloads`` of three URLs as a zip
+- ``progress``: subscribe to ``/api/progress/{id}``, start a download with that
+  ``X-Download-Id`` and wait for its ``finished`` event
+
+A separate probe calls ``GET /api/health`` every 100 ms on its own connection;
+since that endpoint does no work, its latency shows how long the worker's
+event loop was blocked. The worker's RSS and CPU are sampled every second.
+
+Reports p50/p95/p99/max latency per kind, error and 429 rates, throughput and
+memory over time as JSON (``--out``). SLOs are ``metric<=value`` or
+``metric>=value`` on the dotted names of that report, e.g.
+``--slo health.latency_ms.p99<=50``, or a JSON file of
+``{"metric": {"max": v}}`` / ``{"metric": {"min": v}}``. Any violated SLO
+exits with status 1, except those named with ``--report-only``, which are
+checked and printed but don't fail the run. An ``--slo`` overrides the file's
+bound for that metric; CI uses that to gate the health probe at a looser bound
+than a calibrated machine would, since shared runners are noisier.
+
+All clients share this one Python process. Past a few hundred clients, check
+that the generator is not the bottleneck: its CPU share and event-loop lag
+are reported under ``generator``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import ssl
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.harness import AppProcess, compare, cpu_seconds, metadata, percentiles, rss_bytes, write_results
+from benchmarks.media_server import MediaServer
+
+MiB = 1024 * 1024
+KINDS = ("info", "download", "batch", "progress")
+DEFAULT_MIX = "info=60,download=20,batch=5,progress=15"
+
+
+class Recorder:
+    """Outcome and latency of every request, per kind."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {k: [] for k in KINDS}
+        self.counts: Dict[str, Dict[str, int]] = {k: {"ok": 0, "errors": 0, "rate_limited": 0} for k in KINDS}
+        self.statuses: Dict[str, int] = {}
+
+    def add(self, kind: str, seconds: float, status: int) -> None:
+        if status == 429:
+            self.counts[kind]["rate_limited"] += 1
+        elif 200 <= status < 400:
+            self.counts[kind]["ok"] += 1
+            self.latencies[kind].append(seconds)
+        else:
+            self.counts[kind]["errors"] += 1
+        if status >= 400 or status == 0:
+            name = str(status) if status else "exception"
+            self.statuses[name] = self.statuses.get(name, 0) + 1
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        total = {"ok": 0, "errors": 0, "rate_limited": 0}
+        for kind in KINDS:
+            counts = self.counts[kind]
+            n = sum(counts.values())
+            if not n:
+                continue
+            for k, v in counts.items():
+                total[k] += v
+            out[kind] = {"requests": n, **counts, "error_rate": round(counts["errors"] / n, 4),
+                         "rate_limited_rate": round(counts["rate_limited"] / n, 4),
+                         "latency_ms": percentiles(self.latencies[kind])}
+        n = sum(total.values())
+        out["total"] = {"requests": n, **total,
+                        "error_rate": round(total["errors"] / n, 4) if n else 0.0,
+                        "rate_limited_rate": round(total["rate_limited"] / n, 4) if n else 0.0,
+                        "throughput_rps": round(total["ok"] / duration, 1),
+                        "failures_by_status": dict(self.statuses)}
+        return out
+
+
+class VirtualClient:
+    """One user: its own connections and API key, a weighted random walk over ``KINDS``."""
+
+    def __init__(self, index: int, media: MediaServer, args: argparse.Namespace,
+                 recorder: Recorder, weights: Dict[str, float]):
+        self.rng = random.Random(args.seed + index)
+        self.client = None
+        self.media = media
+        self.args = args
+        self.recorder = recorder
+        self.kinds = [k for k in KINDS if weights.get(k)]
+        self.weights = [weights[k] for k in self.kinds]
+        self.headers = {"X-API-KEY": f"vc-{index}"}
+
+    def _url(self) -> str:
+        # a bounded set of URLs, so info lookups hit the cache the way repeat visitors do
+        return self.media.url(size=self.args.size, n=self.rng.randrange(self.args.urls))
+
+    async def _post(self, path: str, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> int:
+        async with self.client.stream("POST", path, json=body, headers={**self.headers, **(headers or {})}) as resp:
+            async for _ in resp.aiter_raw():
+                pass
+            return resp.status_code
+
+    async def info(self) -> int:
+        return await self._post("/api/info", {"url": self._url()})
+
+    async def download(self) -> int:
+        return await self._post("/api/download", {"url": self._url(), "stream": self.rng.random() < 0.5})
+
+    async def batch(self) -> int:
+        return await self._post("/api/downloads", {"urls": [self._url() for _ in range(3)]})
+
+    async def progress(self) -> int:
+        download_id = uuid.uuid4().hex
+        subscribed = asyncio.get_running_loop().create_future()
+
+        async def follow() -> bool:
+            async with self.client.stream("GET", f"/api/progress/{download_id}", headers=self.headers) as resp:
+                subscribed.set_result(None)
+                async for line in resp.aiter_lines():
+                    if line.startswith("data:") and json.loads(line[5:]).get("status") == "finished":
+                        return True
+            return False
+
+        follower = asyncio.ensure_future(follow())
+        try:
+            await asyncio.wait([subscribed, follower], return_when=asyncio.FIRST_COMPLETED)
+            status = await self._post("/api/download", {"url": self._url()}, {"X-Download-Id": download_id})
+            if status >= 400:
+                return status
+            finished = await asyncio.wait_for(follower, self.args.timeout)
+            return status if finished else 0
+        finally:
+            follower.cancel()
+
+    async def run(self, base_url: str, verify: ssl.SSLContext, start_at: float, end_at: float) -> None:
+        import httpx
+
+        await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+        # a small pool per client like a browser's; one shared pool of hundreds of
+        # connections makes httpcore's connection bookkeeping the bottleneck
+        async with httpx.AsyncClient(base_url=base_url, timeout=self.args.timeout, verify=verify,
+                                     limits=httpx.Limits(max_connections=4)) as self.client:
+            while time.monotonic() < end_at:
+                kind = self.rng.choices(self.kinds, self.weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = await asyncio.wait_for(getattr(self, kind)(), self.args.timeout)
+                except Exception:
+                    status = 0
+                self.recorder.add(kind, time.perf_counter() - started, status)
+                if self.args.think:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+
+
+async def probe_health(url: str, end_at: float, samples: List[float]) -> None:
+    import httpx
+
+    # own connection, so the probe never queues behind the virtual clients' pool
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        while time.monotonic() < end_at:
+            started = time.perf_counter()
+            try:
+                (await client.get("/api/health")).raise_for_status()
+                samples.append(time.perf_counter() - started)
+            except Exception:
+                samples.append(float("inf"))
+            await asyncio.sleep(0.1)
+
+
+async def probe_own_loop(end_at: float, samples: List[float]) -> None:
+    # lag of the generator's own loop; when high, client-side latencies are inflated too
+    while time.monotonic() < end_at:
+        started = time.perf_counter()
+        await asyncio.sleep(0.05)
+        samples.append(time.perf_counter() - started - 0.05)
+
+
+async def sample_worker(pid: int, end_at: float, began: float, timeline: List[Tuple[float, float, float]]) -> None:
+    last = cpu_seconds(pid)
+    while time.monotonic() < end_at:
+        await asyncio.sleep(1)
+        rss, cpu = rss_bytes(pid), cpu_seconds(pid)
+        if rss is not None and cpu is not None:
+            timeline.append((round(time.monotonic() - began, 1), round(rss / MiB, 1), round(cpu - last, 2)))
+            last = cpu
+
+
+async def run(args: argparse.Namespace, weights: Dict[str, float]) -> Dict[str, Any]:
+    env = {"RATE_LIMIT": str(args.rate_limit)} if args.rate_limit else {}
+    recorder = Recorder()
+    health: List[float] = []
+    lag: List[float] = []
+    timeline: List[Tuple[float, float, float]] = []
+    with MediaServer(args.seed) as media, AppProcess(args.extract_delay, env) as server:
+        # loading CA certificates per client would take longer than the ramp
+        verify = ssl.create_default_context()
+        began = time.monotonic()
+        end_at = began + args.ramp + args.duration
+        cpu_before = time.process_time()
+        clients = [VirtualClient(i, media, args, recorder, weights) for i in range(args.clients)]
+        await asyncio.gather(
+            probe_health(server.url, end_at, health),
+            probe_own_loop(end_at, lag),
+            sample_worker(server.pid, end_at, began, timeline),
+            *(c.run(server.url, verify, began + args.ramp * i / args.clients, end_at)
+              for i, c in enumerate(clients)))
+        elapsed = time.monotonic() - began
+        cpu = time.process_time() - cpu_before
+
+    results = recorder.report(elapsed)
+    results["health"] = {"probes": len(health), "latency_ms": percentiles(health)}
+    mib = [m for _, m, _ in timeline]
+    results["worker"] = {
+        "rss_start_mib": mib[0] if mib else None, "rss_peak_mib": max(mib) if mib else None,
+        "rss_end_mib": mib[-1] if mib else None,
+        "rss_growth_mib": round(mib[-1] - mib[0], 1) if mib else None,
+        "cpu_peak": max((c for _, _, c in timeline), default=None),
+        # [seconds since start, RSS MiB, CPU seconds used in the last second]
+        "timeline": timeline,
+    }
+    results["generator"] = {"cpu": round(cpu / elapsed, 2), "loop_lag_ms": percentiles(lag)}
+    return results
+
+
+def _lookup(results: Dict[str, Any], metric: str) -> Optional[float]:
+    value: Any = results
+    for part in metric.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def parse_slos(specs: List[str], path: Optional[str]) -> List[Tuple[str, str, float]]:
+    """``(metric, "<=" or ">=", threshold)`` from ``--slo`` arguments and an optional JSON file.
+
+    An ``--slo`` for the same metric and direction as a file entry replaces it.
+    """
+    slos = []
+    if path:
+        with open(path) as f:
+            for metric, bound in json.load(f).items():
+                if not isinstance(bound, dict):
+                    bound = {"max": bound}
+                if "max" in bound:
+                    slos.append((metric, "<=", float(bound["max"])))
+                if "min" in bound:
+                    slos.append((metric, ">=", float(bound["min"])))
+    for spec in specs:
+        m = re.fullmatch(r"\s*([\w.]+)\s*(<=|>=)\s*([-+\d.eE]+)\s*", spec)
+        if not m:
+            raise ValueError(f"bad SLO {spec!r}, expected metric<=value or metric>=value")
+        slos = [s for s in slos if s[:2] != (m.group(1), m.group(2))]
+        slos.append((m.group(1), m.group(2), float(m.group(3))))
+    return slos
+
+
+def check_slos(results: Dict[str, Any], slos: List[Tuple[str, str, float]]) -> List[Dict[str, Any]]:
+    """Evaluate each SLO; a metric missing from the results counts as violated."""
+    checks = []
+    for metric, op, threshold in slos:
+        value = _lookup(results, metric)
+        ok = value is not None and (value <= threshold if op == "<=" else value >= threshold)
+        checks.append({"metric": metric, "op": op, "threshold": threshold, "value": value, "ok": ok})
+    return checks
+
+
+def _parse_mix(spec: str) -> Dict[str, float]:
+    weights = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise ValueError(f"unknown request kind {kind.strip()!r} (expected {', '.join(KINDS)})")
+        weights[kind.strip()] = float(weight)
+    return weights
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200, help="concurrent virtual clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of full load after the ramp")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which clients start")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weights per request kind (default {DEFAULT_MIX})")
+    parser.add_argument("--think", type=float, default=0.5, help="mean pause between a client's requests (s)")
+    parser.add_argument("--urls", type=int, default=500, help="distinct media URLs the clients pick from")
+    parser.add_argument("--size", type=int, default=256 * 1024, help="bytes per media file")
+    parser.add_argument("--extract-delay", type=float, default=0.05, help="seconds each fake extraction takes")
+    parser.add_argument("--rate-limit", type=int, help="RATE_LIMIT for the app (default: effectively unlimited)")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slo", action="append", default=[], help="metric<=value or metric>=value; repeatable")
+    parser.add_argument("--slo-file", help="JSON file of {metric: {max: v} | {min: v}}")
+    parser.add_argument("--report-only", action="append", default=[], metavar="METRIC",
+                        help="check and print this SLO but don't fail on it; repeatable")
+    parser.add_argument("--out", default="loadgen-results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+    try:
+        weights = _parse_mix(args.mix)
+        slos = parse_slos(args.slo, args.slo_file)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args, weights))
+    checks = check_slos(results, slos)
+    for c in checks:
+        c["gate"] = c["metric"] not in args.report_only
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "baseline")}
+    write_results(args.out, {"meta": {**metadata(), "config": config}, "results": results, "slo": checks})
+
+    if args.baseline:
+        print("\n".join(compare({"results": results}, args.baseline)))
+    else:
+        print(json.dumps({k: ({**v, "timeline": f"{len(v['timeline'])} samples"} if k == "worker" else v)
+                          for k, v in results.items()}, indent=2))
+    failed = [c for c in checks if not c["ok"] and c["gate"]]
+    for c in checks:
+        verdict = "ok  " if c["ok"] else "FAIL" if c["gate"] else "warn"
+        print(f"SLO {verdict} {c['metric']} = {c['value']} (want {c['op']} {c['threshold']:g})")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
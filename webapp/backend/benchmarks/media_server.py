@@ -0,0 +1,164 @@
+"""Local stand-in for a media CDN, used by the offline benchmarks.
+
+Serves synthetic bytes for any path. The query string shapes each response:
+
+- ``size``: body length in bytes (default 1 MiB)
+- ``rate``: bytes per second per connection, to imitate a slow link (default unlimited)
+- ``ranges``: ``0`` to ignore Range headers and omit Accept-Ranges (default 1)
+- ``fail``: probability of answering a GET with 503 (HEAD always succeeds)
+- ``cut``: probability of closing the connection halfway through a GET body
+- ``type``: Content-Type (default ``video/mp4``)
+- ``fail_at``: answer a GET whose range starts at this byte offset with 503
+- ``status``: answer every request with this error status instead (e.g. 404)
+
+The content of byte ``i`` is always ``i % 251``, so any slice can be checked
+without keeping the file around (see ``expected``). The tests use it too,
+through the ``media_server`` fixture in ``tests/conftest.py``.
+"""
+import http.server
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+_PERIOD = 251  # prime, so chunk boundaries don't line up with the pattern
+_BLOCK = bytes(i % _PERIOD for i in range(_PERIOD * 4096))
+WRITE_SIZE = 256 * 1024
+
+
+def expected(start: int, length: int) -> bytes:
+    """The bytes the server sends for ``[start, start + length)``."""
+    out = bytearray()
+    offset = start % _PERIOD
+    while len(out) < length:
+        out += _BLOCK[offset:offset + min(len(_BLOCK) - offset, length - len(out))]
+        offset = 0
+    return bytes(out)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MediaServer"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.count("connections")
+
+    def _params(self) -> Dict[str, str]:
+        return {k: v[-1] for k, v in parse_qs(urlparse(self.path).query).items()}
+
+    def _respond(self, body: bool) -> None:
+        p = self._params()
+        size = int(p.get("size", 1024 * 1024))
+        rate = float(p.get("rate", 0))
+        ranges = p.get("ranges", "1") != "0"
+        rng = self.server.random
+        self.server.count("requests")
+        self.server.seen.append((self.command, dict(self.headers)))
+        if "status" in p:
+            self.send_error(int(p["status"]))
+            return
+        m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if body and (rng.random() < float(p.get("fail", 0))
+                     or (m and "fail_at" in p and int(m.group(1)) == int(p["fail_at"]))):
+            self.server.count("failures")
+            self.send_error(503)
+            return
+
+        start, end, status = 0, size - 1, 200
+        if m and ranges:
+            start = int(m.group(1))
+            end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", p.get("type", "video/mp4"))
+        self.send_header("Content-Length", str(length))
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", f'"{size}"')
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+
+        cut_at = length // 2 if rng.random() < float(p.get("cut", 0)) else None
+        sent = 0
+        began = time.monotonic()
+        while sent < length:
+            n = min(WRITE_SIZE, length - sent)
+            if cut_at is not None and sent + n > cut_at:
+                self.server.count("cuts")
+                self.close_connection = True
+                return
+            self.wfile.write(expected(start + sent, n))
+            sent += n
+            self.server.count("bytes_sent", n)
+            if rate:
+                # pace to the requested rate
+                ahead = sent / rate - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def do_HEAD(self):
+        self.server.count("heads")
+        self._respond(body=False)
+
+    def do_GET(self):
+        try:
+            self._respond(body=True)
+        except (BrokenPipeError, ConnectionResetError):
+            # client went away mid-body
+            pass
+
+
+class MediaServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server on 127.0.0.1 with request/byte counters.
+
+    ``seen`` keeps the method and headers of the last 1000 requests. Use as a
+    context manager, or call ``start``/``stop``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.random = random.Random(seed)
+        self.counters: Dict[str, int] = {}
+        self.seen: Deque[Tuple[str, Dict[str, str]]] = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def url(self, name: str = "clip.mp4", **params) -> str:
+        query = urlencode(params)
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}" + (f"?{query}" if query else "")
+
+    def start(self) -> "MediaServer":
+        threading.Thread(target=self.serve_forever, name="media-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "MediaServer":
+        return self.start()
+
+    def __exit__(self, *exc: Optional[BaseException]) -> None:
+        self.stop()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+# app.main logs to a file; keep test runs from writing into the source tree
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="ytdl-test-logs-"))
+
+import pytest
+
+from app.ratelimit import rate_limiter
+from benchmarks.media_server import MediaServer
+
+
+@pytest.fixture(autouse=True)
+def _generous_rate_limit(monkeypatch):
+    # tests share one in-process limiter; give each test a fresh, roomy budget
+    monkeypatch.setenv("RATE_LIMIT", "1000")
+    rate_limiter.reload()
+    rate_limiter.clear()
+
+
+@pytest.fixture
+def media_server():
+    """A local media CDN (``benchmarks.media_server``); shape responses with ``url(**params)``."""
+    with MediaServer() as server:
+        yield server
+
+
+@pytest.fixture
+def fake_download(monkeypatch):
+    """Installs a stand-in for ``download_to_file``: ``fake_download(body, target=...)``.
+
+    ``body`` is bytes or a function of the URL. Each call writes ``clip.mp4`` into a
+    fresh ``ytdl_`` temp dir (under ``temp_root`` if given), reports it finished to
+    the progress hook and returns its path, also kept in ``.last``. URLs containing
+    "broken" fail. Returns the installed fake.
+    """
+    def install(body=b"media-bytes", target="app.main.download_to_file"):
+        def download(url, format_id=None, progress_hook=None, output_dir=None, temp_root=None):
+            if "broken" in url:
+                raise RuntimeError("video unavailable")
+            data = body(url) if callable(body) else body
+            path = os.path.join(tempfile.mkdtemp(prefix="ytdl_", dir=temp_root), "clip.mp4")
+            with open(path, "wb") as f:
+                f.write(data)
+            if progress_hook:
+                progress_hook({"status": "finished", "downloaded_bytes": len(data), "total_bytes": len(data)})
+            download.last = path
+            return path
+
+        monkeypatch.setattr(target, download)
+        return download
+
+    return install
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.admission import AdmissionController
+from app.main import app
+from app.ratelimit import rate_limiter
+
+client = TestClient(app)
+
+
+def _controller(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, str(value))
+    ctl = AdmissionController()
+    clock = [1000.0]
+    monkeypatch.setattr(ctl, "_now", lambda: clock[0])
+    return ctl, clock
+
+
+def test_concurrent_slots_and_retry_after(monkeypatch):
+    ctl, clock = _controller(monkeypatch, ADMISSION_MAX_CONCURRENT=2)
+    first = ctl.admit("k")
+    clock[0] += 30
+    first.release()
+    first.release()  # idempotent
+
+    a, b = ctl.admit("k"), ctl.admit("k")
+    clock[0] += 10
+    with pytest.raises(HTTPException) as exc:
+        ctl.admit("k")
+    assert exc.value.status_code == 429
+    # slots are held ~30s on average and the oldest has run for 10s
+    assert exc.value.headers["Retry-After"] == "20"
+    ctl.admit("other")  # limits are per client
+
+    a.release()
+    ctl.admit("k")
+    assert ctl.stats()["active"] == 3
+    b.release()
+
+
+def test_concurrency_limit_is_opt_in(monkeypatch):
+    monkeypatch.delenv("ADMISSION_MAX_CONCURRENT", raising=False)
+    ctl, _ = _controller(monkeypatch)
+    slots = [ctl.admit("k") for _ in range(10)]
+    assert ctl.stats()["max_concurrent"] == 0
+    for slot in slots:
+        slot.release()
+
+
+def test_byte_quota(monkeypatch):
+    ctl, clock = _controller(monkeypatch, ADMISSION_MAX_BYTES=100, ADMISSION_PERIOD=3600)
+    ctl.charge_bytes("k", 60)
+    clock[0] += 600
+    ctl.charge_bytes("k", 60)
+    with pytest.raises(HTTPException) as exc:
+        ctl.admit("k")
+    # usable again once the first 60 bytes age out of the window
+    assert exc.value.headers["Retry-After"] == str(3600 - 600 - 40)
+    ctl.check_bytes("other")
+
+    clock[0] += 3000
+    ctl.admit("k").release()
+
+
+def test_jobs_hold_slots_until_reaped(monkeypatch):
+    ctl, _ = _controller(monkeypatch, ADMISSION_MAX_CONCURRENT=1)
+    ctl.track_job("job-1", ctl.admit("k"), ttl=60)
+    ctl.reap("k", lambda job_id: True)
+    with pytest.raises(HTTPException):
+        ctl.admit("k")
+    ctl.reap("k", lambda job_id: False)
+    ctl.admit("k")
+
+
+def test_job_slots_released_on_finish_or_expiry(monkeypatch):
+    ctl, clock = _controller(monkeypatch, ADMISSION_MAX_CONCURRENT=1)
+    ctl.track_job("job-1", ctl.admit("k"), ttl=60)
+    ctl.finish_job("job-1")
+    ctl.finish_job("job-1")  # idempotent
+    ctl.track_job("job-2", ctl.admit("k"), ttl=60)
+    assert ctl.has_jobs("k")
+
+    clock[0] += 61
+    ctl.reap("k", lambda job_id: True)
+    assert not ctl.has_jobs("k")
+    ctl.admit("k")
+
+
+def test_finished_jobs_free_the_client(monkeypatch):
+    from app.main import admission
+
+    monkeypatch.setattr(admission, "max_concurrent", 2)
+    monkeypatch.setattr("app.jobs.download_to_file", lambda *args, **kwargs: "/nonexistent")
+    ids = [client.post("/api/jobs", json={"url": "https://example.com/v"}).json()["job_id"]
+           for _ in range(2)]
+    deadline = time.monotonic() + 5
+    while admission.has_jobs("testclient") and time.monotonic() < deadline:
+        time.sleep(0.02)
+    # the worker callback gave both slots back without another POST /api/jobs
+    assert not admission.has_jobs("testclient"), ids
+    assert client.post("/api/jobs", json={"url": "https://example.com/v"}).status_code == 202
+
+
+def test_batches_are_charged_per_item(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT", "3")
+    rate_limiter.reload()
+    monkeypatch.setattr("app.main.get_info", lambda url: {"title": url, "formats": []})
+
+    resp = client.post("/api/infos", json={"urls": ["a", "b"]})
+    assert resp.status_code == 200
+    assert resp.headers["RateLimit-Remaining"] == "1"
+    resp = client.post("/api/infos", json={"urls": ["a", "b"]})
+    assert resp.status_code == 429
@@ -1,4 +1,7 @@
 import time
+
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 from app.main import app
@@ -42,9 +45,10 @@ def test_rate_limit(monkeypatch):
     # ensure no API key required for this test
     monkeypatch.delenv("API_KEY", raising=False)
 
-    # reset limiter state and stub out get_info so we don't call yt-dlp
+    # reload limiter config, reset its state and stub out get_info so we don't call yt-dlp
     from app.ratelimit import rate_limiter
-    rate_limiter.buckets.clear()
+    rate_limiter.reload()
+    rate_limiter.clear()
 
     # stub out get_info so we don't call yt-dlp
     def _fake_info(url):
@@ -76,3 +80,126 @@ def test_rate_limit(monkeypatch):
     r4 = client.post(
         "/api/info", json={"url": "https://example.com/watch?v=1"})
     assert r4.status_code == 200
+
+
+def test_rate_limit_headers(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT", "1")
+    monkeypatch.delenv("API_KEY", raising=False)
+    from app.ratelimit import rate_limiter
+    rate_limiter.reload()
+    monkeypatch.setattr("app.main.get_info", lambda url: {"title": "fake", "formats": []})
+
+    r1 = client.post("/api/info", json={"url": "https://example.com/watch?v=2"})
+    assert r1.status_code == 200
+    assert r1.headers["RateLimit-Limit"] == "1"
+    assert r1.headers["RateLimit-Remaining"] == "0"
+
+    r2 = client.post("/api/info", json={"url": "https://example.com/watch?v=2"})
+    assert r2.status_code == 429
+    assert int(r2.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.parametrize("algorithm", ["sliding_log", "sliding_window", "token_bucket"])
+def test_redis_lua_algorithms(monkeypatch, algorithm):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from app.ratelimit import SimpleRateLimiter
+
+    monkeypatch.setenv("RATE_LIMIT", "3")
+    monkeypatch.setenv("RATE_PERIOD", "60")
+    monkeypatch.setenv("RATE_ALGORITHM", algorithm)
+    server = fakeredis.FakeServer()
+    limiter = SimpleRateLimiter(client=fakeredis.FakeRedis(server=server))
+    # a second instance sharing the same Redis sees the same counts
+    other = SimpleRateLimiter(client=fakeredis.FakeRedis(server=server))
+
+    assert [limiter.check("k").remaining for _ in range(2)] == [2, 1]
+    assert other.check("k").remaining == 0
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("k")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+    # denied keys are answered locally until Retry-After passes
+    calls = []
+    script = limiter._script
+    limiter._script = lambda **kw: calls.append(kw) or script(**kw)
+    with pytest.raises(HTTPException):
+        limiter.check("k")
+    assert calls == []
+
+
+def test_gcra_burst_rate_and_sweep():
+    from app.ratelimit import GcraBuckets
+
+    buckets = GcraBuckets()
+    # a burst of `limit`, then one request per period/limit
+    assert [buckets.hit("ip", 4, 60, 0.0).remaining for _ in range(4)] == [3, 2, 1, 0]
+    denied = buckets.hit("ip", 4, 60, 1.0)
+    assert not denied.allowed and denied.retry_after == pytest.approx(14.0)
+    assert buckets.hit("ip", 4, 60, 15.0).allowed
+    assert not buckets.hit("ip", 4, 60, 15.0).allowed
+
+    buckets.hit("other", 4, 60, 15.0)
+    assert buckets.sweep(now=30.0) == 1  # "other" is idle again, "ip" is not
+    assert len(buckets) == 1
+    assert buckets.sweep(now=75.0) == 1
+    assert len(buckets) == 0
+
+
+def test_gcra_table_grows_sweeps_and_shrinks(monkeypatch):
+    from app.ratelimit import GcraBuckets
+
+    monkeypatch.setattr("app.ratelimit._MIN_SLOTS", 8)
+    buckets = GcraBuckets()
+    # keys idle at different times share probe runs of the small table
+    for i in range(100):
+        assert buckets.hit(f"k{i}", 2, 10, float(i % 10)).remaining == 1
+    assert len(buckets) == 100 and len(buckets._hashes) == 256
+
+    assert buckets.sweep(now=10.0, chunk=7) == 60  # TATs 5..10 have passed
+    for i in range(100):
+        # swept keys start a fresh burst, the rest still remember their first hit
+        assert buckets.hit(f"k{i}", 2, 10, 10.0).remaining == (1 if i % 10 <= 5 else 0)
+    assert buckets.sweep(now=100.0) == 100
+    assert len(buckets) == 0 and len(buckets._hashes) == 8
+
+
+@pytest.mark.parametrize("failure", ["local", "open", "closed"])
+def test_redis_failure_mode(monkeypatch, failure):
+    import redis
+
+    from app.ratelimit import SimpleRateLimiter
+
+    monkeypatch.setenv("RATE_LIMIT", "1")
+    monkeypatch.setenv("RATE_REDIS_FAILURE", failure)
+    monkeypatch.setenv("REDIS_URL", "redis://127.0.0.1:1/0")
+    opened = {}
+
+    class DownRedis:
+        def register_script(self, source):
+            def script(**kw):
+                raise redis.exceptions.TimeoutError("Timeout reading from socket")
+            return script
+
+    def from_url(url, **kwargs):
+        opened.update(kwargs)
+        return DownRedis()
+
+    monkeypatch.setattr(redis.Redis, "from_url", from_url)
+    limiter = SimpleRateLimiter()
+    assert opened == {"socket_timeout": 0.25, "socket_connect_timeout": 0.25}
+
+    if failure == "closed":
+        with pytest.raises(HTTPException) as exc:
+            limiter.check("k")
+        assert exc.value.status_code == 503
+        return
+    assert limiter.check("k").allowed
+    if failure == "open":
+        assert limiter.check("k").allowed
+    else:
+        # counted locally, so the limit still holds in this process
+        with pytest.raises(HTTPException) as exc:
+            limiter.check("k")
+        assert exc.value.status_code == 429
@@ -0,0 +1,110 @@
+import asyncio
+import io
+import threading
+import zipfile
+
+from fastapi.testclient import TestClient
+
+from app.executor import HostLimiter
+from app.main import app
+
+client = TestClient(app)
+
+
+def _url_body(url):
+    return url.encode("utf-8") * 1000
+
+
+def test_batch_streams_stored_zip(fake_download):
+    fake_download(_url_body)
+    urls = ["https://example.com/a", "https://example.com/broken", "https://example.com/b"]
+
+    resp = client.post("/api/downloads", json={"urls": urls})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+
+    zf = zipfile.ZipFile(io.BytesIO(resp.content))
+    assert zf.testzip() is None
+    # items are archived in completion order
+    assert sorted(zf.namelist()) == ["clip (1).mp4", "clip.mp4", "error_1.txt"]
+    assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+    bodies = {zf.read(n) for n in ("clip.mp4", "clip (1).mp4")}
+    assert bodies == {b"https://example.com/a" * 1000, b"https://example.com/b" * 1000}
+    assert b"video unavailable" in zf.read("error_1.txt")
+
+
+def test_batch_requires_urls():
+    assert client.post("/api/downloads", json={}).status_code == 400
+
+
+def test_batch_items_download_concurrently(monkeypatch, fake_download):
+    # each download waits until all three are in progress; run one at a time
+    # the barrier breaks and the items end up as error entries
+    barrier = threading.Barrier(3, timeout=5)
+    download = fake_download(_url_body)
+
+    def meeting_download(url, *args, **kwargs):
+        barrier.wait()
+        return download(url)
+
+    monkeypatch.setattr("app.main.download_to_file", meeting_download)
+    monkeypatch.setattr("app.main.BATCH_CONCURRENCY", 3)
+    urls = [f"https://host{i}.example.com/v" for i in range(3)]
+
+    resp = client.post("/api/downloads", json={"urls": urls})
+    assert resp.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(resp.content)).namelist()
+    assert not barrier.broken
+    assert sorted(names) == ["clip (1).mp4", "clip (2).mp4", "clip.mp4"]
+
+
+def test_host_limiter_caps_per_host():
+    limiter = HostLimiter(per_host=2)
+    peak = {"a.example.com": 0, "b.example.com": 0}
+    running = {"a.example.com": 0, "b.example.com": 0}
+
+    async def job(url):
+        host = limiter.host_of(url)
+        async with limiter.limit(url):
+            running[host] += 1
+            peak[host] = max(peak[host], running[host])
+            await asyncio.sleep(0.01)
+            running[host] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(job(f"https://{h}/{i}") for i in range(6) for h in peak))
+
+    asyncio.run(scenario())
+    assert peak == {"a.example.com": 2, "b.example.com": 2}
+    assert limiter.stats() == {}
+
+
+def test_batch_slot_released_when_client_leaves_before_the_body(fake_download):
+    import json
+
+    from app.main import admission
+
+    fake_download(_url_body)
+    active = admission.stats()["active"]
+    body = json.dumps({"urls": ["https://example.com/a"]}).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/api/downloads", "raw_path": b"/api/downloads",
+             "query_string": b"", "root_path": "", "client": ("10.0.0.9", 1234), "server": ("test", 80),
+             "headers": [(b"content-type", b"application/json"), (b"host", b"test")]}
+
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            raise OSError("connection reset")
+
+    try:
+        asyncio.run(app(scope, receive, send))
+    except Exception:
+        pass
+    assert admission.stats()["active"] == active
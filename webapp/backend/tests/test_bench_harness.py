@@ -0,0 +1,46 @@
+import json
+import urllib.request
+
+from benchmarks.harness import compare, percentiles
+from benchmarks.loadgen import check_slos, parse_slos
+from benchmarks.media_server import MediaServer, expected
+
+
+def test_media_server_serves_checkable_ranges():
+    with MediaServer() as media:
+        url = media.url(size=1000)
+        req = urllib.request.Request(url, headers={"Range": "bytes=300-"})
+        with urllib.request.urlopen(req) as resp:
+            assert resp.status == 206
+            assert resp.headers["Content-Range"] == "bytes 300-999/1000"
+            assert resp.read() == expected(300, 700)
+        with urllib.request.urlopen(media.url(size=10, ranges=0)) as resp:
+            assert resp.headers.get("Accept-Ranges") is None
+            assert resp.read() == bytes(range(10))
+    assert media.counters["requests"] == 2
+
+
+def test_percentiles_and_compare(tmp_path):
+    assert percentiles([]) == {"p50": None, "p95": None, "p99": None, "max": None}
+    p = percentiles([i / 1000 for i in range(1, 101)])
+    assert p["p50"] == 50.5 and p["p99"] == 100.0 and p["max"] == 100.0
+
+    baseline = tmp_path / "old.json"
+    baseline.write_text(json.dumps({"results": {"zip": {"mib_per_second": 100}}}))
+    lines = compare({"results": {"zip": {"mib_per_second": 150, "files": 4}}}, str(baseline))
+    assert lines == ["zip.mib_per_second: 150 (+50.0%)", "zip.files: 4"]
+
+
+def test_slo_gate(tmp_path):
+    slo_file = tmp_path / "slo.json"
+    slo_file.write_text(json.dumps({"health.latency_ms.p99": {"max": 100}, "total.error_rate": 0.01}))
+    slos = parse_slos(["total.throughput_rps>=50"], str(slo_file))
+    results = {"health": {"latency_ms": {"p99": 250.0}}, "total": {"error_rate": 0.0, "throughput_rps": 80}}
+    checks = {c["metric"]: c["ok"] for c in check_slos(results, slos + [("info.latency_ms.p99", "<=", 1)])}
+    assert checks == {"health.latency_ms.p99": False, "total.error_rate": True,
+                      "total.throughput_rps": True, "info.latency_ms.p99": False}
+
+    # a command-line bound replaces the file's for that metric
+    loose = parse_slos(["health.latency_ms.p99<=400"], str(slo_file))
+    assert ("health.latency_ms.p99", "<=", 400.0) in loose
+    assert ("health.latency_ms.p99", "<=", 100.0) not in loose
@@ -0,0 +1,141 @@
+import time
+
+from app.cache import InfoCache, canonical_key, stream_url_ttl
+
+
+def test_canonical_key_merges_youtube_url_shapes():
+    keys = {
+        canonical_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42"),
+        canonical_key("https://youtu.be/dQw4w9WgXcQ"),
+        canonical_key("https://m.youtube.com/shorts/dQw4w9WgXcQ"),
+    }
+    assert keys == {"youtube:dQw4w9WgXcQ"}
+    assert canonical_key("HTTPS://Example.com/a.mp4#frag") == "https://example.com/a.mp4"
+
+
+def test_canonical_key_rejects_lookalike_hosts():
+    url = "https://notyoutube.com/watch?v=dQw4w9WgXcQ"
+    assert canonical_key(url) == url
+    assert canonical_key("https://youtube.com.evil.example/watch?v=dQw4w9WgXcQ").startswith("https://")
+    assert canonical_key("https://youtube.com/watch?v=dQw4w9WgXcQ") == "youtube:dQw4w9WgXcQ"
+
+
+def test_canonical_key_keeps_playlist_apart_from_video():
+    video = canonical_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    playlist = canonical_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123")
+    assert playlist == "youtube:dQw4w9WgXcQ:list=PL123"
+    assert playlist != video
+
+
+def test_ttl_respects_signed_url_expiry():
+    expire = int(time.time()) + 300
+    info = {"formats": [{"url": f"https://r1.googlevideo.com/videoplayback?expire={expire}&x=1"}]}
+    ttl = stream_url_ttl(info, 3600)
+    assert 200 < ttl <= 240
+    assert stream_url_ttl({"formats": []}, 3600) == 3600
+
+
+def test_lru_bound_and_counters(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setenv("INFO_CACHE_MAX_ENTRIES", "2")
+    cache = InfoCache()
+
+    cache.put("https://example.com/1", {"id": "1"})
+    cache.put("https://example.com/2", {"id": "2"})
+    assert cache.get("https://example.com/1") == {"id": "1"}
+    cache.put("https://example.com/3", {"id": "3"})
+
+    # entry 2 was least recently used and got evicted
+    assert cache.get("https://example.com/2") is None
+    assert cache.get("https://example.com/3") == {"id": "3"}
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+def test_get_info_extracts_once(monkeypatch):
+    from app import ytdl
+
+    calls = []
+
+    class FakeYDL:
+        def __init__(self, opts):
+            self.params = opts
+
+        def close(self):
+            pass
+
+        def extract_info(self, url, download=False):
+            calls.append(url)
+            return {"id": "dQw4w9WgXcQ", "title": "cached"}
+
+        def sanitize_info(self, info):
+            return info
+
+    from app.ydlpool import YoutubeDLPool
+
+    monkeypatch.setattr(ytdl, "ydl_pool", YoutubeDLPool(factory=FakeYDL))
+    ytdl.info_cache.clear()
+    try:
+        ytdl.get_info("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        info = ytdl.get_info("https://youtu.be/dQw4w9WgXcQ")
+    finally:
+        ytdl.info_cache.clear()
+    assert info["title"] == "cached"
+    assert len(calls) == 1
+
+
+def test_download_reuses_cached_info(monkeypatch, tmp_path, media_server):
+    import os
+
+    from app import ytdl
+    from app.ydlpool import YoutubeDLPool
+
+    # a page, not media, so the download goes through the extractor
+    url = media_server.url("watch", type="text/html")
+    calls = []
+
+    class FakeYDL:
+        def __init__(self, opts):
+            self.params = opts
+
+        def close(self):
+            pass
+
+        def _parse_outtmpl(self):
+            pass
+
+        def build_format_selector(self, spec):
+            return spec
+
+        def sanitize_info(self, info, remove_private_keys=False):
+            return dict(info)
+
+        def extract_info(self, url, download=False):
+            calls.append("extract")
+            return self.process_ie_result({"id": "v", "title": "clip", "formats": []}, download)
+
+        def process_ie_result(self, info, download=True):
+            calls.append("process")
+            if download:
+                path = self.params["outtmpl"]["default"].replace("%(title)s.%(ext)s", "clip.mp4")
+                with open(path, "wb") as f:
+                    f.write(b"data")
+                info["_filename"] = path
+            return info
+
+    monkeypatch.setattr(ytdl, "ydl_pool", YoutubeDLPool(factory=FakeYDL))
+    ytdl.info_cache.clear()
+    try:
+        ytdl.get_info(url)
+        calls.clear()
+        before = ytdl.info_cache.stats()
+        path = ytdl.download_to_file(url, "18", temp_root=str(tmp_path))
+        after = ytdl.info_cache.stats()
+    finally:
+        ytdl.info_cache.clear()
+    assert os.path.basename(path) == "clip.mp4"
+    # format selection and download straight from the cached extraction
+    assert calls == ["process"]
+    # the download's lookup isn't counted on top of get_info's
+    assert (after["hits"], after["misses"]) == (before["hits"], before["misses"])
@@ -0,0 +1,91 @@
+import os
+
+from app.diskcache import DownloadCache
+
+
+def _download(cache, name, size):
+    # simulate a finished download in its own temp dir under the staging area
+    d = os.path.join(cache.staging_root, f"ytdl_{name}")
+    os.makedirs(d)
+    path = os.path.join(d, f"{name}.mp4")
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_put_get_and_rebuild(tmp_path):
+    cache = DownloadCache(str(tmp_path))
+    src = _download(cache, "a", 100)
+
+    cached = cache.put("https://youtu.be/dQw4w9WgXcQ", "18", src)
+    assert cached != src and not os.path.exists(src)
+    assert cache.owns(cached) and not cache.owns(src)
+    # same video spelled differently, same format -> hit
+    assert cache.get("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "18") == cached
+    assert cache.get("https://youtu.be/dQw4w9WgXcQ", "22") is None
+
+    restarted = DownloadCache(str(tmp_path))
+    assert restarted.get("https://youtu.be/dQw4w9WgXcQ", "18") == cached
+    assert restarted.stats()["bytes"] == 100
+
+
+def test_quota_evicts_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_CACHE_MAX_BYTES", "250")
+    cache = DownloadCache(str(tmp_path))
+
+    first = cache.put("https://example.com/1.mp4", None, _download(cache, "1", 100))
+    cache.put("https://example.com/2.mp4", None, _download(cache, "2", 100))
+    assert cache.get("https://example.com/1.mp4", None) == first
+    cache.put("https://example.com/3.mp4", None, _download(cache, "3", 100))
+
+    assert cache.get("https://example.com/2.mp4", None) is None
+    assert cache.get("https://example.com/1.mp4", None) == first
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 200
+
+
+def test_disabled_cache_is_passthrough(monkeypatch):
+    monkeypatch.delenv("DOWNLOAD_CACHE_DIR", raising=False)
+    cache = DownloadCache()
+    assert not cache.enabled
+    assert cache.put("https://example.com/x.mp4", None, "/tmp/x.mp4") == "/tmp/x.mp4"
+    assert cache.get("https://example.com/x.mp4", None) is None
+
+
+def test_pinned_entry_survives_eviction(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_CACHE_MAX_BYTES", "150")
+    cache = DownloadCache(str(tmp_path))
+
+    first = cache.put("https://example.com/1.mp4", None, _download(cache, "1", 100))
+    assert cache.get("https://example.com/1.mp4", None, pin=True) == first
+    cache.put("https://example.com/2.mp4", None, _download(cache, "2", 100))
+    # over quota, but the only candidate is being served
+    assert os.path.exists(first)
+
+    cache.unpin(first)
+    cache.put("https://example.com/3.mp4", None, _download(cache, "3", 100))
+    assert not os.path.exists(first)
+
+
+def test_uncached_files_are_not_pinned(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_CACHE_MAX_BYTES", "50")
+    cache = DownloadCache(str(tmp_path))
+    src = _download(cache, "big", 100)
+    # too large for the quota, so the caller keeps its staging file
+    assert cache.put("https://example.com/big.mp4", None, src) == src
+    assert cache.pin(src) is False
+    assert cache._pins == {}
+
+
+def test_quota_counts_entries_of_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_CACHE_MAX_BYTES", "250")
+    monkeypatch.setattr("app.diskcache._RESCAN_INTERVAL", 0)
+    api, worker = DownloadCache(str(tmp_path)), DownloadCache(str(tmp_path))
+
+    api.put("https://example.com/1.mp4", None, _download(api, "1", 100))
+    api.put("https://example.com/2.mp4", None, _download(api, "2", 100))
+    worker.put("https://example.com/3.mp4", None, _download(worker, "3", 100))
+
+    assert worker.stats()["bytes"] == 200
+    on_disk = [f for _, _, files in os.walk(tmp_path) for f in files if f.endswith(".mp4")]
+    assert len(on_disk) == 2
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.executor import BoundedExecutor, HostLimiter
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_executor_rejects_when_saturated():
+    ex = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(ex.run(release.wait))
+        waiting = asyncio.ensure_future(ex.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert ex.stats()["active"] == 1
+        assert ex.stats()["queued"] == 1
+
+        # one running + one queued fills the pool; the next call is rejected
+        with pytest.raises(HTTPException) as exc:
+            await ex.run(lambda: None)
+        assert exc.value.status_code == 503
+
+        release.set()
+        assert await running is True
+        assert await waiting == "queued"
+
+    asyncio.run(scenario())
+    stats = ex.stats()
+    assert stats["active"] == 0 and stats["queued"] == 0
+    assert stats["rejected"] == 1
+
+
+def test_stats_endpoint_reports_pools():
+    resp = client.get("/api/stats")
+    assert resp.status_code == 200
+    pools = resp.json()["pools"]
+    assert set(pools) == {"info", "download"}
+    assert pools["download"]["active"] == 0
+
+
+@pytest.mark.parametrize("cancel_first", [True, False])
+def test_host_limiter_cancelled_waiter_never_doubles_a_slot(cancel_first):
+    # a waiter is cancelled right before, or right after, the holder hands it the slot
+    limiter = HostLimiter(per_host=1)
+    host = "a.example.com"
+    inside = []
+
+    async def hold(gate):
+        async with limiter.limit(f"https://{host}/v"):
+            inside.append("b")
+            await gate.wait()
+            inside.remove("b")
+
+    async def scenario():
+        await limiter._acquire(host)  # the holder
+        a = asyncio.ensure_future(limiter._acquire(host))
+        gate = asyncio.Event()
+        b = asyncio.ensure_future(hold(gate))
+        await asyncio.sleep(0)
+        if cancel_first:
+            a.cancel()
+            limiter._release(host)
+        else:
+            limiter._release(host)
+            a.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await a
+        await asyncio.sleep(0.01)
+        assert inside == ["b"]
+        assert limiter.stats() == {host: 1}
+        gate.set()
+        await b
+        assert limiter.stats() == {}
+
+    asyncio.run(scenario())
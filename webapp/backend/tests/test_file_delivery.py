@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.background import BackgroundTask
+
+from app.main import app
+from app.responses import DownloadFileResponse
+
+client = TestClient(app)
+BODY = bytes(range(256)) * 64
+
+
+def test_download_supports_range_and_cleans_up(fake_download):
+    download = fake_download(BODY)
+
+    full = client.post("/api/download", json={"url": "https://example.com/v"})
+    assert full.status_code == 200
+    assert full.content == BODY
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-length"] == str(len(BODY))
+    assert full.headers["content-type"] == "video/mp4"
+    assert 'filename="clip.mp4"' in full.headers["content-disposition"]
+    assert "etag" in full.headers
+    assert not os.path.exists(os.path.dirname(download.last))
+
+    part = client.post("/api/download", json={"url": "https://example.com/v"},
+                       headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.content == BODY[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(BODY)}"
+
+    # a fresh download may not be byte-identical, so an earlier copy's ETag doesn't match it
+    refetched = client.post("/api/download", json={"url": "https://example.com/v"},
+                            headers={"Range": "bytes=100-199", "If-Range": full.headers["etag"]})
+    assert refetched.status_code == 200
+
+    # a stale If-Range validator falls back to the full body
+    stale = client.post("/api/download", json={"url": "https://example.com/v"},
+                        headers={"Range": "bytes=0-9", "If-Range": '"not-the-etag"'})
+    assert stale.status_code == 200
+    assert stale.content == BODY
+
+
+def test_range_requests_for_cached_files_take_no_slot(monkeypatch, tmp_path, fake_download):
+    from app import main
+    from app.diskcache import DownloadCache
+
+    fake_download(BODY)
+    cache = DownloadCache(root=str(tmp_path))
+    monkeypatch.setattr(main, "download_cache", cache)
+    monkeypatch.setattr("app.flights.download_cache", cache)
+    monkeypatch.setattr(main.admission, "max_concurrent", 1)
+    body = {"url": "https://example.com/v"}
+    assert client.post("/api/download", json=body).status_code == 200
+
+    held = main.admission.admit("testclient")
+    try:
+        part = client.post("/api/download", json=body, headers={"Range": "bytes=0-99"})
+        assert part.status_code == 206
+        # the cache entry keeps its ETag, so If-Range continuations match
+        resumed = client.post("/api/download", json=body,
+                              headers={"Range": "bytes=100-199", "If-Range": part.headers["etag"]})
+        assert resumed.status_code == 206 and resumed.content == BODY[100:200]
+        assert client.post("/api/download", json=body).status_code == 429
+    finally:
+        held.release()
+
+
+def test_cleanup_runs_when_client_aborts(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(BODY * 100)
+    cleaned = []
+    response = DownloadFileResponse(
+        str(path), background=BackgroundTask(lambda: cleaned.append(True)))
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise OSError("connection reset")
+
+    scope = {"type": "http", "method": "GET", "headers": []}
+    with pytest.raises(Exception):
+        asyncio.run(response(scope, receive, send))
+    assert cleaned == [True]
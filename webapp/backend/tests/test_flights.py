@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from app.flights import DownloadFlights
+
+
+def test_identical_downloads_share_one_job():
+    removed = []
+    flights = DownloadFlights(cleanup=removed.append)
+    started = []
+    seen = {"a": [], "b": [], "c": []}
+
+    async def start(emit):
+        started.append(1)
+        await asyncio.sleep(0.05)
+        emit({"status": "downloading", "downloaded_bytes": 10})
+        return "/tmp/ytdl_x/video.mp4"
+
+    async def scenario():
+        results = await asyncio.gather(*(
+            flights.acquire(("url", "18", None), start, listener=seen[name].append)
+            for name in seen
+        ))
+        assert {path for path, _ in results} == {"/tmp/ytdl_x/video.mp4"}
+        assert flights.stats() == {"in_flight": 1, "started": 1, "coalesced": 2}
+
+        # the file survives until the last consumer releases it
+        results[0][1]()
+        results[1][1]()
+        assert removed == []
+        results[2][1]()
+        results[2][1]()  # releasing twice is harmless
+        assert removed == ["/tmp/ytdl_x/video.mp4"]
+
+    asyncio.run(scenario())
+    assert len(started) == 1
+    assert all(events == [{"status": "downloading", "downloaded_bytes": 10}]
+               for events in seen.values())
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_failed_download_is_not_reused():
+    flights = DownloadFlights(cleanup=lambda p: None)
+    attempts = []
+
+    async def start(emit):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "/tmp/ok"
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await flights.acquire("k", start)
+        path, release = await flights.acquire("k", start)
+        release()
+        return path
+
+    assert asyncio.run(scenario()) == "/tmp/ok"
+    assert len(attempts) == 2
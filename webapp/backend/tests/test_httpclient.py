@@ -0,0 +1,30 @@
+import pytest
+
+from app.httpclient import SharedHttpClient, is_tls_error
+from benchmarks.media_server import expected
+
+
+def test_downloads_reuse_one_connection(media_server, tmp_path):
+    url = media_server.url(size=300_000)
+    client = SharedHttpClient()
+    events = []
+    try:
+        assert client.head(url).headers["content-type"] == "video/mp4"
+        for name in ("a.mp4", "b.mp4"):
+            out = tmp_path / name
+            assert client.download(url, str(out), progress_hook=events.append) == 300_000
+            assert out.read_bytes() == expected(0, 300_000)
+    finally:
+        client.close()
+    assert media_server.counters["connections"] == 1
+    assert events[-1]["status"] == "finished" and events[-1]["downloaded_bytes"] == 300_000
+
+
+def test_http_errors_are_raised_without_tls_fallback(media_server, tmp_path):
+    client = SharedHttpClient()
+    try:
+        with pytest.raises(Exception) as exc:
+            client.download_with_fallback(media_server.url("missing.mp4", status=404), str(tmp_path / "x"))
+    finally:
+        client.close()
+    assert not is_tls_error(exc.value)
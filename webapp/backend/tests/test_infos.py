@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _fake_info(url):
+    # later URLs resolve faster so completion order differs from request order
+    time.sleep({"a": 0.3, "b": 0.2, "c": 0.1}.get(url, 0))
+    if url == "bad":
+        raise RuntimeError("\x1b[0;31mERROR:\x1b[0m unsupported url")
+    return {"title": f"title-{url}", "id": url, "formats": [{"format_id": "18"}]}
+
+
+def test_infos_resolves_concurrently_in_order(monkeypatch):
+    # every lookup waits until all three are running at once, so this only
+    # resolves if they run concurrently (a sequential run breaks the barrier)
+    barrier = threading.Barrier(3, timeout=5)
+
+    def meeting_info(url):
+        if url != "bad":
+            barrier.wait()
+        return _fake_info(url)
+
+    monkeypatch.setattr("app.main.get_info", meeting_info)
+
+    resp = client.post("/api/infos", json={"urls": ["a", "b", "c", "bad"]})
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [r["url"] for r in body] == ["a", "b", "c", "bad"]
+    assert body[0]["title"] == "title-a"
+    assert body[0]["formats"][0]["format_id"] == "18"
+    assert body[3]["error"] == "ERROR: unsupported url"
+    assert not barrier.broken
+
+
+def test_infos_per_url_timeout(monkeypatch):
+    monkeypatch.setattr("app.main.get_info", _fake_info)
+    monkeypatch.setattr("app.main.INFO_TIMEOUT", 0.15)
+
+    body = client.post("/api/infos", json={"urls": ["a", "c"]}).json()
+    assert "Timed out" in body[0]["error"]
+    assert body[1]["title"] == "title-c"
+
+
+def test_infos_streaming_emits_in_completion_order(monkeypatch):
+    monkeypatch.setattr("app.main.get_info", _fake_info)
+
+    resp = client.post("/api/infos", json={"urls": ["a", "b", "c"], "stream": True})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines() if line]
+    assert [line["index"] for line in lines] == [2, 1, 0]
+    assert lines[0]["url"] == "c"
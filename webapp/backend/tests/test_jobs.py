@@ -0,0 +1,48 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def _wait_for(job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["status"] in ("finished", "failed"):
+            return status
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+def test_job_lifecycle(fake_download):
+    fake_download(b"media-bytes", target="app.jobs.download_to_file")
+
+    resp = client.post("/api/jobs", json={"url": "https://example.com/v"})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+
+    status = _wait_for(job_id)
+    assert status["status"] == "finished"
+    assert status["filename"] == "clip.mp4"
+    assert status["progress"]["downloaded_bytes"] == 11
+
+    file_resp = client.get(f"/api/jobs/{job_id}/file")
+    assert file_resp.status_code == 200
+    assert file_resp.content == b"media-bytes"
+
+
+def test_failed_and_unknown_jobs(monkeypatch):
+    def failing_download(*args, **kwargs):
+        raise RuntimeError("extraction failed")
+
+    monkeypatch.setattr("app.jobs.download_to_file", failing_download)
+
+    job_id = client.post("/api/jobs", json={"url": "https://example.com/v"}).json()["job_id"]
+    status = _wait_for(job_id)
+    assert status["status"] == "failed"
+    assert "extraction failed" in status["error"]
+    assert client.get(f"/api/jobs/{job_id}/file").status_code == 409
+    assert client.get("/api/jobs/nope").status_code == 404
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import DownloadTimer, Metrics
+
+client = TestClient(app)
+
+
+def _sample(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[-1])
+    return 0.0
+
+
+def test_metrics_endpoint_counts_requests_and_bytes(fake_download):
+    fake_download(b"x" * 1000)
+    before = client.get("/metrics").text
+    assert client.post("/api/download", json={"url": "https://example.com/m"}).status_code == 200
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    after = r.text
+
+    name = 'ytdl_bytes_out_total{mode="file"}'
+    assert _sample(after, name) - _sample(before, name) == 1000
+    allowed = 'ytdl_rate_limit_decisions_total{result="allowed"}'
+    assert _sample(after, allowed) > _sample(before, allowed)
+    serve = 'ytdl_download_phase_seconds_count{phase="serve"}'
+    assert _sample(after, serve) == _sample(before, serve) + 1
+    assert 'ytdl_executor_active{pool="download"}' in after
+    assert 'ytdl_temp_disk_bytes{area="temp"}' in after
+
+
+def test_download_timer_splits_phases():
+    m = Metrics()
+    events = []
+    timer = DownloadTimer(m, events.append)
+    timer.enter("extract")
+    for status in ({"status": "downloading", "downloaded_bytes": 10},
+                   {"status": "finished", "downloaded_bytes": 100},
+                   {"status": "downloading", "downloaded_bytes": 5},
+                   {"status": "finished", "downloaded_bytes": 50}):
+        timer(status)
+    timer.finish()
+    assert len(events) == 4
+
+    value = m.registry.get_sample_value
+    for phase in ("extract", "fetch", "merge"):
+        # merged formats fetch twice but count as one download per phase
+        assert value("ytdl_download_phase_seconds_count", {"phase": phase}) == 1
+    assert value("ytdl_bytes_in_total", {"source": "ytdlp"}) == 150
+
+
+def test_multiprocess_workers_are_aggregated(tmp_path):
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    worker = "from app.metrics import metrics; metrics.delivered(100, 'file')"
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], cwd=backend, env=env, check=True)
+    scrape = "from app.metrics import metrics; print(metrics.render()[0].decode())"
+    out = subprocess.run([sys.executable, "-c", scrape], cwd=backend, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    assert _sample(out, 'ytdl_bytes_out_total{mode="file"}') == 200
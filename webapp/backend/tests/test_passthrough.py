@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, passthrough
+from app.diskcache import DownloadCache
+from app.main import app
+from benchmarks.media_server import expected
+
+client = TestClient(app)
+DATA = expected(0, 300_000)
+
+
+@pytest.fixture
+def media(media_server, monkeypatch):
+    url = media_server.url(size=len(DATA))
+
+    def fake_info(u):
+        return {"id": "x", "title": "My clip", "formats": [
+            {"format_id": "18", "ext": "mp4", "protocol": "http", "url": url,
+             "http_headers": {"User-Agent": "test-agent"}},
+            {"format_id": "hls", "ext": "mp4", "protocol": "m3u8_native", "url": url + ".m3u8"},
+        ]}
+
+    def no_download(*args, **kwargs):
+        raise AssertionError("stream mode should not download to disk")
+
+    monkeypatch.setattr("app.main.get_info", fake_info)
+    monkeypatch.setattr("app.main.download_to_file", no_download)
+    return media_server
+
+
+def test_stream_pipes_upstream_bytes(media):
+    active = main.admission.stats()["active"]
+    r = client.post("/api/download", json={"url": "https://example.com/v", "format_id": "18", "stream": True})
+    assert r.status_code == 200
+    assert r.content == DATA
+    assert r.headers["content-length"] == str(len(DATA))
+    assert r.headers["content-type"] == "video/mp4"
+    assert r.headers["content-disposition"] == "attachment; filename*=utf-8''My%20clip.mp4"
+    # the format's own request headers are used upstream
+    assert media.seen[-1][1]["User-Agent"] == "test-agent"
+    # the admission slot is released once the body is sent
+    assert main.admission.stats()["active"] == active
+
+
+def test_stream_forwards_range(media):
+    r = client.post("/api/download", json={"url": "https://example.com/v", "format_id": "18", "stream": True},
+                    headers={"Range": "bytes=100-199"})
+    assert r.status_code == 206
+    assert r.content == DATA[100:200]
+    assert r.headers["content-range"] == f"bytes 100-199/{len(DATA)}"
+
+
+def test_stream_falls_back_when_upstream_is_unreachable(monkeypatch, fake_download):
+    import socket
+
+    # a port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    def fake_info(u):
+        return {"id": "x", "title": "clip", "formats": [
+            {"format_id": "18", "ext": "mp4", "protocol": "http", "url": f"http://127.0.0.1:{port}/clip.mp4"}]}
+
+    monkeypatch.setattr("app.main.get_info", fake_info)
+    fake_download(b"downloaded")
+    active = main.admission.stats()["active"]
+    r = client.post("/api/download", json={"url": "https://example.com/v", "format_id": "18", "stream": True})
+    assert r.status_code == 200
+    assert r.content == b"downloaded"
+    assert main.admission.stats()["active"] == active
+
+
+def test_stream_tees_into_download_cache(media, tmp_path, monkeypatch):
+    cache = DownloadCache(root=str(tmp_path))
+    monkeypatch.setattr(main, "download_cache", cache)
+    monkeypatch.setattr(passthrough, "download_cache", cache)
+    monkeypatch.setattr("app.flights.download_cache", cache)
+    body = {"url": "https://example.com/v", "format_id": "18", "stream": True}
+    on_loop = []
+    put = cache.put
+
+    def put_off_loop(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            pass
+        return put(*args)
+
+    monkeypatch.setattr(cache, "put", put_off_loop)
+
+    assert client.post("/api/download", json=body).content == DATA
+    # the cache put (and its eviction) ran in a worker thread
+    assert on_loop == []
+    cached = cache.get("https://example.com/v", "18")
+    assert cached and open(cached, "rb").read() == DATA
+    assert os.listdir(cache.staging_root) == []
+
+    # the next request is served from the cache instead of upstream
+    requests_before = media.counters["requests"]
+    assert client.post("/api/download", json=body).content == DATA
+    assert media.counters["requests"] == requests_before
+
+
+def test_stream_source_only_takes_single_file_formats():
+    info = {"title": "t", "formats": [
+        {"format_id": "18", "protocol": "https", "url": "https://cdn/a.mp4", "ext": "mp4"},
+        {"format_id": "hls", "protocol": "m3u8_native", "url": "https://cdn/a.m3u8"},
+        {"format_id": "dash", "protocol": "https", "url": "https://cdn/d", "fragments": [{}]},
+    ]}
+    assert passthrough.stream_source(info, "18")["url"] == "https://cdn/a.mp4"
+    assert passthrough.stream_source(info, "hls") is None
+    assert passthrough.stream_source(info, "dash") is None
+    assert passthrough.stream_source(info, "missing") is None
+    # merged video+audio needs yt-dlp's muxing
+    assert passthrough.stream_source({"requested_formats": [{}, {}], "url": "x"}, None) is None
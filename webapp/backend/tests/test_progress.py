@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.main import app
+from app.progress import ProgressNotifier, RedisProgressBackend
+
+
+async def _collect(notifier, channel, last_event_id=0, count=None, timeout=1.0):
+    out = []
+
+    async def run():
+        async for event_id, msg in notifier.iterate(channel, last_event_id):
+            out.append((event_id, msg))
+            if count is not None and len(out) >= count:
+                return
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return out
+
+
+def test_progress_route_is_registered_once():
+    paths = [r.path for r in app.routes if getattr(r, "path", "") == "/api/progress/{download_id}"]
+    assert paths == ["/api/progress/{download_id}"]
+
+
+def test_replay_and_last_event_id(monkeypatch):
+    monkeypatch.setenv("PROGRESS_BUFFER", "3")
+    notifier = ProgressNotifier()
+    for i in range(5):
+        notifier.publish_threadsafe("dl", {"status": "finished", "n": i})
+
+    # ring buffer keeps the newest three, ids keep counting
+    events = asyncio.run(_collect(notifier, "dl", count=3))
+    assert [(i, m["n"]) for i, m in events] == [(3, 2), (4, 3), (5, 4)]
+    resumed = asyncio.run(_collect(notifier, "dl", last_event_id=4, count=1))
+    assert [i for i, _ in resumed] == [5]
+
+
+def test_publish_from_worker_thread_wakes_subscriber():
+    notifier = ProgressNotifier()
+
+    async def scenario():
+        task = asyncio.ensure_future(_collect(notifier, "dl", count=1))
+        await asyncio.sleep(0.05)
+        threading.Thread(target=notifier.publish_threadsafe,
+                         args=("dl", {"status": "finished"})).start()
+        return await task
+
+    assert asyncio.run(scenario()) == [(1, {"status": "finished"})]
+
+
+def test_downloading_events_are_coalesced(monkeypatch):
+    monkeypatch.setenv("PROGRESS_MAX_RATE", "10")
+    notifier = ProgressNotifier()
+    for i in range(50):
+        notifier.publish_threadsafe("dl", {"status": "downloading", "downloaded_bytes": i})
+        notifier.publish_threadsafe("dl", {"status": "downloading", "idx": 1, "downloaded_bytes": i})
+    time.sleep(0.3)
+
+    events = [m for _, m in asyncio.run(_collect(notifier, "dl", timeout=0.1))]
+    # first tick per item goes straight out, the newest pending one is flushed later
+    assert [m["downloaded_bytes"] for m in events if "idx" not in m] == [0, 49]
+    assert [m["downloaded_bytes"] for m in events if m.get("idx") == 1] == [0, 49]
+
+
+def test_idle_channels_are_evicted(monkeypatch):
+    monkeypatch.setenv("PROGRESS_TTL", "0")
+    notifier = ProgressNotifier()
+    notifier.publish_threadsafe("old", {"status": "finished"})
+    notifier.backend._last_sweep = 0
+    notifier.publish_threadsafe("new", {"status": "finished"})
+    assert list(notifier.backend.channels) == ["new"]
+
+
+def test_redis_backend_shares_channels_between_notifiers():
+    fakeredis = pytest.importorskip("fakeredis")
+    from fakeredis import aioredis as fake_aioredis
+
+    server = fakeredis.FakeServer()
+
+    def backend():
+        return RedisProgressBackend(
+            "redis://fake", buffer_size=10, ttl=60,
+            client=fakeredis.FakeRedis(server=server),
+            async_client_factory=lambda: fake_aioredis.FakeRedis(server=server))
+
+    # e.g. the worker running the download and the one serving the SSE client
+    publisher = ProgressNotifier(backend=backend())
+    subscriber = ProgressNotifier(backend=backend())
+    for i in range(3):
+        publisher.publish_threadsafe("dl", {"status": "finished", "n": i})
+
+    async def read(last_event_id=None, count=3):
+        out = []
+        async for event_id, msg in subscriber.iterate("dl", last_event_id, heartbeat=1):
+            if msg is not None:
+                out.append((event_id, msg))
+            if len(out) >= count:
+                return out
+        return out
+
+    events = asyncio.run(asyncio.wait_for(read(), 3))
+    assert [m["n"] for _, m in events] == [0, 1, 2]
+    # stream ids double as SSE ids for Last-Event-ID resumption
+    resumed = asyncio.run(asyncio.wait_for(read(events[0][0], count=2), 3))
+    assert [m["n"] for _, m in resumed] == [1, 2]
+
+
+def test_websocket_multiplexes_deltas(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.progress import notifier
+
+    monkeypatch.setattr("app.main.PROGRESS_TICK", 0.05)
+    client = TestClient(app)
+    with client.websocket_connect("/api/progress/ws") as ws:
+        ws.send_json({"subscribe": ["ws-a", "ws-b"]})
+        assert ws.receive_json() == {"type": "subscribed", "ids": ["ws-a", "ws-b"]}
+
+        notifier.publish_threadsafe("ws-a", {"status": "finished", "filename": "a.mp4"})
+        notifier.publish_threadsafe("ws-b", {"status": "finished", "idx": 2, "filename": "b.mp4"})
+        msg = ws.receive_json()
+        while len(msg["updates"]) < 2:
+            msg["updates"] += ws.receive_json()["updates"]
+        by_id = {u["id"]: u for u in msg["updates"]}
+        assert by_id["ws-a"]["filename"] == "a.mp4"
+        assert by_id["ws-b"]["idx"] == 2
+
+        # only fields that changed are sent again
+        notifier.publish_threadsafe("ws-a", {"status": "finished", "filename": "a2.mp4"})
+        update = ws.receive_json()["updates"][0]
+        assert update["id"] == "ws-a"
+        assert update["filename"] == "a2.mp4"
+        assert "status" not in update
+
+        ws.send_json({"unsubscribe": ["ws-a"]})
+        assert ws.receive_json() == {"type": "subscribed", "ids": ["ws-b"]}
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import re
+import threading
+
+import httpx
+import pytest
+
+from app.segmented import RangesUnsupported, segmented_download, state_path
+from benchmarks.media_server import expected
+
+SIZE = 1_000_000
+DATA = expected(0, SIZE)
+
+
+def _range_starts(server):
+    """Start offsets of the Range GETs the server has seen."""
+    return [int(re.match(r"bytes=(\d+)-", headers["Range"]).group(1))
+            for method, headers in server.seen if method == "GET" and "Range" in headers]
+
+
+def _run(url, path, **kw):
+    async def go():
+        async with httpx.AsyncClient() as client:
+            return await segmented_download(client, url, path, min_size=1, **kw)
+    return asyncio.run(go())
+
+
+def test_parts_are_fetched_concurrently_into_place(media_server, tmp_path):
+    out = str(tmp_path / "clip.mp4")
+    events = []
+    url = media_server.url(size=SIZE)
+    assert _run(url, out, connections=4, part_size=100_000, progress_hook=events.append) == len(DATA)
+    with open(out, "rb") as f:
+        assert f.read() == DATA
+    assert sorted(_range_starts(media_server)) == list(range(0, len(DATA), 100_000))
+    assert not os.path.exists(state_path(out))
+    assert events[-1] == {"status": "finished", "filename": out,
+                          "downloaded_bytes": len(DATA), "total_bytes": len(DATA)}
+
+
+def test_resume_fetches_only_missing_parts(media_server, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.segmented.SEGMENT_RETRIES", 1)
+    out = str(tmp_path / "clip.mp4")
+    with pytest.raises(httpx.HTTPStatusError):
+        _run(media_server.url(size=SIZE, fail_at=500_000), out, connections=2, part_size=100_000)
+    with open(state_path(out)) as f:
+        done = {i * 100_000 for i in json.load(f)["done"]}
+    assert 0 in done and 500_000 not in done
+
+    media_server.seen.clear()
+    # same length and ETag, so the parts file still applies
+    _run(media_server.url(size=SIZE), out, connections=2, part_size=100_000)
+    assert sorted(_range_starts(media_server)) == sorted(set(range(0, len(DATA), 100_000)) - done)
+    with open(out, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_servers_without_ranges_fall_back_to_one_stream(media_server, tmp_path):
+    url = media_server.url(size=SIZE, ranges=0)
+    with pytest.raises(RangesUnsupported):
+        _run(url, str(tmp_path / "x"))
+
+    from app.httpclient import SharedHttpClient
+
+    client = SharedHttpClient()
+    out = tmp_path / "clip.mp4"
+    try:
+        assert client.download(url, str(out)) == len(DATA)
+    finally:
+        client.close()
+    assert out.read_bytes() == DATA
+
+
+def test_probe_replaces_the_head_request(media_server, tmp_path):
+    url = media_server.url(size=SIZE)
+
+    async def go():
+        async with httpx.AsyncClient() as client:
+            probe = await client.head(url)
+            return await segmented_download(client, url, str(tmp_path / "clip.mp4"),
+                                            min_size=1, part_size=250_000, probe=probe)
+
+    assert asyncio.run(go()) == len(DATA)
+    assert media_server.counters["heads"] == 1
+
+
+def test_file_writes_stay_off_the_event_loop(media_server, tmp_path, monkeypatch):
+    from app import segmented
+
+    threads = set()
+    pwrite, save_state = segmented._pwrite, segmented._save_state
+
+    def record(fn):
+        def wrapper(*args):
+            threads.add(threading.get_ident())
+            return fn(*args)
+        return wrapper
+
+    monkeypatch.setattr(segmented, "_pwrite", record(pwrite))
+    monkeypatch.setattr(segmented, "_save_state", record(save_state))
+    loop_thread = []
+
+    async def go():
+        loop_thread.append(threading.get_ident())
+        async with httpx.AsyncClient() as client:
+            return await segmented_download(client, media_server.url(size=SIZE), str(tmp_path / "clip.mp4"),
+                                            min_size=1, part_size=250_000)
+
+    assert asyncio.run(go()) == len(DATA)
+    assert threads and loop_thread[0] not in threads
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_importing_the_app_does_not_load_yt_dlp():
+    code = "import sys, app.main; print('yt_dlp' in sys.modules, 'requests' in sys.modules)"
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=backend,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "False"]
+
+
+def test_ready_flips_after_warm_up():
+    with TestClient(app) as client:
+        assert client.get("/api/health").status_code == 200
+        deadline = time.monotonic() + 30
+        while client.get("/api/ready").status_code != 200:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        assert client.get("/api/ready").json()["warmup"]["ready"] is True
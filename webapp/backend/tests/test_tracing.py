@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app.executor import BoundedExecutor
+from app.main import app
+from app.tracing import Tracer, profiler, tracer
+
+client = TestClient(app)
+
+
+def _spans(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_nest_across_executor_threads(tmp_path):
+    t = Tracer(str(tmp_path / "trace.jsonl"))
+    pool = BoundedExecutor("test", 1, 0)
+
+    def work():
+        with t.span("in_thread", n=1):
+            pass
+
+    async def go():
+        with t.trace("root"):
+            with t.span("outer"):
+                await pool.run(work)
+
+    asyncio.run(go())
+    # no trace active: nothing is recorded
+    with t.span("orphan"):
+        pass
+    t.flush()
+    spans = {s["name"]: s for s in _spans(tmp_path / "trace.jsonl")}
+    assert set(spans) == {"root", "outer", "in_thread"}
+    assert spans["outer"]["parentSpanId"] == spans["root"]["spanId"]
+    assert spans["in_thread"]["parentSpanId"] == spans["outer"]["spanId"]
+    assert spans["in_thread"]["traceId"] == spans["root"]["traceId"]
+    assert spans["in_thread"]["attributes"] == {"n": 1}
+
+
+def test_request_trace_written_to_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracer, "path", str(tmp_path / "trace.jsonl"))
+
+    def fake_info(url):
+        with tracer.span("fake_extract"):
+            return {"id": "x", "title": "t", "formats": []}
+
+    monkeypatch.setattr("app.main.get_info", fake_info)
+    r = client.post("/api/info", json={"url": "https://example.com/t"})
+    assert r.status_code == 200
+    tracer.flush()
+    spans = {s["name"]: s for s in _spans(tmp_path / "trace.jsonl")}
+    root = spans["POST /api/info"]
+    assert root["traceId"] == r.headers["x-trace-id"]
+    assert root["attributes"]["http.status_code"] == 200
+    assert spans["fake_extract"]["parentSpanId"] == root["spanId"]
+
+
+def _busy_extract(url):
+    end = time.monotonic() + 0.3
+    while time.monotonic() < end:
+        pass
+    return {"id": "x", "title": "t", "formats": []}
+
+
+def test_profile_on_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "token", "s3cret")
+    monkeypatch.setattr(profiler, "dir", str(tmp_path))
+    monkeypatch.setattr("app.main.get_info", _busy_extract)
+
+    plain = client.post("/api/info", json={"url": "https://example.com/p"})
+    assert "x-profile-id" not in plain.headers
+    wrong = client.post("/api/info", json={"url": "https://example.com/p"}, headers={"X-Profile": "nope"})
+    assert "x-profile-id" not in wrong.headers
+
+    r = client.post("/api/info", json={"url": "https://example.com/p"}, headers={"X-Profile": "s3cret"})
+    profile_id = r.headers["x-profile-id"]
+    assert client.get(f"/api/profiles/{profile_id}").status_code == 403
+    folded = client.get(f"/api/profiles/{profile_id}", headers={"X-Profile": "s3cret"})
+    assert folded.status_code == 200
+    lines = folded.text.splitlines()
+    # collapsed stacks: "thread;frame;frame count", sampled on the executor thread
+    assert any("_busy_extract" in line and line.startswith("ytdl-info") for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
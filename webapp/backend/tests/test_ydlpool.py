@@ -0,0 +1,38 @@
+import pytest
+
+from app.ydlpool import YoutubeDLPool
+
+PARAMS = {"quiet": True, "skip_download": True}
+
+
+def test_instances_are_reused_and_rebound():
+    pool = YoutubeDLPool(max_idle=1)
+    hook = lambda status: None  # noqa: E731
+
+    with pool.checkout("dl", PARAMS, outtmpl="/tmp/a/%(title)s.%(ext)s",
+                       format_id="best", progress_hook=hook) as first:
+        assert first._progress_hooks == [hook]
+        assert first.params["outtmpl"]["default"] == "/tmp/a/%(title)s.%(ext)s"
+        assert first.format_selector is not None
+    assert first._progress_hooks == []
+
+    with pool.checkout("dl", PARAMS, outtmpl="/tmp/b/%(title)s.%(ext)s") as second:
+        assert second is first
+        assert second.params["outtmpl"]["default"] == "/tmp/b/%(title)s.%(ext)s"
+        assert second.format_selector is None
+        assert second._progress_hooks == []
+
+    # a different profile or option set gets its own instances
+    with pool.checkout("info", PARAMS) as other:
+        assert other is not first
+    assert pool.stats()["created"] == 2 and pool.stats()["reused"] == 1
+
+
+def test_failed_instances_are_not_reused():
+    pool = YoutubeDLPool(max_idle=2)
+    with pytest.raises(RuntimeError):
+        with pool.checkout("dl", PARAMS) as broken:
+            raise RuntimeError("boom")
+    with pool.checkout("dl", PARAMS) as fresh:
+        assert fresh is not broken
+    assert pool.stats()["discarded"] == 1
@@ -33,8 +33,34 @@ export default function App() {
     try {
       const urls = multiUrls.split('\n').map(s => s.trim()).filter(Boolean)
       if (urls.length > 1) {
-        const res = await axios.post(`${BACKEND}/api/infos`, { urls })
-        setInfo({ batch: true, items: res.data })
+        // Ask for NDJSON so each result renders as soon as the backend resolves it
+        const res = await fetch(`${BACKEND}/api/infos`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ urls, stream: true })
+        })
+        if (!res.ok) {
+          const body = await res.json().catch(() => ({}))
+          throw new Error(body.detail || `HTTP ${res.status}`)
+        }
+        const items = urls.map(u => ({ url: u, title: 'Loading...' }))
+        setInfo({ batch: true, items: [...items] })
+        const reader = res.body.getReader()
+        const decoder = new TextDecoder()
+        let buffered = ''
+        while (true) {
+          const { value, done } = await reader.read()
+          if (done) break
+          buffered += decoder.decode(value, { stream: true })
+          const lines = buffered.split('\n')
+          buffered = lines.pop()
+          for (const line of lines) {
+            if (!line.trim()) continue
+            const { index, ...item } = JSON.parse(line)
+            items[index] = item
+          }
+          setInfo({ batch: true, items: [...items] })
+        }
       } else {
         const value = urls[0] || singleUrl
         const res = await axios.post(`${BACKEND}/api/info`, { url: value })
@@ -107,33 +133,40 @@ export default function App() {
   }
 
   const downloadAll = async () => {
+    let es
     try {
+      const urls = multiUrls.split('\n').map(s => s.trim()).filter(Boolean)
+      if (urls.length === 0 && singleUrl) urls.push(singleUrl)
+      if (urls.length === 0) {
+        alert('No URLs provided')
+        return
+      }
       setDownloading(true)
-      setProgress(0)
+      // the zip is streamed without a Content-Length, so progress comes from the
+      // per-item SSE events; until the first one arrives the bar is indeterminate
+      setProgress(null)
       const downloadId = (window.crypto && window.crypto.randomUUID) ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`
-      let es
+      const done = new Array(urls.length).fill(0)
       try {
         es = new EventSource(`${BACKEND}/api/progress/${downloadId}`)
         es.onmessage = (evt) => {
           try {
             const msg = JSON.parse(evt.data)
-            // If batch publishes idx-based messages, we could aggregate. For now use any total/downloaded to compute percent.
-            const total = msg.total_bytes || msg.total_bytes_estimate
-            const downloaded = msg.downloaded_bytes || 0
-            if (total && total > 0) {
-              setProgress(Math.round((downloaded / total) * 100))
-            } else if (msg.status === 'batch_finished' || msg.status === 'finished') {
+            if (msg.status === 'batch_finished') {
               setProgress(100)
+              return
             }
+            if (typeof msg.idx !== 'number' || msg.idx < 0 || msg.idx >= done.length) return
+            const total = msg.total_bytes || msg.total_bytes_estimate
+            if (msg.status === 'finished') {
+              done[msg.idx] = 1
+            } else if (total && total > 0) {
+              done[msg.idx] = Math.min(1, (msg.downloaded_bytes || 0) / total)
+            }
+            setProgress(Math.round((done.reduce((a, b) => a + b, 0) / done.length) * 100))
           } catch (e) { }
         }
       } catch (e) { es = null }
-      const urls = multiUrls.split('\n').map(s => s.trim()).filter(Boolean)
-      if (urls.length === 0 && singleUrl) urls.push(singleUrl)
-      if (urls.length === 0) {
-        alert('No URLs provided')
-        return
-      }
       // Build items with format and output_dir if provided
       let payload
       if (batchFormat && batchFormat.trim()) {
@@ -154,7 +187,7 @@ export default function App() {
         }
       }
 
-      const res = await axios.post(`${BACKEND}/api/downloads`, payload, { responseType: 'blob', onDownloadProgress: (evt) => { if (evt.lengthComputable) setProgress(Math.round((evt.loaded / evt.total) * 100)) }, headers: { 'X-Download-Id': downloadId } })
+      const res = await axios.post(`${BACKEND}/api/downloads`, payload, { responseType: 'blob', headers: { 'X-Download-Id': downloadId } })
       const disposition = res.headers['content-disposition'] || ''
       let filename = 'downloads.zip'
       const m = /filename="?([^";]+)"?/.exec(disposition)
@@ -276,7 +309,11 @@ export default function App() {
       {downloading && (
         <div className="mt-3">
           <div className="progress">
-            <div className="progress-bar" role="progressbar" style={{ width: `${progress}%` }} aria-valuenow={progress} aria-valuemin="0" aria-valuemax="100">{progress}%</div>
+            {progress === null ? (
+              <div className="progress-bar progress-bar-striped progress-bar-animated" role="progressbar" style={{ width: '100%' }}>Working...</div>
+            ) : (
+              <div className="progress-bar" role="progressbar" style={{ width: `${progress}%` }} aria-valuenow={progress} aria-valuemin="0" aria-valuemax="100">{progress}%</div>
+            )}
           </div>
         </div>
       )}